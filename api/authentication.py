@@ -0,0 +1,22 @@
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from boards import tokens
+from floboard.replicas import primary
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that remembers the user of each token, see boards.tokens, so most
+    requests are authenticated without querying the database.
+    """
+
+    def authenticate_credentials(self, key):
+        user = tokens.get(key)
+        if user is not None:
+            return user, Token(key=key, user=user)
+        # Cached for every request with the token, so not from a replica that may lag behind a change
+        with primary():
+            user, token = super(CachedTokenAuthentication, self).authenticate_credentials(key)
+        tokens.store(key, user)
+        return user, token
@@ -0,0 +1,131 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, CursorPagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class BoardCursorPagination(CursorPagination):
+    """Keyset pagination over boards ordered by id."""
+
+    ordering = 'id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class SearchPagination(LimitOffsetPagination):
+    """Offset pagination over ranked search hits, which have no stable key to page by."""
+
+    default_limit = 20
+    max_limit = 100
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset pagination over an ordering on several columns, all ascending, the last of them unique.
+
+    Unlike CursorPagination, which seeks on the first column only and skips ties by offset, the
+    cursor holds the values of every ordering column of the last item of a page, and the next page
+    starts right after that row however many rows share its first columns.
+    """
+
+    ordering = ('id', )
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        position = self.decode_cursor(request)
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            queryset = queryset.filter(self.after(self.parse_position(queryset, position)))
+        page_size = self.get_page_size(request)
+        results = list(queryset[:page_size + 1])
+        self.has_next = len(results) > page_size
+        self.page = results[:page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def after(self, position):
+        """The rows sorting after the one whose ordering values are position."""
+        condition, equal = Q(), Q()
+        for field, value in zip(self.ordering, position):
+            condition |= equal & Q(**{field + '__gt': value})
+            equal &= Q(**{field: value})
+        return condition
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+        except (ValueError, binascii.Error, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def parse_position(self, queryset, position):
+        """The values of a decoded cursor as the ordering columns of queryset hold them."""
+        values = []
+        for name, value in zip(self.ordering, position):
+            annotation = queryset.query.annotations.get(name)
+            field = annotation.output_field if annotation is not None else queryset.model._meta.get_field(name)
+            if field.is_relation:
+                field = field.target_field
+            try:
+                value = field.to_python(value)
+                field.run_validators(value)
+            except (ValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+            if value is None:
+                raise NotFound(self.invalid_cursor_message)
+            values.append(value)
+        return values
+
+    def encode_cursor(self, item):
+        position = [getattr(item, field) for field in self.ordering]
+        # Dates in full, unlike DjangoJSONEncoder, which cuts microseconds and would break ties
+        encoded = json.dumps(position, default=lambda value: value.isoformat())
+        return base64.urlsafe_b64encode(encoded.encode('utf-8')).decode('ascii')
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+
+class AssignedCardPagination(KeysetPagination):
+    """Keyset pagination over the cards assigned to a user, by board, column and rank."""
+
+    ordering = ('board_id', 'column_key', 'rank', 'id')
+
+
+class CommentCursorPagination(KeysetPagination):
+    """Keyset pagination over the comments of a card, oldest first."""
+
+    ordering = ('created_at', 'id')
@@ -0,0 +1,19 @@
+from django.http import Http404
+from rest_framework.permissions import BasePermission
+
+from boards import access
+
+
+class HasBoardAccess(BasePermission):
+    """
+    Allow views nested under a board (those with a `board_pk`) only to users who can see the
+    board, see boards.access. Others get a 404, so the board's existence is not revealed.
+    """
+
+    def has_permission(self, request, view):
+        board_pk = view.kwargs.get('board_pk')
+        if board_pk is None:
+            return True
+        if not access.can_access(request.user, board_pk):
+            raise Http404
+        return True
@@ -0,0 +1,56 @@
+"""
+JSON rendering for the API.
+
+FastJSONRenderer encodes with orjson when it is installed and falls back to DRF's JSONRenderer
+otherwise, or whenever orjson cannot produce the same output: for indented (browsable) output,
+non-compact or ASCII-only settings, and values orjson refuses. Anything orjson does not know
+natively, datetimes included, is converted by DRF's encoder, so both give the same bytes.
+
+render_stream() encodes a JSON array one item at a time, for StreamingHttpResponse bodies.
+"""
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer backed by orjson when available."""
+
+    def __init__(self):
+        self.default = self.encoder_class().default
+
+    def can_use_orjson(self, accepted_media_type, renderer_context):
+        return (
+            orjson is not None and self.compact and not self.ensure_ascii
+            and self.get_indent(accepted_media_type, renderer_context or {}) is None
+        )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.can_use_orjson(accepted_media_type, renderer_context):
+            try:
+                return self.dumps(data)
+            except TypeError:
+                # orjson.JSONEncodeError, e.g. for integers beyond 64 bits
+                pass
+        return super(FastJSONRenderer, self).render(data, accepted_media_type, renderer_context)
+
+    def dumps(self, data):
+        ret = orjson.dumps(
+            data, default=self.default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        )
+        # Escaped by JSONRenderer too, as they are not valid in JavaScript strings
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+    def render_stream(self, items, accepted_media_type=None, renderer_context=None):
+        """Yield the JSON array of items a chunk at a time, encoding one item after the other."""
+        yield b'['
+        for i, item in enumerate(items):
+            if i:
+                yield b','
+            yield self.render(item, accepted_media_type, renderer_context) if item is not None else b'null'
+        yield b']'
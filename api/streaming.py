@@ -0,0 +1,151 @@
+"""
+Server-sent events stream of board changes, served by the ASGI application in floboard.asgi.
+
+GET /api/v1/boards/<board_pk>/events/ keeps the connection open and writes an event for every
+create, update and delete on the board. Event ids are change log cursors, so a client that
+reconnects with Last-Event-ID first receives what it missed, and a client told to resync can
+catch up from /boards/<board_pk>/changes/?since=<last id>.
+
+Callers authenticate with a token like on the rest of the API, and are refused with a 401
+without one and a 403 for a board they cannot see (see boards.access), whether it exists or not.
+
+Each connection is a coroutine waiting on a fixed-size buffer rather than a thread, so idle
+subscribers cost next to nothing.
+"""
+import asyncio
+import json
+import re
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpRequest
+from rest_framework.exceptions import AuthenticationFailed
+
+from boards import access, events, shards
+from boards.models import Board, BoardChange
+
+from .authentication import CachedTokenAuthentication
+
+EVENTS_PATH = re.compile(r'^/api/v1/boards/(?P<board_pk>\d+)/events/$')
+
+
+def format_event(event):
+    if event is events.RESYNC:
+        return b'event: resync\ndata: {}\n\n'
+    return 'id: {0}\nevent: change\ndata: {1}\n\n'.format(event['seq'], json.dumps(event)).encode('utf-8')
+
+
+@sync_to_async
+def refusal(headers, board_pk):
+    """Return the status refusing the caller the events of board_pk, or None to let it follow them."""
+    request = HttpRequest()
+    request.META['HTTP_AUTHORIZATION'] = headers.get(b'authorization', b'').decode('latin-1')
+    try:
+        authenticated = CachedTokenAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        authenticated = None
+    if authenticated is None:
+        return 401
+    with shards.for_board(board_pk):
+        if not access.can_access(authenticated[0], board_pk):
+            return 403
+    return None
+
+
+@sync_to_async
+def board_exists(board_pk):
+    with shards.for_board(board_pk):
+        return Board.objects.filter(pk=board_pk).exists()
+
+
+@sync_to_async
+def missed_events(board_pk, since):
+    """Return the logged changes after since, or a single resync event if there are too many."""
+    limit = getattr(settings, 'BOARD_EVENTS_BUFFER_SIZE', 100)
+    with shards.for_board(board_pk):
+        entries = list(
+            BoardChange.objects.filter(board_id=board_pk, id__gt=since).order_by('id')[:limit + 1]
+        )
+    if len(entries) > limit:
+        return [events.RESYNC]
+    return [
+        {'seq': entry.pk, 'model': entry.model, 'id': entry.object_id, 'action': entry.action}
+        for entry in entries
+    ]
+
+
+async def respond(send, status, body=b'', headers=()):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'text/plain')] + list(headers),
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+async def board_events(scope, receive, send, board_pk):
+    """ASGI application streaming the events of one board."""
+    board_pk = int(board_pk)
+    if scope['method'] != 'GET':
+        return await respond(send, 405, b'Method not allowed.')
+    headers = dict(scope['headers'])
+    refused = await refusal(headers, board_pk)
+    if refused == 401:
+        return await respond(send, 401, b'Authentication required.', [(b'www-authenticate', b'Token')])
+    if refused == 403:
+        return await respond(send, 403, b'Forbidden.')
+    if not await board_exists(board_pk):
+        return await respond(send, 404, b'Not found.')
+
+    heartbeat = getattr(settings, 'BOARD_EVENTS_HEARTBEAT', 15)
+
+    # Subscribe before replaying the log so nothing committed in between is lost
+    subscription = events.subscribe(board_pk, loop=asyncio.get_running_loop())
+    disconnect = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+
+        seen = 0
+        last_event_id = headers.get(b'last-event-id', b'')
+        if last_event_id.isdigit():
+            seen = int(last_event_id)
+            missed = await missed_events(board_pk, seen)
+            if missed:
+                await send({'type': 'http.response.body', 'body': b''.join(map(format_event, missed)),
+                            'more_body': True})
+                seen = missed[-1].get('seq', seen)
+
+        while True:
+            getter = asyncio.ensure_future(subscription.get(timeout=heartbeat))
+            done, _ = await asyncio.wait({getter, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+            if disconnect in done:
+                getter.cancel()
+                break
+
+            batch = [event for event in getter.result() if event is events.RESYNC or event['seq'] > seen]
+            if batch:
+                body = b''.join(map(format_event, batch))
+                seen = max([seen] + [event['seq'] for event in batch if event is not events.RESYNC])
+            else:
+                body = b': keep-alive\n\n'
+            # Awaiting the send is the backpressure: while a slow client drains, events collect in
+            # the subscription's bounded buffer until it overflows into a resync.
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+    finally:
+        subscription.close()
+        disconnect.cancel()
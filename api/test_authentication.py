@@ -0,0 +1,68 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIRequestFactory
+
+from boards import tokens
+
+from .authentication import CachedTokenAuthentication
+
+
+class CachedTokenAuthenticationTest(TestCase):
+    """Test suite for the token authentication with cached users."""
+
+    def setUp(self):
+        cache.clear()
+        tokens.clear()
+        tokens.reset_stats()
+        self.user = get_user_model().objects.create_user('test', email='testuser@test.com', password='test')
+        self.token = Token.objects.get(user=self.user)
+
+    def authenticate(self, key):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION='Token {0}'.format(key))
+        return CachedTokenAuthentication().authenticate(request)
+
+    def test_users_are_authenticated_from_the_cache(self):
+        with self.assertNumQueries(1):
+            user, token = self.authenticate(self.token.key)
+        with self.assertNumQueries(0):
+            cached, cached_token = self.authenticate(self.token.key)
+        self.assertEqual((cached, cached_token.key), (user, token.key))
+
+        # Another process only shares the cache
+        tokens.clear()
+        with self.assertNumQueries(0):
+            self.authenticate(self.token.key)
+        stats = tokens.stats()
+        self.assertEqual((stats['local_hits'], stats['shared_hits'], stats['misses']), (1, 1, 1))
+        self.assertAlmostEqual(stats['hit_rate'], 2 / 3)
+
+    def test_deleted_and_regenerated_tokens_are_rejected(self):
+        self.authenticate(self.token.key)
+        self.token.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(self.token.key)
+        token = Token.objects.create(user=self.user)
+        self.assertEqual(self.authenticate(token.key)[0], self.user)
+
+    def test_deactivated_users_are_rejected(self):
+        self.authenticate(self.token.key)
+        self.user.last_login = self.user.date_joined
+        self.user.save(update_fields=['last_login'])
+        self.assertEqual(self.authenticate(self.token.key)[0], self.user)
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(self.token.key)
+
+    def test_the_local_cache_is_bounded(self):
+        users = [
+            get_user_model().objects.create_user('user{0}'.format(i), email='user{0}@test.com'.format(i))
+            for i in range(3)
+        ]
+        with self.settings(TOKEN_CACHE_SIZE=2):
+            for user in users:
+                self.authenticate(user.auth_token.key)
+        self.assertEqual(tokens.stats()['local_size'], 2)
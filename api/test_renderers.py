@@ -0,0 +1,40 @@
+import datetime
+import decimal
+import json
+from collections import OrderedDict
+
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from .renderers import FastJSONRenderer
+
+
+class FastJSONRendererTest(TestCase):
+    """Test suite for the orjson backed JSON renderer."""
+
+    def setUp(self):
+        self.data = OrderedDict([
+            ('id', 1),
+            ('title', 'Ünïcode\u2028board\u2029'),
+            ('created_at', datetime.datetime(2018, 6, 17, 19, 19, 1, 123456, tzinfo=timezone.utc)),
+            ('due', datetime.date(2018, 6, 18)),
+            ('estimate', decimal.Decimal('1.50')),
+            ('ratio', 0.25),
+            ('nothing', None),
+            ('cards', [{'id': 2, 'labels': [3, 4]}, {'id': 5, 'labels': []}]),
+            ('by_id', {6: 'six'}),
+        ])
+
+    def test_renders_exactly_like_the_json_renderer(self):
+        self.assertEqual(FastJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+
+    def test_falls_back_for_indented_output(self):
+        body = FastJSONRenderer().render(self.data, 'application/json; indent=4')
+        self.assertEqual(body, JSONRenderer().render(self.data, 'application/json; indent=4'))
+
+    def test_render_stream_encodes_a_json_array(self):
+        items = [self.data, None, {'id': 7}]
+        body = b''.join(FastJSONRenderer().render_stream(iter(items)))
+        self.assertEqual(json.loads(body.decode('utf-8')), json.loads(JSONRenderer().render(items).decode('utf-8')))
+        self.assertEqual(b''.join(FastJSONRenderer().render_stream(iter([]))), b'[]')
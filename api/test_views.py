@@ -1,10 +1,29 @@
+import asyncio
+import base64
+import json
+import re
+from datetime import timedelta
+from urllib.parse import quote
+
+from asgiref.sync import async_to_sync
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
 from rest_framework import status
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 
-from boards.models import Board, Column, Label, Card, Comment
+from boards import access, events
+from boards.models import Board, BoardChange, Column, Label, Card, Comment
+
+from projects.access import project_pks
+from projects.models import Membership, Project, Team
+
+from .streaming import board_events
 
 
 def setup_user():
@@ -17,16 +36,24 @@ def setup_user():
     )
 
 
+def warm_access(user, *boards):
+    """Fill the access caches, as a user's earlier requests would have, for query counts."""
+    project_pks(user)
+    for board in boards:
+        access.owner(board.pk)
+
+
 class BoardAPIViewTest(TestCase):
     """Test suite for the Board API views."""
 
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
         self.user = setup_user()
         self.user.save()
         self.board = Board(title='Test Board', created_by=self.user)
         self.board.save()
-        # self.client.force_authenticate(self.user)
+        self.client.force_authenticate(self.user)
 
     def test_api_can_create_a_new_board(self):
         response = self.client.post(
@@ -39,6 +66,54 @@ class BoardAPIViewTest(TestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(response.data['id'], self.board.pk + 1)
 
+    def test_api_sets_the_creator_of_a_board_from_the_caller(self):
+        other = get_user_model().objects.create_user('other', email='other@test.com', password='test')
+        response = self.client.post('/api/v1/boards/', {'title': 'Test Board 2', 'created_by': other.pk})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Board.objects.get(pk=response.data['id']).created_by, self.user)
+        response = self.client.put('/api/v1/boards/{0}/'.format(self.board.pk), {'created_by': other.pk})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Board.objects.get(pk=self.board.pk).created_by, self.user)
+
+    def test_api_lists_board_summaries(self):
+        response = self.client.get('/api/v1/boards/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [{
+            'id': self.board.pk,
+            'title': 'Test Board',
+            'created_by': self.user.pk,
+            'project': None,
+            'is_template': False,
+            'column_count': 0,
+            'card_count': 0,
+            'comment_count': 0,
+        }])
+
+    def test_api_paginates_boards_by_cursor(self):
+        for i in range(4):
+            Board.objects.create(title='Board {0}'.format(i), created_by=self.user)
+        response = self.client.get('/api/v1/boards/?page_size=2')
+        self.assertEqual([board['id'] for board in response.data['results']], [self.board.pk, self.board.pk + 1])
+        self.assertIsNone(response.data['previous'])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([board['id'] for board in response.data['results']], [self.board.pk + 2, self.board.pk + 3])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([board['id'] for board in response.data['results']], [self.board.pk + 4])
+        self.assertIsNone(response.data['next'])
+
+    def test_api_serves_board_from_snapshot_cache(self):
+        url = '/api/v1/boards/{0}/'.format(self.board.pk)
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.data['title'], 'Test Board')
+
+        Column.objects.create(board=self.board, title='Backlog', position=1)
+        response = self.client.get(url)
+        self.assertEqual(len(response.data['column_set']), 1)
+
     def test_api_can_update_a_board(self):
         response = self.client.put(
             '/api/v1/boards/{0}/'.format(self.board.pk),
@@ -70,7 +145,7 @@ class ColumnAPIViewTest(TestCase):
         self.board.save()
         self.column = Column(board=self.board, title='Backlog', position=1)
         self.column.save()
-        # self.client.force_authenticate(self.user)
+        self.client.force_authenticate(self.user)
 
     def test_api_can_create_a_new_column(self):
         response = self.client.post(
@@ -83,6 +158,17 @@ class ColumnAPIViewTest(TestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(response.data['id'], self.column.pk + 1)  # TODO // Column tests should use the position
 
+    def test_api_rejects_a_duplicate_column_position(self):
+        response = self.client.post(
+            '/api/v1/boards/{board_pk}/columns/'.format(board_pk=self.board.pk),
+            {
+                "title": "In Progress",
+                "position": 1
+            }
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('position', response.data)
+
     def test_api_can_update_a_column(self):
         response = self.client.put(
             '/api/v1/boards/{board_pk}/columns/{position}/'.format(board_pk=self.board.pk, position=1),
@@ -114,7 +200,7 @@ class LabelAPIViewTest(TestCase):
         self.board.save()
         self.label = Label(board=self.board, title='Red Label', color='#FF0000')
         self.label.save()
-        # self.client.force_authenticate(self.user)
+        self.client.force_authenticate(self.user)
 
     def test_api_can_create_a_new_label(self):
         response = self.client.post(
@@ -166,7 +252,7 @@ class CardAPIViewSet(TestCase):
         self.label2.save()
         self.card = Card(board=self.board, title='Test Card', description='Test Card description', created_by=self.user)
         self.card.save()
-        # self.client.force_authenticate(self.user)
+        self.client.force_authenticate(self.user)
 
     def test_api_can_create_a_new_card(self):
         response = self.client.post(
@@ -223,7 +309,7 @@ class CommentAPIViewSet(TestCase):
         self.card.save()
         self.comment = Comment(card=self.card, message='Test message.', created_by=self.user)
         self.comment.save()
-        # self.client.force_authenticate(self.user)
+        self.client.force_authenticate(self.user)
 
     def test_api_can_create_a_new_comment(self):
         response = self.client.post(
@@ -250,6 +336,7 @@ class CommentAPIViewSet(TestCase):
         )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['message'], 'Test Message 2 edited.')
+        self.assertEqual(response.data['message_html'], '<p>Test Message 2 edited.</p>')
         self.assertEqual(response.data['updated_at'], "2017-12-17T06:26:53Z")
         self.assertEqual(response.data['updated_by'], self.user.pk)
 
@@ -263,3 +350,967 @@ class CommentAPIViewSet(TestCase):
         new_count = Comment.objects.count()
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertNotEqual(old_count, new_count)
+
+
+def setup_board_tree(board, user, columns=2, cards=3, comments=2):
+    """Populate a board with labelled, assigned and commented cards in every column."""
+    labels = [
+        Label.objects.create(board=board, title='Red Label', color='#FF0000'),
+        Label.objects.create(board=board, title='Green Label', color='#00FF00'),
+    ]
+    offset = Column.objects.filter(board=board).count()
+    for position in range(offset + 1, offset + columns + 1):
+        column = Column.objects.create(board=board, title='Column {0}'.format(position), position=position)
+        for i in range(cards):
+            card = Card.objects.create(board=board, column=column, title='Card {0}'.format(i),
+                                       description='Card description.', created_by=user)
+            card.labels.set(labels)
+            card.assignees.set([user])
+            for j in range(comments):
+                Comment.objects.create(card=card, message='Comment {0}.'.format(j), created_by=user)
+
+
+class QueryCountAPIViewTest(TestCase):
+    """Test suite asserting the nested views run a constant number of queries."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = setup_user()
+        self.board = Board(title='Test Board', created_by=self.user)
+        self.board.save()
+        setup_board_tree(self.board, self.user)
+        self.client.force_authenticate(self.user)
+        warm_access(self.user, self.board)
+
+    def assertConstantQueries(self, num, url):
+        with self.assertNumQueries(num):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        setup_board_tree(self.board, self.user, columns=3, cards=5, comments=3)
+        with self.assertNumQueries(num):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def test_board_list_queries_are_constant(self):
+        response = self.assertConstantQueries(6, '/api/v1/boards/?tree=true')
+        self.assertEqual(len(response.data['results'][0]['column_set']), 5)
+
+    def test_board_list_summary_queries_are_constant(self):
+        response = self.assertConstantQueries(1, '/api/v1/boards/')
+        self.assertEqual(response.data['results'][0]['column_count'], 5)
+        self.assertEqual(response.data['results'][0]['card_count'], 21)
+        self.assertEqual(response.data['results'][0]['comment_count'], 57)
+
+    def test_board_detail_queries_are_constant(self):
+        response = self.assertConstantQueries(6, '/api/v1/boards/{0}/'.format(self.board.pk))
+        self.assertEqual(len(response.data['column_set']), 5)
+        self.assertEqual(len(response.data['column_set'][0]['card_set'][0]['comment_set']), 2)
+
+    def test_column_list_queries_are_constant(self):
+        self.assertConstantQueries(5, '/api/v1/boards/{0}/columns/'.format(self.board.pk))
+
+    def test_column_detail_queries_are_constant(self):
+        self.assertConstantQueries(5, '/api/v1/boards/{0}/columns/1/'.format(self.board.pk))
+
+    def test_card_list_queries_are_constant(self):
+        self.assertConstantQueries(4, '/api/v1/boards/{0}/cards/'.format(self.board.pk))
+
+    def test_card_detail_queries_are_constant(self):
+        card = Card.objects.filter(board=self.board).first()
+        self.assertConstantQueries(4, '/api/v1/boards/{0}/cards/{1}/'.format(self.board.pk, card.pk))
+
+
+class QueryPlanAPIViewTest(TestCase):
+    """Test suite asserting the views' queries are answered from the composite indexes."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = setup_user()
+        self.board = Board(title='Test Board', created_by=self.user)
+        self.board.save()
+        setup_board_tree(self.board, self.user)
+        self.client.force_authenticate(self.user)
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                return ' '.join(str(row[-1]) for row in cursor.fetchall())
+            if connection.vendor == 'postgresql':
+                # Tiny test tables are cheapest to scan, so only an unusable index shows up
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('EXPLAIN ' + sql)
+            return ' '.join(str(row[0]) for row in cursor.fetchall())
+
+    def assertUsesIndex(self, names, url, table):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        plans = [
+            self.explain(query['sql']) for query in context.captured_queries
+            if query['sql'].startswith('SELECT') and 'FROM "{0}"'.format(table) in query['sql']
+        ]
+        self.assertTrue(plans)
+        self.assertTrue(
+            any(re.search(names, plan) for plan in plans), 'No index matching {0} in {1}'.format(names, plans)
+        )
+
+    def test_column_detail_uses_the_position_constraint(self):
+        self.assertUsesIndex(
+            r'boards_column_board_position_uniq|sqlite_autoindex_boards_column',
+            '/api/v1/boards/{0}/columns/1/'.format(self.board.pk), 'boards_column'
+        )
+
+    def test_card_list_uses_the_board_rank_index(self):
+        self.assertUsesIndex(
+            r'boards_card_board_rank_idx', '/api/v1/boards/{0}/cards/'.format(self.board.pk), 'boards_card'
+        )
+
+    def test_comment_prefetch_uses_the_card_date_index(self):
+        self.assertUsesIndex(
+            r'boards_comment_card_date_idx', '/api/v1/boards/{0}/'.format(self.board.pk), 'boards_comment'
+        )
+
+    def test_card_filters_use_the_through_table_indexes(self):
+        label = Label.objects.filter(board=self.board).first()
+        self.assertUsesIndex(
+            r'boards_card_labels_label_idx',
+            '/api/v1/boards/{0}/cards/?label={1}&label_match=all'.format(self.board.pk, label.pk), 'boards_card'
+        )
+        self.assertUsesIndex(
+            r'boards_card_assignees_user_idx',
+            '/api/v1/boards/{0}/cards/?assignee={1}'.format(self.board.pk, self.user.pk), 'boards_card'
+        )
+
+    def test_assigned_cards_use_the_assignee_index(self):
+        self.client.force_authenticate(self.user)
+        self.assertUsesIndex(r'boards_card_assignees_user_idx', '/api/v1/me/cards/', 'boards_card')
+
+    def test_reverse_relation_lookups_use_the_through_table_indexes(self):
+        label = Label.objects.filter(board=self.board).first()
+        for queryset, name in ((Card.objects.filter(assignees=self.user), r'boards_card_assignees_user_idx'),
+                               (Card.objects.filter(labels=label), r'boards_card_labels_label_idx')):
+            self.assertRegex(self.explain(str(queryset.query)), name)
+
+
+class CardFilterAPIViewTest(TestCase):
+    """Test suite for filtering the cards of a board."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = setup_user()
+        self.alice = get_user_model().objects.create_user('alice', email='alice@test.com', password='test')
+        self.board = Board(title='Test Board', created_by=self.user)
+        self.board.save()
+        self.todo = Column.objects.create(board=self.board, title='To Do', position=1)
+        self.doing = Column.objects.create(board=self.board, title='Doing', position=2)
+        self.bug = Label.objects.create(board=self.board, title='Bug')
+        self.urgent = Label.objects.create(board=self.board, title='Urgent')
+        cards = [
+            ('Urgent bug', self.doing, [self.bug, self.urgent], [self.alice], self.user),
+            ('Bug', self.doing, [self.bug], [self.user, self.alice], self.alice),
+            ('Urgent', self.todo, [self.urgent], [], self.user),
+            ('Plain', self.todo, [], [], self.alice),
+        ]
+        for title, column, labels, assignees, created_by in cards:
+            card = Card.objects.create(board=self.board, column=column, title=title, description='',
+                                       created_by=created_by)
+            card.labels.set(labels)
+            card.assignees.set(assignees)
+        self.client.force_authenticate(self.user)
+        warm_access(self.user, self.board)
+
+    def titles(self, query):
+        url = '/api/v1/boards/{0}/cards/?{1}'.format(self.board.pk, query)
+        # The filtered cards, their assignees, labels and comments: the same as without filters
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return sorted(card['title'] for card in response.data)
+
+    def test_api_filters_cards_by_labels(self):
+        self.assertEqual(self.titles('label={0}'.format(self.bug.pk)), ['Bug', 'Urgent bug'])
+        self.assertEqual(self.titles('label={0},{1}'.format(self.bug.pk, self.urgent.pk)),
+                         ['Bug', 'Urgent', 'Urgent bug'])
+        self.assertEqual(self.titles('label={0}&label={1}&label_match=all'.format(self.bug.pk, self.urgent.pk)),
+                         ['Urgent bug'])
+        self.assertEqual(self.titles('unlabelled=true'), ['Plain'])
+
+    def test_api_filters_cards_by_assignee_column_and_creator(self):
+        self.assertEqual(
+            self.titles('label={0}&assignee={1}&column={2}'.format(self.bug.pk, self.alice.pk, self.doing.pk)),
+            ['Bug', 'Urgent bug']
+        )
+        self.assertEqual(self.titles('assignee={0}'.format(self.user.pk)), ['Bug'])
+        self.assertEqual(self.titles('unassigned=true&column={0}'.format(self.todo.pk)), ['Plain', 'Urgent'])
+        self.assertEqual(self.titles('created_by={0}'.format(self.alice.pk)), ['Bug', 'Plain'])
+
+    def test_api_filters_cards_by_date(self):
+        Card.objects.filter(title='Plain').update(created_at=timezone.now() - timedelta(days=10),
+                                                 updated_at=timezone.now() - timedelta(days=5))
+        since = (timezone.now() - timedelta(days=1)).isoformat()
+        self.assertEqual(self.titles('created_after={0}'.format(quote(since))), ['Bug', 'Urgent', 'Urgent bug'])
+        self.assertEqual(self.titles('created_before={0}'.format(quote(since))), ['Plain'])
+        self.assertEqual(self.titles('updated_before={0}'.format(quote(since))), ['Plain'])
+
+    def test_api_filters_cards_by_their_last_edit(self):
+        Card.objects.update(updated_at=timezone.now() - timedelta(days=5))
+        since = quote((timezone.now() - timedelta(days=1)).isoformat())
+        self.assertEqual(self.titles('updated_before={0}'.format(since)), ['Bug', 'Plain', 'Urgent', 'Urgent bug'])
+        card = Card.objects.get(title='Plain')
+        response = self.client.put('/api/v1/boards/{0}/cards/{1}/'.format(self.board.pk, card.pk),
+                                   {'title': 'Edited', 'description': 'Edited description.'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.titles('updated_after={0}'.format(since)), ['Edited'])
+        self.assertEqual(self.titles('updated_before={0}'.format(since)), ['Bug', 'Urgent', 'Urgent bug'])
+
+    def test_api_rejects_invalid_filters(self):
+        url = '/api/v1/boards/{0}/cards/'.format(self.board.pk)
+        response = self.client.get(url + '?label=bug&label_match=some&created_after=yesterday')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(response.data), {'label', 'label_match', 'created_after'})
+
+
+class AssignedCardsAPIViewTest(TestCase):
+    """Test suite for the cards assigned to a user across boards."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = setup_user()
+        self.other = get_user_model().objects.create_user('other', email='other@test.com', password='test')
+        self.boards = [Board.objects.create(title='Board {0}'.format(i), created_by=self.user) for i in range(2)]
+        for board in self.boards:
+            columns = [Column.objects.create(board=board, title='Column {0}'.format(i), position=i) for i in range(2)]
+            for i in range(6):
+                card = Card.objects.create(board=board, column=columns[i % 2] if i < 5 else None,
+                                           title='{0} card {1}'.format(board.title, i), description='',
+                                           created_by=self.user)
+                card.assignees.set([self.user] if i % 3 else [self.other])
+        self.client.force_authenticate(self.user)
+
+    def test_api_lists_assigned_cards_grouped_by_board_and_column(self):
+        response = self.client.get('/api/v1/me/cards/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data['next'])
+        self.assertEqual([board['title'] for board in response.data['results']], ['Board 0', 'Board 1'])
+        self.assertEqual(
+            [(column['title'], [card['title'] for card in column['cards']])
+             for column in response.data['results'][0]['columns']],
+            [(None, ['Board 0 card 5']), ('Column 0', ['Board 0 card 2', 'Board 0 card 4']),
+             ('Column 1', ['Board 0 card 1'])]
+        )
+
+    def test_api_pages_through_assigned_cards_by_keyset(self):
+        def titles(data):
+            return [card['title'] for board in data['results'] for column in board['columns']
+                    for card in column['cards']]
+
+        expected = titles(self.client.get('/api/v1/me/cards/').data)
+        self.assertEqual(len(expected), 8)
+        seen, url = [], '/api/v1/me/cards/?page_size=3'
+        while url:
+            # The page of cards with their boards and columns, their assignees and their labels
+            with self.assertNumQueries(3):
+                response = self.client.get(url)
+            seen += titles(response.data)
+            url = response.data['next']
+        self.assertEqual(seen, expected)
+
+        response = self.client.get('/api/v1/me/cards/?cursor=nonsense')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        cursor = base64.urlsafe_b64encode(json.dumps([1, None, 'i0', 2 ** 70]).encode('utf-8')).decode('ascii')
+        self.assertEqual(self.client.get('/api/v1/me/cards/', {'cursor': cursor}).status_code,
+                         status.HTTP_404_NOT_FOUND)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get('/api/v1/me/cards/').status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class EmbeddedCommentsAPIViewTest(TestCase):
+    """Test suite for comment pagination and the embedding of the latest comments of cards."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = setup_user()
+        self.board = Board(title='Test Board', created_by=self.user)
+        self.board.save()
+        setup_board_tree(self.board, self.user, columns=2, cards=2, comments=3)
+        self.card = Card.objects.order_by('pk').first()
+        self.client.force_authenticate(self.user)
+        warm_access(self.user, self.board)
+
+    def test_api_paginates_comments_by_cursor(self):
+        url = '/api/v1/boards/{0}/cards/{1}/comments/?page_size=2'.format(self.board.pk, self.card.pk)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([comment['message'] for comment in response.data['results']], ['Comment 0.', 'Comment 1.'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([comment['message'] for comment in response.data['results']], ['Comment 2.'])
+        self.assertIsNone(response.data['next'])
+
+    def test_api_pages_through_comments_sharing_a_timestamp(self):
+        Comment.objects.filter(card=self.card).update(created_at=timezone.now())
+        url = '/api/v1/boards/{0}/cards/{1}/comments/?page_size=1'.format(self.board.pk, self.card.pk)
+        messages = []
+        while url:
+            response = self.client.get(url)
+            messages += [comment['message'] for comment in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(messages, ['Comment 0.', 'Comment 1.', 'Comment 2.'])
+
+    def test_api_rejects_cursors_of_values_of_the_wrong_type(self):
+        url = '/api/v1/boards/{0}/cards/{1}/comments/'.format(self.board.pk, self.card.pk)
+        for position in (['nope', 1], [None, 1], [timezone.now().isoformat(), 'one'], [{}, 1]):
+            cursor = base64.urlsafe_b64encode(json.dumps(position).encode('utf-8')).decode('ascii')
+            response = self.client.get(url, {'cursor': cursor})
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, position)
+
+    def test_api_embeds_the_latest_comments_of_every_card(self):
+        for url in ('/api/v1/boards/{0}/?comments=2', '/api/v1/boards/?tree=true&comments=2'):
+            with self.assertNumQueries(6):
+                response = self.client.get(url.format(self.board.pk))
+            data = response.data['results'][0] if 'results' in response.data else response.data
+            cards = [card for column in data['column_set'] for card in column['card_set']]
+            self.assertEqual(len(cards), 4)
+            for card in cards:
+                self.assertEqual([comment['message'] for comment in card['comment_set']], ['Comment 1.', 'Comment 2.'])
+                self.assertEqual(card['comment_count'], 3)
+
+    def test_api_embeds_the_latest_comments_of_cards_and_columns(self):
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/v1/boards/{0}/cards/?comments=1'.format(self.board.pk))
+        self.assertEqual([len(card['comment_set']) for card in response.data], [1, 1, 1, 1])
+        response = self.client.get('/api/v1/boards/{0}/cards/{1}/?comments=0'.format(self.board.pk, self.card.pk))
+        self.assertEqual((response.data['comment_set'], response.data['comment_count']), ([], 3))
+        response = self.client.get('/api/v1/boards/{0}/columns/1/?comments=1'.format(self.board.pk))
+        self.assertEqual(response.data['card_set'][0]['comment_set'][0]['message'], 'Comment 2.')
+        response = self.client.get('/api/v1/boards/{0}/columns/?comments=x'.format(self.board.pk))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SparseFieldsetsAPIViewTest(TestCase):
+    """Test suite for choosing fields and expansions with ?fields= and ?expand=."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = setup_user()
+        self.board = Board(title='Test Board', created_by=self.user)
+        self.board.save()
+        setup_board_tree(self.board, self.user, columns=2, cards=2, comments=2)
+        self.client.force_authenticate(self.user)
+        warm_access(self.user, self.board)
+
+    def get(self, url, num):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url.format(self.board.pk))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(context.captured_queries), num)
+        return response, ' '.join(query['sql'] for query in context.captured_queries)
+
+    def test_api_renders_and_loads_only_the_selected_fields(self):
+        response, sql = self.get('/api/v1/boards/{0}/?fields=title,column_set.title,column_set.card_set.title,'
+                                 'column_set.card_set.labels', 4)
+        self.assertEqual(response.data['title'], 'Test Board')
+        self.assertEqual(list(response.data), ['title', 'column_set'])
+        column = response.data['column_set'][0]
+        self.assertEqual(list(column), ['title', 'card_set'])
+        self.assertEqual(column['card_set'][0]['title'], 'Card 0')
+        self.assertEqual(len(column['card_set'][0]['labels']), 2)
+        self.assertIsInstance(column['card_set'][0]['labels'][0], int)
+        for column_name in ('description', 'header_color', 'email', 'boards_comment'):
+            self.assertNotIn(column_name, sql)
+
+    def test_api_expands_only_the_requested_relations(self):
+        response, sql = self.get('/api/v1/boards/{0}/?expand=column_set', 3)
+        column = response.data['column_set'][0]
+        self.assertEqual(column['title'], 'Column 1')
+        self.assertEqual(len(column['card_set']), 2)
+        self.assertIsInstance(column['card_set'][0], int)
+
+        response, sql = self.get('/api/v1/boards/{0}/cards/?fields=title,column,labels&expand=labels', 2)
+        self.assertEqual(list(response.data[0]), ['title', 'column', 'labels'])
+        self.assertEqual(response.data[0]['labels'][0]['title'], 'Red Label')
+        self.assertNotIn('description', sql)
+
+    def test_api_combines_fieldsets_with_embedded_comments(self):
+        response, sql = self.get('/api/v1/boards/{0}/cards/?fields=title,comment_set.message,comment_count'
+                                 '&comments=1', 2)
+        self.assertEqual(response.data[0], {
+            'title': 'Card 0', 'comment_set': [{'message': 'Comment 1.'}], 'comment_count': 2,
+        })
+
+    def test_api_narrows_board_summaries(self):
+        response, sql = self.get('/api/v1/boards/?fields=id,card_count', 1)
+        self.assertEqual(response.data['results'], [{'id': self.board.pk, 'card_count': 4}])
+        self.assertNotIn('title', sql)
+
+
+class StreamingListAPIViewTest(TestCase):
+    """Test suite for the lists streamed with ?stream=true."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = setup_user()
+        self.board = Board(title='Test Board', created_by=self.user)
+        self.board.save()
+        setup_board_tree(self.board, self.user, columns=2, cards=3, comments=3)
+        self.client.force_authenticate(self.user)
+
+    def stream(self, url):
+        with self.settings(STREAM_CHUNK_SIZE=2):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertTrue(response.streaming)
+            return json.loads(b''.join(response.streaming_content).decode('utf-8'))
+
+    def test_api_streams_the_same_cards_as_it_lists(self):
+        url = '/api/v1/boards/{0}/cards/?comments=1'.format(self.board.pk)
+        expected = json.loads(self.client.get(url).content.decode('utf-8'))
+        self.assertEqual(len(expected), 6)
+        self.assertEqual(self.stream(url + '&stream=true'), expected)
+
+    def test_api_streams_every_comment_and_board(self):
+        card = Card.objects.order_by('pk').first()
+        comments = self.stream('/api/v1/boards/{0}/cards/{1}/comments/?stream=true'.format(self.board.pk, card.pk))
+        self.assertEqual([comment['message'] for comment in comments], ['Comment 0.', 'Comment 1.', 'Comment 2.'])
+        for i in range(4):
+            Board.objects.create(title='Board {0}'.format(i), created_by=self.user)
+        boards = self.stream('/api/v1/boards/?stream=true&fields=id,title')
+        self.assertEqual([board['title'] for board in boards], ['Test Board'] + ['Board {0}'.format(i) for i in range(4)])
+
+
+class BoardArchiveAPIViewTest(TestCase):
+    """Test suite for the NDJSON export and import of boards."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = setup_user()
+        self.board = Board(title='Test Board', created_by=self.user)
+        self.board.save()
+        setup_board_tree(self.board, self.user, columns=2, cards=3, comments=3)
+
+    def test_api_exports_and_imports_a_board(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get('/api/v1/boards/{0}/export/'.format(self.board.pk))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        body = b''.join(response.streaming_content)
+        # A board, 2 columns, 2 labels, 6 cards, 12 label and 6 assignee links and 18 comments
+        self.assertEqual(len(body.splitlines()), 47)
+
+        response = self.client.generic('POST', '/api/v1/boards/import/?title=Copy', body,
+                                       content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            {key: response.data[key] for key in ('title', 'column_count', 'card_count', 'comment_count')},
+            {'title': 'Copy', 'column_count': 2, 'card_count': 6, 'comment_count': 18}
+        )
+
+    def test_api_rejects_an_invalid_import(self):
+        response = self.client.generic('POST', '/api/v1/boards/import/', b'', content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.force_authenticate(self.user)
+        response = self.client.generic('POST', '/api/v1/boards/import/', b'{"type": "column", "data": {}}\n',
+                                       content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Board.objects.count(), 1)
+
+
+class BoardCloneAPIViewTest(TestCase):
+    """Test suite for cloning boards and instantiating templates."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = setup_user()
+        self.board = Board(title='Test Board', created_by=self.user)
+        self.board.save()
+        setup_board_tree(self.board, self.user, columns=2, cards=3, comments=3)
+        self.client.force_authenticate(self.user)
+
+    def test_api_clones_a_board(self):
+        response = self.client.post('/api/v1/boards/{0}/clone/'.format(self.board.pk),
+                                    {'title': 'Copy', 'comments': True}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            {key: response.data[key]
+             for key in ('title', 'is_template', 'column_count', 'card_count', 'comment_count')},
+            {'title': 'Copy', 'is_template': False, 'column_count': 2, 'card_count': 6, 'comment_count': 18}
+        )
+
+    def test_api_lists_and_instantiates_templates(self):
+        response = self.client.post('/api/v1/boards/{0}/clone/'.format(self.board.pk),
+                                    {'title': 'Template', 'cards': False, 'is_template': True}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        template = response.data['id']
+
+        response = self.client.get('/api/v1/boards/?template=true')
+        self.assertEqual([board['title'] for board in response.data['results']], ['Template'])
+        response = self.client.get('/api/v1/boards/?template=false')
+        self.assertEqual([board['title'] for board in response.data['results']], ['Test Board'])
+
+        response = self.client.post('/api/v1/boards/{0}/clone/'.format(template), {'title': 'Sprint 1'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual((response.data['is_template'], response.data['column_count']), (False, 2))
+
+    def test_api_rejects_an_invalid_clone(self):
+        response = self.client.post('/api/v1/boards/{0}/clone/'.format(self.board.pk), {'cards': 'maybe'},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post('/api/v1/boards/999/clone/', {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class SearchAPIViewTest(TestCase):
+    """Test suite for the full-text search of cards and comments."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = setup_user()
+        self.board = Board(title='Test Board', created_by=self.user)
+        self.board.save()
+        setup_board_tree(self.board, self.user, columns=2, cards=3, comments=1)
+        other = Board.objects.create(title='Other Board', created_by=self.user)
+        Card.objects.create(board=other, title='Other card', description='', created_by=self.user)
+        self.client.force_authenticate(self.user)
+        warm_access(self.user, self.board)
+
+    def test_api_searches_a_board_a_page_at_a_time(self):
+        url = '/api/v1/boards/{0}/search/?q=card&limit=4'.format(self.board.pk)
+        # Board, count, page of hits, their cards and the cards' assignees and labels
+        with self.assertNumQueries(6):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 6)
+        self.assertEqual([hit['type'] for hit in response.data['results']], ['card'] * 4)
+        self.assertEqual(set(response.data['results'][0]['object']), {
+            'id', 'board', 'column', 'rank', 'title', 'description', 'description_html', 'created_by',
+            'assignees', 'labels',
+        })
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNone(response.data['next'])
+
+    def test_api_searches_comments_on_every_board(self):
+        response = self.client.get('/api/v1/search/?q=comment')
+        self.assertEqual(response.data['count'], 6)
+        self.assertEqual({hit['type'] for hit in response.data['results']}, {'comment'})
+        response = self.client.get('/api/v1/search/?q=other+card')
+        self.assertEqual([hit['object']['title'] for hit in response.data['results']], ['Other card'])
+        response = self.client.get('/api/v1/boards/999/search/?q=card')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ConditionalGetAPIViewTest(TestCase):
+    """Test suite for ETag / If-None-Match handling on board reads."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = setup_user()
+        self.board = Board(title='Test Board', created_by=self.user)
+        self.board.save()
+        setup_board_tree(self.board, self.user, columns=1, cards=1, comments=1)
+        self.card = Card.objects.get()
+        self.client.force_authenticate(self.user)
+
+    def assertNotModifiedWithoutQueries(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('"'))
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        return etag
+
+    def test_board_and_nested_reads_return_304_for_a_matching_etag(self):
+        urls = [
+            '/api/v1/boards/{0}/'.format(self.board.pk),
+            '/api/v1/boards/{0}/columns/'.format(self.board.pk),
+            '/api/v1/boards/{0}/labels/'.format(self.board.pk),
+            '/api/v1/boards/{0}/cards/{1}/'.format(self.board.pk, self.card.pk),
+            '/api/v1/boards/{0}/cards/{1}/comments/'.format(self.board.pk, self.card.pk),
+        ]
+        etags = [self.assertNotModifiedWithoutQueries(url) for url in urls]
+        self.assertEqual(len(set(etags)), len(urls))
+
+    def test_etag_changes_when_the_board_changes(self):
+        url = '/api/v1/boards/{0}/cards/{1}/'.format(self.board.pk, self.card.pk)
+        etag = self.assertNotModifiedWithoutQueries(url)
+        Comment.objects.create(card=self.card, message='New comment.', created_by=self.user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.data['comment_set']), 2)
+
+
+class BoardChangesAPIViewTest(TestCase):
+    """Test suite for the Board change feed API view."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = setup_user()
+        self.board = Board(title='Test Board', created_by=self.user)
+        self.board.save()
+        self.column = Column.objects.create(board=self.board, title='Backlog', position=1)
+        self.url = '/api/v1/boards/{0}/changes/'.format(self.board.pk)
+        self.client.force_authenticate(self.user)
+
+    def test_api_lists_all_changes_for_an_initial_sync(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(change['model'], change['action']) for change in response.data['changes']],
+            [('board', 'created'), ('column', 'created')]
+        )
+        self.assertEqual(response.data['changes'][1]['data']['title'], 'Backlog')
+        self.assertFalse(response.data['has_more'])
+
+    def test_api_lists_only_changes_after_the_cursor(self):
+        cursor = self.client.get(self.url).data['cursor']
+        label = Label.objects.create(board=self.board, title='Red Label', color='#FF0000')
+        card = Card.objects.create(board=self.board, column=self.column, title='Test Card',
+                                   description='Test Card description.', created_by=self.user)
+        card.labels.add(label)
+        self.column.title = 'Doing'
+        self.column.save()
+        label_pk = label.pk
+        label.delete()
+
+        with self.assertNumQueries(5):
+            response = self.client.get(self.url, {'since': cursor})
+        changes = {(change['model'], change['id']): change for change in response.data['changes']}
+        self.assertEqual(len(changes), 3)
+        self.assertEqual(changes[('column', self.column.pk)]['action'], 'updated')
+        self.assertEqual(changes[('column', self.column.pk)]['data']['title'], 'Doing')
+        self.assertEqual(changes[('card', card.pk)]['action'], 'created')
+        self.assertEqual(changes[('label', label_pk)]['action'], 'deleted')
+        self.assertIsNone(changes[('label', label_pk)]['data'])
+
+        response = self.client.get(self.url, {'since': response.data['cursor']})
+        self.assertEqual(response.data['changes'], [])
+
+    def test_api_pages_changes(self):
+        for position in range(2, 5):
+            Column.objects.create(board=self.board, title='Column', position=position)
+        response = self.client.get(self.url, {'limit': 3})
+        self.assertEqual(len(response.data['changes']), 3)
+        self.assertTrue(response.data['has_more'])
+        response = self.client.get(self.url, {'since': response.data['cursor'], 'limit': 3})
+        self.assertEqual(len(response.data['changes']), 2)
+        self.assertFalse(response.data['has_more'])
+
+    def test_api_lists_the_tombstone_of_a_deleted_board(self):
+        cursor = self.client.get(self.url).data['cursor']
+        board_pk = self.board.pk
+        self.board.delete()
+        response = self.client.get(self.url, {'since': cursor})
+        # The rows that went with the board are not logged one by one
+        self.assertEqual(
+            [(change['model'], change['id'], change['action']) for change in response.data['changes']],
+            [('board', board_pk, 'deleted')]
+        )
+
+
+class BoardEventsStreamTest(TestCase):
+    """Test suite for the Board server-sent events stream."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = setup_user()
+        self.board = Board(title='Test Board', created_by=self.user)
+        self.board.save()
+        self.token = Token.objects.get(user=self.user)
+
+    def stream(self, publish=(), headers=(), board_pk=None, token=None):
+        """Connect to the stream, publish events once subscribed, then disconnect and return the body."""
+        board_pk = board_pk or self.board.pk
+        token = self.token.key if token is None else token
+        headers = list(headers) + ([(b'authorization', 'Token {0}'.format(token).encode())] if token else [])
+        scope = {'type': 'http', 'method': 'GET', 'headers': headers,
+                 'path': '/api/v1/boards/{0}/events/'.format(board_pk)}
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        async def scenario():
+            messages = asyncio.Queue()
+            task = asyncio.ensure_future(board_events(scope, messages.get, send, str(board_pk)))
+            channel = events.board_channel(board_pk)
+            while not task.done() and events.get_backend().subscriber_count(channel) == 0:
+                await asyncio.sleep(0.01)
+            for event in publish:
+                events.publish(board_pk, event)
+            while not task.done() and len(sent) < 2:
+                await asyncio.sleep(0.01)
+            await messages.put({'type': 'http.disconnect'})
+            await task
+
+        async_to_sync(scenario)()
+        return sent[0]['status'], b''.join(message.get('body', b'') for message in sent[1:])
+
+    def test_stream_pushes_published_events(self):
+        status_code, body = self.stream(publish=[{'seq': 7, 'model': 'card', 'id': 1, 'action': 'created'}])
+        self.assertEqual(status_code, 200)
+        self.assertIn(b'id: 7\nevent: change\n', body)
+
+    def test_stream_replays_events_missed_since_last_event_id(self):
+        Column.objects.create(board=self.board, title='Backlog', position=1)
+        Column.objects.create(board=self.board, title='Done', position=2)
+        seqs = list(BoardChange.objects.filter(board_id=self.board.pk).values_list('pk', flat=True))
+        status_code, body = self.stream(headers=[(b'last-event-id', str(seqs[1]).encode())])
+        self.assertEqual(status_code, 200)
+        self.assertNotIn('id: {0}\n'.format(seqs[1]).encode(), body)
+        self.assertIn('id: {0}\n'.format(seqs[2]).encode(), body)
+
+    def test_stream_of_a_missing_board_is_not_found(self):
+        self.user.is_staff = True
+        self.user.save()
+        status_code, body = self.stream(board_pk=self.board.pk + 1)
+        self.assertEqual(status_code, 404)
+
+    def test_stream_needs_a_valid_token(self):
+        self.assertEqual(self.stream(token='')[0], 401)
+        self.assertEqual(self.stream(token='nonsense')[0], 401)
+
+    def test_stream_of_a_board_the_caller_cannot_see_is_forbidden(self):
+        other = get_user_model().objects.create_user('other', email='other@test.com', password='test')
+        self.assertEqual(self.stream(token=Token.objects.get(user=other).key)[0], 403)
+        self.assertEqual(self.stream(board_pk=self.board.pk + 1)[0], 403)
+
+
+class CardBulkAPIViewTest(TestCase):
+    """Test suite for the bulk Card API view."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = setup_user()
+        self.board = Board(title='Test Board', created_by=self.user)
+        self.board.save()
+        self.backlog = Column.objects.create(board=self.board, title='Backlog', position=1)
+        self.done = Column.objects.create(board=self.board, title='Done', position=2)
+        self.label = Label.objects.create(board=self.board, title='Red Label', color='#FF0000')
+        self.label2 = Label.objects.create(board=self.board, title='Green Label', color='#00FF00')
+        self.url = '/api/v1/boards/{0}/cards/bulk/'.format(self.board.pk)
+        self.client.force_authenticate(self.user)
+        warm_access(self.user, self.board)
+
+    def new_cards(self, count):
+        return [{
+            'column': self.backlog.pk,
+            'title': 'Card {0}'.format(i),
+            'description': 'Card description.',
+            'created_by': self.user.pk,
+            'labels': [self.label.pk],
+            'assignees': [self.user.pk],
+        } for i in range(count)]
+
+    def test_api_can_create_many_cards_in_constant_queries(self):
+        with self.assertNumQueries(22):
+            response = self.client.post(self.url, {'create': self.new_cards(3)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(22):
+            response = self.client.post(self.url, {'create': self.new_cards(30)}, format='json')
+        self.assertEqual(len(response.data['created']), 30)
+        self.assertEqual(response.data['created'][0]['labels'], [self.label.pk])
+        self.assertEqual(Card.objects.filter(board=self.board, assignees=self.user).count(), 33)
+
+    def test_api_can_move_relabel_and_unassign_many_cards(self):
+        created = self.client.post(self.url, {'create': self.new_cards(3)}, format='json').data['created']
+        response = self.client.post(self.url, {'update': [
+            {'id': card['id'], 'column': self.done.pk, 'labels': [self.label2.pk], 'assignees': []}
+            for card in created
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        cards = Card.objects.filter(board=self.board)
+        self.assertEqual(set(cards.values_list('column', flat=True)), {self.done.pk})
+        self.assertEqual(set(cards.values_list('labels', flat=True)), {self.label2.pk})
+        self.assertFalse(cards.filter(assignees__isnull=False).exists())
+        self.assertEqual(cards.filter(title='Card 0').count(), 1)
+
+    def test_api_reports_errors_per_item_and_writes_nothing(self):
+        other_board = Board.objects.create(title='Other Board', created_by=self.user)
+        foreign_label = Label.objects.create(board=other_board, title='Foreign Label', color='#0000FF')
+        items = self.new_cards(3)
+        items[1]['labels'] = [foreign_label.pk]
+        del items[2]['title']
+        response = self.client.post(self.url, {'create': items, 'update': [{'title': 'No id'}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['create'][0], {})
+        self.assertIn('labels', response.data['create'][1])
+        self.assertIn('title', response.data['create'][2])
+        self.assertIn('id', response.data['update'][0])
+        self.assertFalse(Card.objects.exists())
+
+    def test_api_rejects_updating_a_card_twice(self):
+        card = self.client.post(self.url, {'create': self.new_cards(1)}, format='json').data['created'][0]
+        response = self.client.post(self.url, {'update': [
+            {'id': card['id'], 'labels': [self.label.pk]},
+            {'id': card['id'], 'labels': [self.label2.pk]},
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['update'][0], {})
+        self.assertIn('id', response.data['update'][1])
+        self.assertEqual(list(Card.objects.get().labels.values_list('pk', flat=True)), [self.label.pk])
+
+
+class MoveAPIViewTest(TestCase):
+    """Test suite for the Column and Card move API views."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = setup_user()
+        self.board = Board(title='Test Board', created_by=self.user)
+        self.board.save()
+        setup_board_tree(self.board, self.user, columns=3, cards=3, comments=0)
+        self.columns = list(Column.objects.order_by('rank'))
+        self.cards = list(self.columns[0].card_set.order_by('rank'))
+        self.client.force_authenticate(self.user)
+
+    def test_api_can_move_a_column(self):
+        response = self.client.post(
+            '/api/v1/boards/{0}/columns/{1}/move/'.format(self.board.pk, self.columns[2].position),
+            {'after': self.columns[0].pk, 'before': self.columns[1].pk},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get('/api/v1/boards/{0}/columns/'.format(self.board.pk))
+        self.assertEqual([column['id'] for column in response.data],
+                         [self.columns[0].pk, self.columns[2].pk, self.columns[1].pk])
+
+    def test_api_can_move_a_card_to_the_top_of_another_column(self):
+        target = list(self.columns[1].card_set.order_by('rank'))
+        response = self.client.post(
+            '/api/v1/boards/{0}/cards/{1}/move/'.format(self.board.pk, self.cards[1].pk),
+            {'column': self.columns[1].pk, 'before': target[0].pk},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['column'], self.columns[1].pk)
+        response = self.client.get('/api/v1/boards/{0}/'.format(self.board.pk))
+        self.assertEqual([card['id'] for card in response.data['column_set'][1]['card_set']],
+                         [self.cards[1].pk] + [card.pk for card in target])
+
+    def test_api_rejects_neighbours_from_another_column(self):
+        other = self.columns[1].card_set.first()
+        response = self.client.post(
+            '/api/v1/boards/{0}/cards/{1}/move/'.format(self.board.pk, self.cards[0].pk),
+            {'after': other.pk},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('after', response.data)
+
+    def test_api_rejects_neighbours_out_of_order(self):
+        url = '/api/v1/boards/{0}/columns/{1}/move/'.format(self.board.pk, self.columns[2].position)
+        for after, before in ((self.columns[0], self.columns[0]), (self.columns[1], self.columns[0])):
+            response = self.client.post(url, {'after': after.pk, 'before': before.pk}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('before', response.data)
+        response = self.client.post(
+            '/api/v1/boards/{0}/cards/{1}/move/'.format(self.board.pk, self.cards[0].pk),
+            {'after': self.cards[2].pk, 'before': self.cards[1].pk},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BoardAccessAPIViewTest(TestCase):
+    """Test suite for access to boards through the projects of the caller's teams."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = setup_user()
+        self.other = get_user_model().objects.create_user('other', email='other@test.com', password='test')
+        self.project = Project.objects.create(title='Project')
+        self.team = Team.objects.create(name='Team')
+        self.team.projects.add(self.project)
+        self.membership = Membership.objects.create(user=self.user, team=self.team)
+        Membership.objects.create(user=self.other, team=self.team)
+
+        self.own = Board.objects.create(title='Own board', created_by=self.user)
+        self.shared = Board.objects.create(title='Shared board', created_by=self.other, project=self.project)
+        self.private = Board.objects.create(title='Private board', created_by=self.other)
+        self.private_card = Card.objects.create(board=self.private, title='Private card', description='',
+                                                created_by=self.other)
+        self.client.force_authenticate(self.user)
+
+    def titles(self):
+        response = self.client.get('/api/v1/boards/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [board['title'] for board in response.data['results']]
+
+    def test_api_lists_only_the_boards_of_the_callers_projects_and_own(self):
+        self.assertEqual(self.titles(), ['Own board', 'Shared board'])
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.titles(), ['Shared board', 'Private board'])
+
+    def test_api_hides_the_boards_of_others(self):
+        for url in ('/api/v1/boards/{0}/', '/api/v1/boards/{0}/cards/', '/api/v1/boards/{0}/export/',
+                    '/api/v1/boards/{0}/changes/'):
+            response = self.client.get(url.format(self.shared.pk))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            response = self.client.get(url.format(self.private.pk))
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get('/api/v1/boards/{0}/cards/{1}/'.format(self.private.pk, self.private_card.pk))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.post('/api/v1/boards/{0}/clone/'.format(self.private.pk), {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        self.client.force_authenticate(None)
+        response = self.client.get('/api/v1/boards/{0}/'.format(self.own.pk))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_api_hides_objects_of_other_boards_under_a_visible_one(self):
+        response = self.client.get('/api/v1/boards/{0}/cards/{1}/'.format(self.own.pk, self.private_card.pk))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_api_follows_changes_to_memberships_and_projects(self):
+        self.assertEqual(self.titles(), ['Own board', 'Shared board'])
+        self.membership.delete()
+        self.client.force_authenticate(get_user_model().objects.get(pk=self.user.pk))
+        self.assertEqual(self.titles(), ['Own board'])
+        response = self.client.get('/api/v1/boards/{0}/'.format(self.shared.pk))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        self.private.project = self.project
+        self.private.save()
+        self.client.force_authenticate(self.other)
+        response = self.client.get('/api/v1/boards/{0}/'.format(self.private.pk))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_api_checks_access_without_queries(self):
+        url = '/api/v1/boards/{0}/'.format(self.shared.pk)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        self.client.force_authenticate(get_user_model().objects.get(pk=self.user.pk))
+        # The snapshot of the board, the caller's projects and the board's project are all cached
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_api_only_moves_boards_into_the_callers_projects(self):
+        elsewhere = Project.objects.create(title='Elsewhere')
+        url = '/api/v1/boards/{0}/'.format(self.own.pk)
+        response = self.client.put(url, {'project': elsewhere.pk}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('project', response.data)
+        response = self.client.put(url, {'project': self.project.pk}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
@@ -40,15 +40,23 @@ schema_view = get_schema_view(
 urlpatterns = [
     # Boards
     path('boards/', views.BoardList.as_view(), name='board_list'),
+    path('boards/import/', views.BoardImport.as_view(), name='board_import'),
     path('boards/<int:board_pk>/', views.BoardDetail.as_view(), name='board_detail'),
+    path('boards/<int:board_pk>/changes/', views.BoardChanges.as_view(), name='board_changes'),
+    path('boards/<int:board_pk>/clone/', views.BoardClone.as_view(), name='board_clone'),
+    path('boards/<int:board_pk>/search/', views.Search.as_view(), name='board_search'),
+    path('boards/<int:board_pk>/export/', views.BoardExport.as_view(), name='board_export'),
 
     # Columns
     path('boards/<int:board_pk>/columns/', views.ColumnList.as_view(), name='column_list'),
     path('boards/<int:board_pk>/columns/<int:position>/', views.ColumnDetail.as_view(), name='column_detail'),
+    path('boards/<int:board_pk>/columns/<int:position>/move/', views.ColumnMove.as_view(), name='column_move'),
 
     # Cards
     path('boards/<int:board_pk>/cards/', views.CardList.as_view(), name='card_list'),
+    path('boards/<int:board_pk>/cards/bulk/', views.CardBulk.as_view(), name='card_bulk'),
     path('boards/<int:board_pk>/cards/<int:card_pk>/', views.CardDetail.as_view(), name='card_detail'),
+    path('boards/<int:board_pk>/cards/<int:card_pk>/move/', views.CardMove.as_view(), name='card_move'),
 
     # Labels
     path('boards/<int:board_pk>/labels/', views.LabelList.as_view(), name='label_list'),
@@ -59,6 +67,16 @@ urlpatterns = [
     path('boards/<int:board_pk>/cards/<int:card_pk>/comments/<int:comment_pk>/', views.CommentDetail.as_view(),
          name='card_comment_detail'),
 
+    # Cards assigned to the caller
+    path('me/cards/', views.AssignedCards.as_view(), name='assigned_cards'),
+
+    # Search
+    path('search/', views.Search.as_view(), name='search'),
+
+    # Stats
+    path('stats/cache/', views.CacheStats.as_view(), name='cache_stats'),
+    path('stats/tokens/', views.TokenCacheStats.as_view(), name='token_cache_stats'),
+
     # Swagger Docs
     path('swagger(<format>\.json|\.yaml)', schema_view.without_ui(cache_timeout=None), name='schema-json'),
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=None), name='schema-swagger-ui'),
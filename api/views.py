@@ -1,69 +1,261 @@
-from django.http import Http404
+import hashlib
+
+from django.conf import settings
+from django.http import Http404, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from rest_framework import status
 from rest_framework import generics
-from rest_framework.authentication import TokenAuthentication
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.views import APIView
 from rest_framework.response import Response
 
+from boards import cache as board_cache
+from boards import shards, tokens
+from boards.archive import ArchiveError, export_board, import_board
+from boards import changes as board_changes
+from boards import fieldsets
+from boards.bulk import BulkCardWrite
+from boards.clone import clone_board
+from boards.search import SearchResults
+from boards.tree import board_tree
+from boards.utils import iterate_in_chunks
 from boards.models import (
     Board, Column, Card, Comment, Label
 )
 from boards.serializers import (
-    BoardSerializer, ColumnSerializer, CardListSerializer,
-    CardCreateSerializer, CommentSerializer, LabelSerializer
+    BoardSerializer, BoardSummarySerializer, ColumnSerializer, CardListSerializer,
+    CardCreateSerializer, CardFlatSerializer, ColumnFlatSerializer, CommentSerializer, LabelSerializer,
+    MoveSerializer, CloneSerializer, SearchHitSerializer, CardFilterSerializer
 )
+from floboard.metrics import serializing
+from floboard.replicas import primary
 
+from .authentication import CachedTokenAuthentication
+from .permissions import HasBoardAccess
+from .pagination import AssignedCardPagination, BoardCursorPagination, CommentCursorPagination, SearchPagination
+from .renderers import FastJSONRenderer
 
-class BoardList(generics.ListCreateAPIView):
-    authentication_classes = (TokenAuthentication, )
-    # permission_classes = (IsAuthenticated, )
 
-    queryset = Board.objects.all()
-    serializer_class = BoardSerializer
+def board_etag(request, board_pk, **kwargs):
+    """
+    Strong ETag for any representation of a board or of something nested under it.
 
-    def get_queryset(self):
-        queryset = Board.objects.all()
+    It is derived from the board's cache version, which is bumped on every write, so computing
+    it (and answering a matching If-None-Match with a 304) does not touch the database.
+    """
+    version = board_cache.get_version(board_pk)
+    key = '{0}|{1}|{2}'.format(request.get_full_path(), request.META.get('HTTP_ACCEPT', ''), version)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+# Read from the primary: the version is bumped there, and a body read from a lagging replica
+# would go out under the new ETag and then be answered with 304s until the next write.
+board_condition = method_decorator([primary(), condition(etag_func=board_etag)], name='get')
+
+
+def wants_tree(request):
+    """Whether the caller asked for the full nested tree with ?tree=true."""
+    return request.query_params.get('tree', '').lower() in ('1', 'true', 'yes')
+
+
+def wants_stream(request):
+    """Whether the caller asked for the whole list streamed with ?stream=true."""
+    return request.query_params.get('stream', '').lower() in ('1', 'true', 'yes')
+
+
+def wants_templates(request):
+    """Whether the caller asked for only templates, only other boards or (None) both with ?template=."""
+    value = request.query_params.get('template')
+    if value is None:
+        return None
+    return value.lower() in ('1', 'true', 'yes')
+
+
+def embedded_comments(request):
+    """
+    How many of the latest comments of each card the caller asked for with ?comments=, or None
+    to embed them all.
+    """
+    value = request.query_params.get('comments')
+    if value is None:
+        return None
+    try:
+        count = int(value)
+    except ValueError:
+        raise ValidationError({'comments': ['Expected a number of comments.']})
+    return max(0, min(count, settings.EMBEDDED_COMMENTS_MAX))
 
-        return queryset
 
+def representation_context(request):
+    """Serializer context for the ?comments=, ?fields= and ?expand= the caller asked for."""
+    return {'comments': embedded_comments(request), 'fieldset': fieldsets.from_request(request)}
+
+
+def representation_variant(request):
+    """Key telling apart the representations representation_context() asks for."""
+    params = ['{0}={1}'.format(key, request.query_params[key])
+              for key in ('comments', 'fields', 'expand') if key in request.query_params]
+    return hashlib.sha1('&'.join(params).encode('utf-8')).hexdigest() if params else ''
+
+
+def tree_queryset(queryset, serializer_class, context):
+    """Load what serializer_class renders in context, in a fixed number of queries."""
+    if context.get('fieldset') is None:
+        return queryset.with_tree(comments=context.get('comments') is None)
+    return fieldsets.narrow(queryset, serializer_class(context=context), context['fieldset'])
+
+
+def embed_comments(objects, context):
+    """
+    Attach the latest ?comments= comments of the cards of boards, columns or cards, all in a
+    single query. Only cards already loaded with their parents are considered.
+    """
+    objects = list(objects)
+    if context.get('comments') is None:
+        return objects
+
+    def prefetched(obj, name):
+        return obj._prefetched_objects_cache.get(name, []) if hasattr(obj, '_prefetched_objects_cache') else []
+
+    cards = []
+    for obj in objects:
+        if isinstance(obj, Board):
+            cards.extend(card for column in prefetched(obj, 'column_set') for card in prefetched(column, 'card_set'))
+        elif isinstance(obj, Column):
+            cards.extend(prefetched(obj, 'card_set'))
+        else:
+            cards.append(obj)
+    Comment.objects.attach_latest(cards, context['comments'])
+    return objects
+
+
+class TreeViewMixin(object):
+    """Honour ?comments=, ?fields= and ?expand= in a generic view listing trees of objects."""
+
+    def get_serializer_context(self):
+        context = super(TreeViewMixin, self).get_serializer_context()
+        context.update(representation_context(self.request))
+        return context
+
+    def get_tree_queryset(self, queryset):
+        return tree_queryset(queryset, self.get_serializer_class(), self.get_serializer_context())
+
+    def get_serializer(self, *args, **kwargs):
+        if args and kwargs.get('many'):
+            args = (embed_comments(args[0], self.get_serializer_context()),) + args[1:]
+        return super(TreeViewMixin, self).get_serializer(*args, **kwargs)
+
+
+class StreamingListMixin(object):
+    """
+    Answer a generic list view's GET with ?stream=true with the whole list, unpaginated, as a
+    JSON array that is encoded while it is sent, loading STREAM_CHUNK_SIZE objects at a time.
+    """
 
+    def list(self, request, *args, **kwargs):
+        if not wants_stream(request):
+            return super(StreamingListMixin, self).list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        renderer = FastJSONRenderer()
+
+        def items():
+            for chunk in iterate_in_chunks(queryset, settings.STREAM_CHUNK_SIZE):
+                yield from self.get_serializer(chunk, many=True).data
+
+        return StreamingHttpResponse(renderer.render_stream(items()), content_type=renderer.media_type)
+
+
+class BoardList(StreamingListMixin, TreeViewMixin, generics.ListCreateAPIView):
+    """
+    List the boards the caller can see as summaries, or as full trees with ?tree=true, one page at
+    a time or all at once with ?stream=true. ?template=true lists only templates, ?template=false
+    only other boards.
+    """
+    authentication_classes = (CachedTokenAuthentication, )
+
+    queryset = Board.objects.all()
+    serializer_class = BoardSerializer
+    pagination_class = BoardCursorPagination
+
+    def get_queryset(self):
+        if self.request.method != 'GET':
+            return Board.objects.all()
+        queryset = Board.objects.visible_to(self.request.user).order_by('id')
+        templates = wants_templates(self.request)
+        if templates is not None:
+            queryset = queryset.filter(is_template=templates)
+        if wants_tree(self.request):
+            return shards.fan_out(self.get_tree_queryset(queryset))
+        context = self.get_serializer_context()
+        if context['fieldset'] is not None:
+            queryset = fieldsets.narrow(queryset, BoardSummarySerializer(context=context), context['fieldset'])
+        return shards.fan_out(queryset)
+
+    def get_serializer_class(self):
+        if self.request.method == 'GET' and not wants_tree(self.request):
+            return BoardSummarySerializer
+        return BoardSerializer
+
+    def perform_create(self, serializer):
+        serializer.save(created_by=self.request.user)
+
+
+@board_condition
 class BoardDetail(APIView):
     """
     Retrieve, update or delete a Board instance.
     """
 
-    def get_object(self, board_pk):
+    def get_object(self, board_pk, tree=True, context=None):
+        context = context or {}
+        queryset = tree_queryset(Board.objects.all(), BoardSerializer, context) if tree else Board.objects.all()
         try:
-            return Board.objects.get(pk=board_pk)
+            board = queryset.get(pk=board_pk)
         except Board.DoesNotExist:
             raise Http404
+        return embed_comments([board], context)[0]
 
     def get(self, request, board_pk):
-        board = self.get_object(board_pk)
-        serializer = BoardSerializer(board)
-        return Response(serializer.data)
+        context = representation_context(request)
+
+        def build():
+            if context['comments'] is None and context['fieldset'] is None:
+                with serializing():
+                    data = board_tree(board_pk)
+                if data is None:
+                    raise Http404
+                return data
+            board = self.get_object(board_pk, context=context)
+            return BoardSerializer(board, context=context).data
+
+        return Response(board_cache.get_snapshot(board_pk, build, representation_variant(request)))
 
     def put(self, request, board_pk):
         board = self.get_object(board_pk)
-        serializer = BoardSerializer(board, data=request.data, partial=True)
+        serializer = BoardSerializer(board, data=request.data, partial=True, context={'request': request})
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def delete(self, request, board_pk):
-        board = self.get_object(board_pk)
+        board = self.get_object(board_pk, tree=False)
         board.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class ColumnList(generics.ListCreateAPIView):
+@board_condition
+class ColumnList(TreeViewMixin, generics.ListCreateAPIView):
     queryset = Column.objects.all()
     serializer_class = ColumnSerializer
 
     def get_queryset(self):
-        queryset = Column.objects.filter(board_id=self.kwargs['board_pk']).order_by('position')
+        queryset = self.get_tree_queryset(
+            Column.objects.filter(board_id=self.kwargs['board_pk']).order_by('rank', 'pk')
+        )
         return queryset
 
     def post(self, request, *args, **kwargs):
@@ -81,20 +273,25 @@ class ColumnList(generics.ListCreateAPIView):
         return Response(serializer.errors, status.HTTP_400_BAD_REQUEST)
 
 
+@board_condition
 class ColumnDetail(APIView):
     """
         Retrieve, update or delete a Column instance.
         """
 
-    def get_object(self, board_pk, position):
+    def get_object(self, board_pk, position, tree=True, context=None):
+        context = context or {}
+        queryset = tree_queryset(Column.objects.all(), ColumnSerializer, context) if tree else Column.objects.all()
         try:
-            return Column.objects.get(board_id=board_pk, position=position)
+            column = queryset.get(board_id=board_pk, position=position)
         except Column.DoesNotExist:
             raise Http404
+        return embed_comments([column], context)[0]
 
     def get(self, request, board_pk, position):
-        column = self.get_object(board_pk, position)
-        serializer = ColumnSerializer(column)
+        context = representation_context(request)
+        column = self.get_object(board_pk, position, context=context)
+        serializer = ColumnSerializer(column, context=context)
         return Response(serializer.data)
 
     def put(self, request, board_pk, position):
@@ -106,11 +303,51 @@ class ColumnDetail(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def delete(self, request, board_pk, position):
-        column = self.get_object(board_pk, position)
+        column = self.get_object(board_pk, position, tree=False)
         column.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+def in_order(after, before):
+    """Whether the neighbours of a move, either of which may be None, are distinct and in order."""
+    return after is None or before is None or (after.rank, after.pk) < (before.rank, before.pk)
+
+
+class ColumnMove(APIView):
+    """
+    Move a column so it sorts right after the column `after` and/or right before the column
+    `before` (both ids), rewriting only the moved column's rank.
+    """
+
+    def post(self, request, board_pk, position):
+        try:
+            column = Column.objects.get(board_id=board_pk, position=position)
+        except Column.DoesNotExist:
+            raise Http404
+
+        serializer = MoveSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        data = serializer.validated_data
+        siblings = {sibling.pk: sibling for sibling in column.siblings().filter(
+            pk__in=[data.get(key) for key in ('after', 'before')]
+        )}
+        errors = {
+            key: ['Invalid pk "{0}" - not another column of this board.'.format(data[key])]
+            for key in ('after', 'before') if data.get(key) is not None and data[key] not in siblings
+        }
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        after, before = siblings.get(data.get('after')), siblings.get(data.get('before'))
+        if not in_order(after, before):
+            return Response({'before': ['Must be a column after "after".']}, status=status.HTTP_400_BAD_REQUEST)
+        column.move(after=after, before=before)
+        return Response(ColumnFlatSerializer(column).data)
+
+
+@board_condition
 class LabelList(generics.ListCreateAPIView):
     queryset = Label.objects.all()
     serializer_class = LabelSerializer
@@ -135,6 +372,7 @@ class LabelList(generics.ListCreateAPIView):
         return Response(serializer.errors, status.HTTP_400_BAD_REQUEST)
 
 
+@board_condition
 class LabelDetail(APIView):
     """
         Retrieve, update or delete a Label instance.
@@ -142,8 +380,8 @@ class LabelDetail(APIView):
 
     def get_object(self, board_pk, label_pk):
         try:
-            return Label.objects.get(pk=label_pk)
-        except Card.DoesNotExist:
+            return Label.objects.get(pk=label_pk, board_id=board_pk)
+        except Label.DoesNotExist:
             raise Http404
 
     def get(self, request, board_pk, label_pk):
@@ -165,12 +403,24 @@ class LabelDetail(APIView):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class CardList(generics.ListCreateAPIView):
+@board_condition
+class CardList(StreamingListMixin, TreeViewMixin, generics.ListCreateAPIView):
+    """
+    List the cards of a board, filtered by ?label= (with ?label_match=all: every label),
+    ?assignee=, ?column=, ?created_by=, ?created_after=, ?created_before=, ?updated_after=,
+    ?updated_before=, ?unassigned=true and ?unlabelled=true, or add one.
+    """
     queryset = Card.objects.all()
     serializer_class = CardListSerializer
 
     def get_queryset(self):
-        queryset = Card.objects.filter(board_id=self.kwargs['board_pk'])
+        filters = CardFilterSerializer(data=self.request.query_params)
+        if not filters.is_valid():
+            raise ValidationError(filters.errors)
+        queryset = self.get_tree_queryset(
+            Card.objects.filter(board_id=self.kwargs['board_pk']).matching(**filters.validated_data)
+            .order_by('column', 'rank', 'pk')
+        )
         return queryset
 
     def post(self, request, *args, **kwargs):
@@ -191,26 +441,25 @@ class CardList(generics.ListCreateAPIView):
         return Response(serializer.errors, status.HTTP_400_BAD_REQUEST)
 
 
+@board_condition
 class CardDetail(APIView):
     """
     Retrieve, update or delete a Card instance.
     """
 
-    def get_object(self, board_pk, card_pk):
+    def get_object(self, board_pk, card_pk, tree=True, context=None):
+        context = context or {}
+        queryset = tree_queryset(Card.objects.all(), CardListSerializer, context) if tree else Card.objects.all()
         try:
-            # board = Board.objects.get(pk=board_pk)
-            # columns = Column.objects.filter(board=board)
-            # TODO // Cards can exist outside of a column
-            return Card.objects.get(
-                pk=card_pk,
-                # column__in=columns
-            )
+            card = queryset.get(pk=card_pk, board_id=board_pk)
         except Card.DoesNotExist:
             raise Http404
+        return embed_comments([card], context)[0]
 
     def get(self, request, board_pk, card_pk):
-        card = self.get_object(board_pk, card_pk)
-        serializer = CardListSerializer(card)
+        context = representation_context(request)
+        card = self.get_object(board_pk, card_pk, context=context)
+        serializer = CardListSerializer(card, context=context)
         return Response(serializer.data)
 
     def put(self, request, board_pk, card_pk):
@@ -222,19 +471,98 @@ class CardDetail(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def delete(self, request, board_pk, card_pk):
-        card = self.get_object(board_pk, card_pk)
+        card = self.get_object(board_pk, card_pk, tree=False)
         card.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class CommentList(generics.ListCreateAPIView):
+class CardBulk(APIView):
+    """
+    Create, update, move, relabel or reassign many cards of a board in one transaction.
+    """
+
+    def post(self, request, board_pk):
+        try:
+            board = Board.objects.get(pk=board_pk)
+        except Board.DoesNotExist:
+            raise Http404
+
+        if not isinstance(request.data, dict):
+            return Response({'non_field_errors': ['Expected an object with "create" and/or "update" lists.']},
+                            status=status.HTTP_400_BAD_REQUEST)
+        items = [request.data.get(key) for key in ('create', 'update')]
+        if sum(len(value) for value in items if isinstance(value, list)) > settings.BULK_CARDS_MAX:
+            return Response({'non_field_errors': ['At most {0} cards per request.'.format(settings.BULK_CARDS_MAX)]},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        bulk = BulkCardWrite(board, request.data)
+        if not bulk.is_valid():
+            return Response(bulk.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        created, updated = bulk.save()
+        cards = Card.objects.filter(pk__in=[card.pk for card in created + updated]).with_related_pks()
+        data = {card.pk: CardFlatSerializer(card).data for card in cards}
+        return Response({
+            'created': [data[card.pk] for card in created],
+            'updated': [data[card.pk] for card in updated],
+        })
+
+
+class CardMove(APIView):
+    """
+    Move a card, optionally into another `column`, so it sorts right after the card `after` and/or
+    right before the card `before` (all ids), rewriting only the moved card's row.
+    """
+
+    def post(self, request, board_pk, card_pk):
+        try:
+            card = Card.objects.get(board_id=board_pk, pk=card_pk)
+        except Card.DoesNotExist:
+            raise Http404
+
+        serializer = MoveSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        data = serializer.validated_data
+        if 'column' in data:
+            try:
+                card.column = Column.objects.get(board_id=board_pk, pk=data['column']) if data['column'] else None
+            except Column.DoesNotExist:
+                return Response({'column': ['Invalid pk "{0}" - not a column of this board.'.format(data['column'])]},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+        siblings = {sibling.pk: sibling for sibling in card.siblings().filter(
+            pk__in=[data.get(key) for key in ('after', 'before')]
+        )}
+        errors = {
+            key: ['Invalid pk "{0}" - not another card of this column.'.format(data[key])]
+            for key in ('after', 'before') if data.get(key) is not None and data[key] not in siblings
+        }
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        after, before = siblings.get(data.get('after')), siblings.get(data.get('before'))
+        if not in_order(after, before):
+            return Response({'before': ['Must be a card after "after".']}, status=status.HTTP_400_BAD_REQUEST)
+        card.move(after=after, before=before)
+        return Response(CardFlatSerializer(Card.objects.with_related_pks().get(pk=card.pk)).data)
+
+
+@board_condition
+class CommentList(StreamingListMixin, generics.ListCreateAPIView):
+    """
+    List the comments of a card oldest first, a page at a time or all at once with ?stream=true,
+    or add one.
+    """
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
+    pagination_class = CommentCursorPagination
 
     def get_queryset(self):
         try:
             card = Card.objects.get(pk=self.kwargs['card_pk'], board_id=self.kwargs['board_pk'])
-            queryset = Comment.objects.filter(card=card)
+            queryset = Comment.objects.filter(card=card).order_by('created_at', 'pk')
         except (Card.DoesNotExist, Comment.DoesNotExist):
             raise Http404
         return queryset
@@ -255,6 +583,7 @@ class CommentList(generics.ListCreateAPIView):
         return Response(serializer.errors, status.HTTP_400_BAD_REQUEST)
 
 
+@board_condition
 class CommentDetail(APIView):
     """
     Retrieve, update or delete a Comment instance.
@@ -262,8 +591,7 @@ class CommentDetail(APIView):
 
     def get_object(self, board_pk, card_pk, comment_pk):
         try:
-            card = Card.objects.get(pk=card_pk)
-            return Comment.objects.get(pk=comment_pk, card=card)
+            return Comment.objects.get(pk=comment_pk, card_id=card_pk, card__board_id=board_pk)
         except Comment.DoesNotExist:
             raise Http404
 
@@ -284,3 +612,143 @@ class CommentDetail(APIView):
         comment = self.get_object(board_pk, card_pk, comment_pk)
         comment.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+@board_condition
+class BoardChanges(APIView):
+    """
+    List what changed on a board after the cursor given as ?since=, oldest first.
+    """
+
+    def get(self, request, board_pk):
+        try:
+            since = int(request.query_params.get('since', 0))
+            limit = int(request.query_params.get('limit', 100))
+        except ValueError:
+            return Response({'detail': 'since and limit must be integers.'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, 500))
+        # A deleted board still has a log, so only an initial sync needs the board to exist
+        if since == 0 and not Board.objects.filter(pk=board_pk).exists():
+            raise Http404
+        return Response(board_changes.changes_since(board_pk, since=since, limit=limit))
+
+
+class BoardClone(APIView):
+    """
+    Create a copy of a board, or a board from a template, owned by the caller: its columns and
+    labels and, unless `cards` is false, its cards with their labels and assignees and, if
+    `comments` is true, their comments.
+    """
+    permission_classes = (IsAuthenticated, HasBoardAccess)
+
+    def post(self, request, board_pk):
+        try:
+            board = Board.objects.get(pk=board_pk)
+        except Board.DoesNotExist:
+            raise Http404
+
+        serializer = CloneSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        clone = clone_board(board, request.user, **serializer.validated_data)
+        clone.refresh_from_db()
+        return Response(BoardSummarySerializer(clone).data, status=status.HTTP_201_CREATED)
+
+
+class BoardExport(APIView):
+    """
+    Stream a board with its columns, labels, cards and comments as newline-delimited JSON.
+    """
+
+    def get(self, request, board_pk):
+        if not Board.objects.filter(pk=board_pk).exists():
+            raise Http404
+        lines = export_board(board_pk, chunk_size=settings.ARCHIVE_BATCH_SIZE)
+        response = StreamingHttpResponse(lines, content_type='application/x-ndjson')
+        response['Content-Disposition'] = 'attachment; filename="board-{0}.ndjson"'.format(board_pk)
+        return response
+
+
+class BoardImport(APIView):
+    """
+    Create a new board, owned by the caller, from the newline-delimited JSON of a board export
+    sent as the request body, reading it a line at a time.
+    """
+    permission_classes = (IsAuthenticated, )
+
+    def post(self, request):
+        try:
+            # The underlying HttpRequest reads the body a line at a time
+            board = import_board(request._request, request.user, batch_size=settings.ARCHIVE_BATCH_SIZE,
+                                 title=request.query_params.get('title'))
+        except ArchiveError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        board.refresh_from_db()
+        return Response(BoardSummarySerializer(board).data, status=status.HTTP_201_CREATED)
+
+
+class AssignedCards(generics.ListAPIView):
+    """
+    List the cards assigned to the caller on every board they can see, grouped by board and by
+    column, a page of cards at a time. A board or column may continue on the next page.
+    """
+    permission_classes = (IsAuthenticated, )
+    serializer_class = CardFlatSerializer
+    pagination_class = AssignedCardPagination
+
+    def get_queryset(self):
+        return shards.fan_out(
+            Card.objects.assigned_to(self.request.user).filter(board__in=Board.objects.visible_to(self.request.user))
+            .select_related('board', 'column').with_related_pks()
+        )
+
+    def list(self, request, *args, **kwargs):
+        boards = []
+        for card in self.paginate_queryset(self.get_queryset()):
+            if not boards or boards[-1]['id'] != card.board_id:
+                boards.append({'id': card.board_id, 'title': card.board.title, 'columns': []})
+            columns = boards[-1]['columns']
+            if not columns or columns[-1]['id'] != card.column_id:
+                columns.append({'id': card.column_id, 'title': card.column and card.column.title, 'cards': []})
+            columns[-1]['cards'].append(self.get_serializer(card).data)
+        return self.get_paginated_response(boards)
+
+
+class Search(generics.ListAPIView):
+    """
+    Search the titles and descriptions of cards and the messages of comments for ?q=, on one
+    board or on every board the caller can see, best matches first, a page at a time.
+    """
+    serializer_class = SearchHitSerializer
+    pagination_class = SearchPagination
+
+    def get_queryset(self):
+        if 'board_pk' in self.kwargs:
+            if not Board.objects.filter(pk=self.kwargs['board_pk']).exists():
+                raise Http404
+            return SearchResults(self.request.query_params.get('q'), board_pks=[self.kwargs['board_pk']])
+        if self.request.user.is_staff:
+            return SearchResults(self.request.query_params.get('q'))
+        boards = shards.fan_out(Board.objects.visible_to(self.request.user).order_by('pk').only('pk'))
+        return SearchResults(self.request.query_params.get('q'), board_pks=[board.pk for board in boards])
+
+
+class CacheStats(APIView):
+    """
+    Hit, miss and rebuild counters of this process's board snapshot cache.
+    """
+    permission_classes = (IsAdminUser, )
+
+    def get(self, request):
+        return Response(board_cache.stats())
+
+
+class TokenCacheStats(APIView):
+    """
+    Hit, miss and invalidation counters and hit rate of this process's token cache.
+    """
+    permission_classes = (IsAdminUser, )
+
+    def get(self, request):
+        return Response(tokens.stats())
@@ -0,0 +1,60 @@
+"""
+Who can see a board: staff, the members of the teams of its project and, for a board without a
+project, its creator. See Board.objects.visible_to() for the same rule applied to lists.
+
+The project and creator of each board are cached for BOARD_ACCESS_TIMEOUT seconds and the
+projects of each user by projects.access, so checking access to a board usually costs no queries.
+boards.signals forgets the entry of a board when it is saved, and of the boards of a project
+when the project is deleted. A deleted board keeps its entry, so its change log stays readable.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from floboard.replicas import primary
+from projects.access import project_pks
+
+from .models import Board
+
+OWNER_KEY = 'access:board:{board_pk}'
+
+# Cached for boards that do not exist, as the cache cannot tell None from a miss
+MISSING = ()
+
+
+def _timeout():
+    return getattr(settings, 'BOARD_ACCESS_TIMEOUT', 60 * 60)
+
+
+def owner(board_pk):
+    """Return the (project id, creator id) of board board_pk, or None if there is no such board."""
+    key = OWNER_KEY.format(board_pk=board_pk)
+    entry = cache.get(key)
+    if entry is None:
+        # Cached for every request, so not from a replica that may lag behind a change
+        with primary():
+            row = Board.objects.filter(pk=board_pk).values_list('project_id', 'created_by_id').first()
+        entry = MISSING if row is None else tuple(row)
+        cache.set(key, entry, _timeout())
+    return entry or None
+
+
+def can_access(user, board_pk):
+    if user.is_staff:
+        return True
+    if not user.is_authenticated:
+        return False
+    entry = owner(board_pk)
+    if entry is None:
+        return False
+    project_pk, created_by_pk = entry
+    if project_pk is None:
+        return created_by_pk == user.pk
+    return project_pk in project_pks(user)
+
+
+def remember(board):
+    cache.set(OWNER_KEY.format(board_pk=board.pk), (board.project_id, board.created_by_id), _timeout())
+
+
+def forget(*board_pks):
+    cache.delete_many([OWNER_KEY.format(board_pk=pk) for pk in board_pks])
@@ -1,7 +1,9 @@
 from django.contrib import admin
+from django.db import NotSupportedError
 
 from rest_framework.authtoken.admin import TokenAdmin
 
+from . import search
 from .forms import LabelForm
 from .models import Board, Column, Card, Comment, Label
 
@@ -32,7 +34,8 @@ class CommentsInLine(admin.TabularInline):
 # Custom Admin Pages
 @admin.register(Board)
 class BoardAdmin(admin.ModelAdmin):
-    list_display = ('title', 'created_by', '_columns', '_cards', '_comments')
+    list_display = ('title', 'created_by', 'is_template', 'column_count', 'card_count', 'comment_count')
+    list_filter = ('is_template', )
 
     search_fields = ['title']
 
@@ -40,22 +43,10 @@ class BoardAdmin(admin.ModelAdmin):
         ColumnsInLine
     ]
 
-    def _columns(self, obj):
-        return Column.objects.filter(board=obj).count()
-
-    def _cards(self, obj):
-        columns = Column.objects.filter(board=obj)
-        return Card.objects.filter(column__in=columns).count()
-
-    def _comments(self, obj):
-        columns = Column.objects.filter(board=obj)
-        cards = Card.objects.filter(column__in=columns)
-        return Comment.objects.filter(card__in=cards).count()
-
 
 @admin.register(Column)
 class ColumnAdmin(admin.ModelAdmin):
-    list_display = ('title', 'board', 'position', '_cards', '_comments')
+    list_display = ('title', 'board', 'position', 'card_count', 'comment_count')
     search_fields = ['title']
 
     form = LabelForm
@@ -69,13 +60,6 @@ class ColumnAdmin(admin.ModelAdmin):
         CardsInLine
     ]
 
-    def _cards(self, obj):
-        return Card.objects.filter(column=obj).count()
-
-    def _comments(self, obj):
-        cards = Card.objects.filter(column=obj)
-        return Comment.objects.filter(card__in=cards).count()
-
 
 @admin.register(Label)
 class LabelAdmin(admin.ModelAdmin):
@@ -89,7 +73,7 @@ class LabelAdmin(admin.ModelAdmin):
 
 @admin.register(Card)
 class CardAdmin(admin.ModelAdmin):
-    list_display = ('title', 'column', 'short_description', 'display_assignees', 'display_labels', '_comments')
+    list_display = ('title', 'column', 'short_description', 'display_assignees', 'display_labels', 'comment_count')
 
     search_fields = ['title']
 
@@ -97,5 +81,12 @@ class CardAdmin(admin.ModelAdmin):
         CommentsInLine
     ]
 
-    def _comments(self, obj):
-        return Comment.objects.filter(card=obj).count()
+    def get_search_results(self, request, queryset, search_term):
+        # Served by the full-text index rather than a LIKE scan where there is one
+        if not search.terms(search_term):
+            return super(CardAdmin, self).get_search_results(request, queryset, search_term)
+        try:
+            return queryset.filter(pk__in=search.matching_cards(search_term)), False
+        except NotSupportedError:
+            return super(CardAdmin, self).get_search_results(request, queryset, search_term)
+
@@ -0,0 +1,298 @@
+"""
+Export and import of whole boards as newline-delimited JSON (NDJSON).
+
+An archive holds one record per line, {"type": ..., "data": {...}}, parents before children:
+the board, then its columns, labels, cards, card/label and card/assignee links and comments, in
+RECORD_TYPES order. Records refer to each other by the ids they had on export.
+
+export_board() reads each table with iterator(), so a board of any size is written a chunk of
+rows at a time. import_board() creates a new board from such lines: records are collected into
+batches that are written with bulk_create(), and the ids of the new columns, labels and cards are
+mapped from the exported ones in memory to link their children. Neither holds more than a chunk
+of rows at a time, only the old -> new id maps grow with the board.
+
+Users are not part of an archive: references to users that do not exist where the board is
+imported fall back to the importing user (authors) or are dropped (assignees, editors). Lists of
+columns or cards holding a malformed rank, e.g. from an older archive, are ranked again in their
+order. Every imported column, label, card and comment is entered in the change log of the board.
+"""
+import json
+import random
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.utils.dateparse import parse_datetime
+
+from . import counters, ranking, rendering, shards
+from .models import Board, BoardChange, Column, Label, Card, Comment
+from .signals import board_changed, objects_changed
+from .utils import bulk_create_with_pks
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Record type -> (model, exported fields); foreign keys are exported as ids under the field name
+RECORD_TYPES = {
+    'board': (Board, ('id', 'title', 'created_by', 'is_template')),
+    'column': (Column, ('id', 'title', 'position', 'rank', 'header_color')),
+    'label': (Label, ('id', 'title', 'color')),
+    'card': (Card, ('id', 'column', 'title', 'description', 'rank', 'created_at', 'updated_at', 'created_by')),
+    'card_label': (Card.labels.through, ('card', 'label')),
+    'card_assignee': (Card.assignees.through, ('card', 'user')),
+    'comment': (Comment, ('id', 'card', 'message', 'created_at', 'updated_at', 'created_by', 'updated_by')),
+}
+
+# Lookup from each record type to the board it belongs to
+BOARD_LOOKUPS = {
+    'board': 'pk',
+    'column': 'board',
+    'label': 'board',
+    'card': 'board',
+    'card_label': 'card__board',
+    'card_assignee': 'card__board',
+    'comment': 'card__board',
+}
+
+
+class ArchiveError(ValueError):
+    """An archive line that cannot be imported."""
+
+
+def dumps(record):
+    if orjson is not None:
+        return orjson.dumps(record) + b'\n'
+    return json.dumps(record, default=lambda value: value.isoformat()).encode('utf-8') + b'\n'
+
+
+def loads(line):
+    if orjson is not None:
+        return orjson.loads(line)
+    return json.loads(line)
+
+
+def export_board(board_pk, chunk_size=2000):
+    """Yield the lines of the archive of board board_pk, as bytes ending with a newline."""
+    alias = shards.shard_for(board_pk)
+    for record_type, (model, names) in RECORD_TYPES.items():
+        lookups = [model._meta.get_field(name).attname for name in names]
+        rows = model.objects.using(alias).filter(**{BOARD_LOOKUPS[record_type]: board_pk}).order_by('pk')
+        for row in rows.values_list(*lookups).iterator(chunk_size=chunk_size):
+            yield dumps({'type': record_type, 'data': dict(zip(names, row))})
+
+
+class BoardImport(object):
+    """
+    Create a board from the records of an archive, fed one line at a time with add().
+
+    Records of one type are written batch_size at a time, and whatever is pending is written
+    before a record of another type, so parents always exist before the children mapped to them.
+    """
+
+    def __init__(self, created_by, batch_size=1000, title=None, render=True):
+        self.created_by = created_by
+        self.batch_size = batch_size
+        self.title = title
+        self.render = render
+        self.board, self.has_board = None, False
+        self.ids = {'column': {}, 'label': {}, 'card': {}}
+        # Lists to rank again: None for the columns, else the id of the column of the cards
+        self.rerank = set()
+        self.pending_type, self.pending = None, []
+        self.line_number = 0
+
+    def add(self, line):
+        self.line_number += 1
+        if not line.strip():
+            return
+        try:
+            record = loads(line)
+            record_type, data = record['type'], record['data']
+        except (ValueError, TypeError, KeyError):
+            raise self.error('expected a JSON object with "type" and "data"')
+        if record_type not in RECORD_TYPES or not isinstance(data, dict):
+            raise self.error('unknown record type {0!r}'.format(record_type))
+        if self.has_board == (record_type == 'board'):
+            raise self.error('expected exactly one board record, before any other')
+        self.has_board = True
+
+        if record_type != self.pending_type:
+            self.flush()
+            self.pending_type = record_type
+        self.pending.append((self.line_number, data))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def error(self, message, line_number=None):
+        return ArchiveError('Line {0}: {1}.'.format(line_number or self.line_number, message))
+
+    def finish(self):
+        """Write what is still pending and the counters of the board, and return the board."""
+        self.flush()
+        if self.board is None:
+            raise ArchiveError('The archive holds no board.')
+        for column in self.rerank:
+            if column is None:
+                items = Column.objects.filter(board=self.board)
+            else:
+                items = Card.objects.filter(board=self.board, column_id=column)
+            items = list(items.order_by('rank', 'pk').only('pk', 'rank'))
+            type(items[0]).objects.bulk_update(ranking.rebalance(items), ['rank'], batch_size=self.batch_size)
+        counters.recount_board(self.board.pk)
+        board_changed(self.board.pk)
+        return self.board
+
+    def flush(self):
+        if self.pending:
+            getattr(self, 'create_' + self.pending_type)(self.pending)
+        self.pending = []
+
+    def field(self, line_number, data, name, default=None):
+        value = data.get(name)
+        if value is None:
+            if default is None:
+                raise self.error('missing {0!r}'.format(name), line_number)
+            return default
+        return value
+
+    def mapped(self, line_number, record_type, pk):
+        try:
+            return self.ids[record_type][pk]
+        except KeyError:
+            raise self.error('unknown {0} {1!r}'.format(record_type, pk), line_number)
+
+    def users(self, records, *names):
+        """Return the subset of the users referenced by names in records that exist."""
+        pks = {data.get(name) for _, data in records for name in names} - {None}
+        return set(User.objects.filter(pk__in=[pk for pk in pks if isinstance(pk, int)]).values_list('pk', flat=True))
+
+    def timestamp(self, line_number, value):
+        if value is None:
+            return None
+        parsed = parse_datetime(value) if isinstance(value, str) else None
+        if parsed is None:
+            raise self.error('invalid date and time {0!r}'.format(value), line_number)
+        return parsed
+
+    def rank(self, line_number, data, column=None):
+        """The rank of a record; a malformed one has its list, given by column, ranked again."""
+        value = self.field(line_number, data, 'rank')
+        if not isinstance(value, str):
+            raise self.error('invalid rank {0!r}'.format(value), line_number)
+        try:
+            ranking.validate(value)
+        except ValueError:
+            self.rerank.add(column)
+        return value[:Card._meta.get_field('rank').max_length]
+
+    def create(self, model, record_type, records, objs, timestamps=()):
+        """bulk_create() objs, mapping the exported ids of records to the new ones."""
+        exported = [[getattr(obj, name) for name in timestamps] for obj in objs] if timestamps else []
+        bulk_create_with_pks(model, objs, batch_size=self.batch_size)
+        # bulk_create() stamps auto_now(_add) fields with the current time, put the exported ones back
+        stamped = []
+        for obj, values in zip(objs, exported):
+            given = {name: value for name, value in zip(timestamps, values) if value is not None}
+            for name, value in given.items():
+                setattr(obj, name, value)
+            if given:
+                stamped.append(obj)
+        if stamped:
+            model.objects.bulk_update(stamped, list(timestamps), batch_size=self.batch_size)
+        objects_changed(self.board.pk, objs, BoardChange.CREATED)
+        if record_type in self.ids:
+            for (line_number, data), obj in zip(records, objs):
+                self.ids[record_type][data.get('id')] = obj.pk
+
+    def create_board(self, records):
+        line_number, data = records[0]
+        self.board = Board.objects.create(
+            title=self.title or self.field(line_number, data, 'title'), created_by=self.created_by,
+            is_template=bool(data.get('is_template')),
+        )
+
+    def create_column(self, records):
+        self.create(Column, 'column', records, [
+            Column(board=self.board, title=self.field(n, data, 'title'), position=self.field(n, data, 'position'),
+                   rank=self.rank(n, data), header_color=self.field(n, data, 'header_color', '#00FF00'))
+            for n, data in records
+        ])
+
+    def create_label(self, records):
+        self.create(Label, 'label', records, [
+            Label(board=self.board, title=self.field(n, data, 'title'), color=self.field(n, data, 'color', '#FF0000'))
+            for n, data in records
+        ])
+
+    def create_card(self, records):
+        users = self.users(records, 'created_by')
+        cards = []
+        for n, data in records:
+            column = data.get('column')
+            column = None if column is None else self.mapped(n, 'column', column)
+            card = Card(
+                board=self.board, column_id=column,
+                title=self.field(n, data, 'title'), description=self.field(n, data, 'description', ''),
+                rank=self.rank(n, data, column),
+                created_at=self.timestamp(n, data.get('created_at')),
+                updated_at=self.timestamp(n, data.get('updated_at')),
+                created_by_id=data['created_by'] if data.get('created_by') in users else self.created_by.pk,
+            )
+            if self.render:
+                rendering.refresh(card, 'description')
+            cards.append(card)
+        self.create(Card, 'card', records, cards, timestamps=('created_at', 'updated_at'))
+
+    def create_links(self, through, column, record_type, records, users=None):
+        links = {}
+        for n, data in records:
+            pk = self.field(n, data, column)
+            if users is not None and pk not in users:
+                continue
+            related = pk if users is not None else self.mapped(n, record_type, pk)
+            links[self.mapped(n, 'card', self.field(n, data, 'card')), related] = None
+        through.objects.bulk_create(
+            [through(card_id=card, **{column + '_id': pk}) for card, pk in links], batch_size=self.batch_size
+        )
+
+    def create_card_label(self, records):
+        self.create_links(Card.labels.through, 'label', 'label', records)
+
+    def create_card_assignee(self, records):
+        self.create_links(Card.assignees.through, 'user', 'user', records, users=self.users(records, 'user'))
+
+    def create_comment(self, records):
+        users = self.users(records, 'created_by', 'updated_by')
+        comments = []
+        for n, data in records:
+            comment = Comment(
+                card_id=self.mapped(n, 'card', self.field(n, data, 'card')),
+                message=self.field(n, data, 'message', ''),
+                created_at=self.timestamp(n, data.get('created_at')),
+                updated_at=self.timestamp(n, data.get('updated_at')),
+                created_by_id=data['created_by'] if data.get('created_by') in users else self.created_by.pk,
+                updated_by_id=data['updated_by'] if data.get('updated_by') in users else None,
+            )
+            if self.render:
+                rendering.refresh(comment, 'message')
+            comments.append(comment)
+        self.create(Comment, 'comment', records, comments, timestamps=('created_at', ))
+
+
+def import_board(lines, created_by, batch_size=1000, title=None, render=True):
+    """
+    Create a new board owned by created_by from the lines of an archive, in one transaction,
+    and return it. Raise ArchiveError, leaving nothing behind, if a line cannot be imported.
+
+    If render is False the Markdown of descriptions and messages is left for rerender_markdown.
+    """
+    archive = BoardImport(created_by, batch_size=batch_size, title=title, render=render)
+    alias = shards.current() or random.choice(shards.aliases())
+    try:
+        with shards.use(alias), transaction.atomic(using=alias):
+            for line in lines:
+                archive.add(line)
+            return archive.finish()
+    except IntegrityError as e:
+        raise ArchiveError('Line {0}: {1}.'.format(archive.line_number, e))
@@ -0,0 +1,178 @@
+"""
+Bulk create and update of the cards of a board.
+
+All the cards of a request are validated together and written in one transaction with a fixed
+number of queries: bulk inserts for new cards and their label/assignee links, one bulk update for
+changed cards, one delete plus one insert per through table for replaced labels/assignees, and
+one update each for the card counters of the board and of its columns.
+"""
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import changes, counters, rendering, shards
+from .models import Card, BoardChange
+from .ranking import key_between
+from .serializers import CardBulkItemSerializer
+from .signals import objects_changed
+from .utils import bulk_create_with_pks
+
+CARD_FIELDS = {'column': 'column_id', 'title': 'title', 'description': 'description', 'created_by': 'created_by_id'}
+
+
+def _pks(items, *fields):
+    """Collect the integer primary keys referenced by fields of possibly invalid items."""
+    pks = set()
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        for field in fields:
+            values = item.get(field)
+            for value in values if isinstance(values, list) else [values]:
+                try:
+                    pks.add(int(value))
+                except (TypeError, ValueError):
+                    pass
+    return pks
+
+
+class BulkCardWrite(object):
+    """
+    Create, update, move, relabel and reassign many cards of a board at once.
+
+    Used like a serializer: call is_valid(), then either read errors, which hold a list of per
+    item errors for each of 'create' and 'update', or call save().
+    """
+
+    def __init__(self, board, data):
+        self.board = board
+        self.create_data = data.get('create', [])
+        self.update_data = data.get('update', [])
+        self.errors = {}
+        self.created = []
+        self.updated = []
+        self.moved = []
+        self.last_ranks = None
+
+    def get_context(self):
+        items = list(self.create_data) + list(self.update_data)
+        board = self.board
+        self.cards = {
+            card.pk: card for card in Card.objects.filter(board=board, pk__in=_pks(self.update_data, 'id'))
+        }
+        return {
+            'cards': set(self.cards),
+            'columns': set(board.column_set.values_list('pk', flat=True)),
+            'labels': set(board.label_set.values_list('pk', flat=True)),
+            'users': set(User.objects.filter(pk__in=_pks(items, 'created_by', 'assignees')).values_list('pk', flat=True)),
+        }
+
+    def is_valid(self):
+        if not isinstance(self.create_data, list) or not isinstance(self.update_data, list):
+            self.errors = {'non_field_errors': ['Expected lists of cards in "create" and "update".']}
+            return False
+
+        context = self.get_context()
+        create = CardBulkItemSerializer(data=self.create_data, many=True, context=context)
+        update = CardBulkItemSerializer(data=self.update_data, many=True, partial=True, context=context)
+        valid = [create.is_valid(), update.is_valid()]
+        duplicates = self.get_duplicates()
+        if not all(valid) or any(duplicates):
+            update_errors = [dict(errors) for errors in update.errors] or [{} for _ in self.update_data]
+            for errors, duplicate in zip(update_errors, duplicates):
+                errors.update(duplicate)
+            self.errors = {'create': create.errors or [], 'update': update_errors}
+            return False
+
+        self.validated_create = create.validated_data
+        self.validated_update = update.validated_data
+        return True
+
+    def get_duplicates(self):
+        """Per update item, an error if an earlier item updates the same card, which is ambiguous."""
+        seen, duplicates = set(), []
+        for pk in (_pks([item], 'id') for item in self.update_data):
+            if pk & seen:
+                duplicates.append({'id': ['Card "{0}" is updated more than once.'.format(*pk)]})
+            else:
+                duplicates.append({})
+                seen |= pk
+        return duplicates
+
+    def append_rank(self, card):
+        """Rank a card after the last card of its column, including cards ranked by this write."""
+        if self.last_ranks is None:
+            self.last_ranks = dict(
+                Card.objects.filter(board=self.board).order_by().values_list('column').annotate(Max('rank'))
+            )
+        card.rank = self.last_ranks[card.column_id] = key_between(self.last_ranks.get(card.column_id) or None)
+
+    def save(self):
+        with transaction.atomic(using=shards.shard_for(self.board.pk)):
+            # Before any card is written, see boards.changes
+            changes.lock(self.board.pk)
+            self.created = self._create(self.validated_create)
+            self.updated = self._update(self.validated_update)
+            counters.cards_written(self.board.pk, created=self.created, moved=self.moved)
+            objects_changed(self.board.pk, self.created, BoardChange.CREATED)
+            objects_changed(self.board.pk, self.updated, BoardChange.UPDATED)
+        return self.created, self.updated
+
+    def _create(self, items):
+        cards = [
+            Card(board=self.board, **{CARD_FIELDS[field]: item[field] for field in CARD_FIELDS if field in item})
+            for item in items
+        ]
+        for card in cards:
+            self.append_rank(card)
+            rendering.refresh(card, 'description')
+        bulk_create_with_pks(Card, cards)
+        self._link(
+            (card, item) for card, item in zip(cards, items)
+        )
+        return cards
+
+    def _update(self, items):
+        cards, fields, relinked = [], set(), []
+        now = timezone.now()
+        for item in items:
+            card = self.cards[item['id']]
+            column_id = card.column_id
+            for field, attname in CARD_FIELDS.items():
+                if field in item:
+                    setattr(card, attname, item[field])
+                    fields.add(attname)
+            fields.update(rendering.refresh(card, 'description'))
+            if card.column_id != column_id:
+                self.append_rank(card)
+                fields.add('rank')
+                self.moved.append((card, column_id))
+                card.loaded_column_id = card.column_id
+            card.updated_at = now
+            cards.append(card)
+            relinked.append((card, item))
+
+        if cards:
+            # bulk_update() leaves auto_now fields alone
+            Card.objects.bulk_update(cards, sorted(fields | {'updated_at'}))
+        self._link(relinked, replace=True)
+        return cards
+
+    def _link(self, cards_and_items, replace=False):
+        """Write the labels/assignees of each card, replacing existing links if asked to."""
+        links = {'labels': ('label_id', []), 'assignees': ('user_id', [])}
+        replaced = {'labels': [], 'assignees': []}
+        for card, item in cards_and_items:
+            for field, (column, rows) in links.items():
+                if field not in item:
+                    continue
+                replaced[field].append(card.pk)
+                through = getattr(Card, field).through
+                rows.extend(through(card_id=card.pk, **{column: pk}) for pk in dict.fromkeys(item[field]))
+
+        for field, (column, rows) in links.items():
+            through = getattr(Card, field).through
+            if replace and replaced[field]:
+                through.objects.filter(card_id__in=replaced[field]).delete()
+            through.objects.bulk_create(rows)
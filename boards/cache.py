@@ -0,0 +1,172 @@
+"""
+Versioned cache of serialized board snapshots.
+
+Every board has a version counter in the cache which is bumped whenever the board or anything
+nested under it changes (see boards.signals). Snapshots are stored under a key that includes the
+version, so a bump invalidates them without having to find and delete anything.
+"""
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+
+from floboard.replicas import primary
+
+VERSION_KEY = 'board:{board_pk}:version'
+SNAPSHOT_KEY = 'board:{board_pk}:snapshot:{version}:{variant}'
+LOCK_KEY = 'board:{board_pk}:lock:{version}:{variant}'
+
+# Threads of one process building the same snapshot wait on the same lock. The locks are striped
+# so memory stays fixed no matter how many boards are read.
+_build_locks = [threading.Lock() for _ in range(64)]
+
+_stats_lock = threading.Lock()
+_stats = {
+    'hits': 0,
+    'misses': 0,
+    'rebuilds': 0,
+    'rebuild_seconds': 0.0,
+}
+
+
+def _snapshot_timeout():
+    return getattr(settings, 'BOARD_SNAPSHOT_TIMEOUT', 60 * 60)
+
+
+def _version_timeout():
+    return getattr(settings, 'BOARD_VERSION_TIMEOUT', 24 * 60 * 60)
+
+
+def _lock_timeout():
+    return getattr(settings, 'BOARD_SNAPSHOT_LOCK_TIMEOUT', 10)
+
+
+def _record(**increments):
+    with _stats_lock:
+        for name, value in increments.items():
+            _stats[name] += value
+
+
+def stats():
+    """Return a copy of this process's hit, miss and rebuild counters."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_stats():
+    with _stats_lock:
+        for name in _stats:
+            _stats[name] = type(_stats[name])()
+
+
+def _initial_version():
+    # Seeded from the clock so a version lost to eviction is never handed out again.
+    return int(time.time() * 1000)
+
+
+def get_version(board_pk):
+    """
+    Return the current version of a board, creating it if the cache has none.
+
+    Versions expire like any other key, so probing boards that do not exist cannot fill the cache;
+    a version that is gone only makes its board's snapshots rebuild under a new one.
+    """
+    key = VERSION_KEY.format(board_pk=board_pk)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), _version_timeout())
+        version = cache.get(key)
+    return version
+
+
+def bump_version(board_pk):
+    """Invalidate every snapshot of a board by moving it to a new version."""
+    key = VERSION_KEY.format(board_pk=board_pk)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = _initial_version()
+        cache.set(key, version, _version_timeout())
+        return version
+
+
+@lru_cache(maxsize=4096)
+def board_pk_for_card(card_pk, using=None):
+    """
+    Return the board of a card, in database `using` if given (card ids are unique per shard).
+    Cards never move between boards, so this is safe to memoize.
+    """
+    from .models import Card
+    return Card.objects.using(using).filter(pk=card_pk).values_list('board_id', flat=True).first()
+
+
+def board_pk_for(instance):
+    """Return the pk of the board an instance of Board, Column, Label, Card or Comment belongs to."""
+    from .models import Board, Comment
+
+    if isinstance(instance, Board):
+        return instance.pk
+    if isinstance(instance, Comment):
+        if 'card' in instance._state.fields_cache:
+            return instance.card.board_id
+        return board_pk_for_card(instance.card_id, instance._state.db)
+    return instance.board_id
+
+
+def get_snapshot(board_pk, build, variant=''):
+    """
+    Return the cached snapshot of a board, calling build() to create it on a miss.
+
+    Differently shaped representations of the same board are cached apart by `variant`.
+
+    Concurrent misses for the same board are coalesced: threads of the same process wait on a
+    lock, and other processes wait for whoever holds the lock key in the shared cache to finish,
+    so a burst of readers triggers a single rebuild. build() reads from the primary, as a replica
+    may not have the writes the version stands for yet.
+    """
+    version = get_version(board_pk)
+    key = SNAPSHOT_KEY.format(board_pk=board_pk, version=version, variant=variant)
+
+    snapshot = cache.get(key)
+    if snapshot is not None:
+        _record(hits=1)
+        return snapshot
+    _record(misses=1)
+
+    with _build_locks[hash(board_pk) % len(_build_locks)]:
+        snapshot = cache.get(key)
+        if snapshot is not None:
+            return snapshot
+
+        lock_key = LOCK_KEY.format(board_pk=board_pk, version=version, variant=variant)
+        locked = cache.add(lock_key, True, _lock_timeout())
+        if not locked:
+            snapshot = _wait_for(key, lock_key)
+            if snapshot is not None:
+                return snapshot
+
+        try:
+            started = time.perf_counter()
+            with primary():
+                snapshot = build()
+            _record(rebuilds=1, rebuild_seconds=time.perf_counter() - started)
+            cache.set(key, snapshot, _snapshot_timeout())
+        finally:
+            if locked:
+                cache.delete(lock_key)
+    return snapshot
+
+
+def _wait_for(key, lock_key, interval=0.05):
+    """Poll for a snapshot another process is building; give up when its lock goes away."""
+    deadline = time.monotonic() + _lock_timeout()
+    while time.monotonic() < deadline:
+        time.sleep(interval)
+        snapshot = cache.get(key)
+        if snapshot is not None:
+            return snapshot
+        if cache.get(lock_key) is None:
+            break
+    return None
@@ -0,0 +1,132 @@
+"""
+Per-board change log.
+
+Every create, update and delete of a Board, Column, Label, Card or Comment appends a BoardChange
+row (see boards.signals), except the deletes of the rows going with a deleted board, whose own
+tombstone stands for them. Its id is a monotonic cursor: a client that has seen everything up to
+cursor N only needs the rows with id > N, which the (board, id) index serves directly.
+
+Ids are handed out when rows are inserted, not when they commit, so on their own a transaction
+holding id N could commit after a reader moved past N + 1, and N would never be seen. Writers
+of a board's log therefore take the lock of its board row first and hold it until they commit:
+the entries of a board commit in the order of their ids. SQLite, which has no row locks, lets a
+single writer at a time in anyway. Transactions writing several objects should call lock() before
+their first write, so they do not wait for the board while holding rows another writer needs.
+
+The price is that the writes to a board are serialized, however far apart the rows they touch:
+two moves in different columns wait for each other's commit. Writes to different boards do not.
+"""
+from django.db import router, transaction
+
+from .models import Board, Column, Label, Card, Comment, BoardChange
+from .utils import bulk_create_with_pks
+from .serializers import (
+    BoardFlatSerializer, ColumnFlatSerializer, LabelSerializer, CardFlatSerializer, CommentSerializer
+)
+
+# Model name used in the log -> (model, queryset factory, serializer)
+TRACKED_MODELS = {
+    'board': (Board, lambda: Board.objects.all(), BoardFlatSerializer),
+    'column': (Column, lambda: Column.objects.all(), ColumnFlatSerializer),
+    'label': (Label, lambda: Label.objects.all(), LabelSerializer),
+    'card': (Card, lambda: Card.objects.with_related_pks(), CardFlatSerializer),
+    'comment': (Comment, lambda: Comment.objects.all(), CommentSerializer),
+}
+
+MODEL_NAMES = {model: name for name, (model, _, _) in TRACKED_MODELS.items()}
+
+
+def _alias(board_pk):
+    return router.db_for_write(BoardChange, instance=BoardChange(board_id=board_pk))
+
+
+def lock(board_pk, using=None):
+    """Lock the log of board_pk until the current transaction ends."""
+    using = using or _alias(board_pk)
+    features = transaction.get_connection(using).features
+    if features.has_select_for_update:
+        # FOR NO KEY UPDATE where there is one: inserting a column, card or comment takes FOR KEY
+        # SHARE on its board row, which FOR UPDATE would wait for and deadlock against
+        queryset = Board.objects.using(using).select_for_update(no_key=features.has_select_for_no_key_update)
+        list(queryset.filter(pk=board_pk).values_list('pk', flat=True))
+
+
+def record(board_pk, instance, action):
+    """Append an entry for instance to the log of board_pk."""
+    using = _alias(board_pk)
+    with transaction.atomic(using=using, savepoint=False):
+        lock(board_pk, using)
+        return BoardChange.objects.using(using).create(
+            board_id=board_pk,
+            model=MODEL_NAMES[type(instance)],
+            object_id=instance.pk,
+            action=action,
+        )
+
+
+def record_many(board_pk, instances, action):
+    """Append entries for many instances to the log of board_pk in a single insert."""
+    using = _alias(board_pk)
+    with transaction.atomic(using=using, savepoint=False):
+        lock(board_pk, using)
+        return bulk_create_with_pks(BoardChange, [
+            BoardChange(board_id=board_pk, model=MODEL_NAMES[type(instance)], object_id=instance.pk, action=action)
+            for instance in instances
+        ])
+
+
+def changes_since(board_pk, since=0, limit=100):
+    """
+    Return the changes to a board after cursor `since`, at most `limit` log entries at a time.
+
+    Several entries for the same object within the page collapse into one carrying the current
+    state of the object, or a tombstone (data None) if it no longer exists. The result holds the
+    cursor to pass as `since` next time and whether more entries are waiting.
+    """
+    entries = list(
+        BoardChange.objects.filter(board_id=board_pk, id__gt=since).order_by('id')[:limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    latest, created = {}, set()
+    for entry in entries:
+        key = (entry.model, entry.object_id)
+        if entry.action == BoardChange.CREATED:
+            created.add(key)
+        latest.pop(key, None)
+        latest[key] = entry
+
+    wanted = {}
+    for entry in latest.values():
+        if entry.action != BoardChange.DELETED:
+            wanted.setdefault(entry.model, []).append(entry.object_id)
+
+    data = {}
+    for name, pks in wanted.items():
+        model, queryset, serializer_class = TRACKED_MODELS[name]
+        for obj in queryset().filter(pk__in=pks):
+            data[(name, obj.pk)] = serializer_class(obj).data
+
+    changes = []
+    for key, entry in latest.items():
+        representation = data.get(key)
+        if representation is None:
+            action = BoardChange.DELETED
+        elif key in created:
+            action = BoardChange.CREATED
+        else:
+            action = entry.action
+        changes.append({
+            'seq': entry.pk,
+            'model': key[0],
+            'id': key[1],
+            'action': action,
+            'data': representation,
+        })
+
+    return {
+        'cursor': entries[-1].pk if entries else since,
+        'has_more': has_more,
+        'changes': changes,
+    }
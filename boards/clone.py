@@ -0,0 +1,88 @@
+"""
+Deep copies of boards, used to clone a board or to start a new one from a template.
+
+clone_board() copies the columns and labels of a board and, if asked to, its cards with their
+label and assignee links and their comments. Each table is read with one query and written with
+one bulk insert (split into several only where the backend limits the size of a query, as SQLite
+does), the new primary keys of the copied rows being mapped from the old ones in memory. So the
+number of queries depends on the number of tables copied, not on the size of the board. The
+copied rows are entered in the change log of the new board with one insert per table too.
+"""
+from django.db import transaction
+
+from . import counters, shards
+from .models import Board, BoardChange, Column, Label, Card, Comment
+from .signals import board_changed, objects_changed
+from .utils import bulk_create_with_pks
+
+
+def copy_rows(board_pk, queryset, values, keys=None):
+    """
+    Insert a copy of every row of queryset with the fields in `values` set to those values and
+    the foreign keys in `keys`, a {field: {old pk: new pk}} dict, mapped to the copied objects.
+    The copies are logged as created on the board they are copied to.
+
+    Return the {old pk: new pk} map of the copied rows.
+    """
+    model = queryset.model
+    keys = keys or {}
+    names = [
+        field.attname for field in model._meta.concrete_fields
+        if not field.primary_key and field.attname not in values
+    ]
+    rows = list(queryset.values_list('pk', *names))
+    objs = []
+    for row in rows:
+        fields = dict(zip(names, row[1:]), **values)
+        for name, pks in keys.items():
+            if fields[name] is not None:
+                fields[name] = pks[fields[name]]
+        objs.append(model(**fields))
+    bulk_create_with_pks(model, objs)
+    objects_changed(board_pk, objs, BoardChange.CREATED)
+    return {row[0]: obj.pk for row, obj in zip(rows, objs)}
+
+
+def copy_links(relation, card_pks, related_pks=None):
+    """Copy the card links of the many-to-many `relation` of Card between copied cards."""
+    through = relation.through
+    column = relation.field.m2m_reverse_name()
+    links = through.objects.filter(card_id__in=list(card_pks)).order_by('pk').values_list('card_id', column)
+    through.objects.bulk_create([
+        through(card_id=card_pks[card_pk], **{column: related_pks[pk] if related_pks is not None else pk})
+        for card_pk, pk in links
+    ])
+
+
+def clone_board(board, created_by, title=None, cards=True, comments=False, is_template=False):
+    """
+    Create a board owned by created_by with the columns and labels of board and, if `cards` is
+    set, its cards, their labels and assignees and, if `comments` is set too, their comments.
+
+    The copies start afresh: the new cards are created by created_by and copied comments keep
+    their authors but not their times, though they keep their order. The clone goes on the shard
+    of board.
+    """
+    with shards.for_board(board.pk) as alias, transaction.atomic(using=alias):
+        clone = Board.objects.create(title=title or board.title, created_by=created_by, is_template=is_template)
+        column_pks = copy_rows(clone.pk, Column.objects.filter(board=board), {'board_id': clone.pk})
+        label_pks = copy_rows(clone.pk, Label.objects.filter(board=board), {'board_id': clone.pk})
+
+        if cards:
+            card_pks = copy_rows(
+                clone.pk, Card.objects.filter(board=board).order_by('pk'),
+                {'board_id': clone.pk, 'created_by_id': created_by.pk, 'created_at': None, 'updated_at': None},
+                keys={'column_id': column_pks},
+            )
+            copy_links(Card.labels, card_pks, label_pks)
+            copy_links(Card.assignees, card_pks)
+            if comments:
+                copy_rows(
+                    clone.pk, Comment.objects.filter(card__board=board).order_by('created_at', 'pk'),
+                    {'created_at': None, 'updated_at': None, 'updated_by_id': None},
+                    keys={'card_id': card_pks},
+                )
+
+        counters.recount_board(clone.pk)
+        board_changed(clone.pk)
+    return clone
@@ -0,0 +1,146 @@
+"""
+Denormalized counts of the columns, cards and comments under boards, columns and cards.
+
+The counter columns are maintained by boards.signals and by the bulk card writes, always with F()
+expressions in the transaction of the write itself, so concurrent writers never lose an update.
+recount() recomputes them from the rows (see the repair_counters management command), and
+recount_board() those of a single board, e.g. after writing it with bulk inserts.
+"""
+from django.db.models import Case, Count, F, IntegerField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+from .cache import board_pk_for_card
+from .models import Board, Column, Card, Comment
+
+# Model -> counter field -> (counted model, lookup from the counted model to the counting one)
+COUNTERS = {
+    Board: {
+        'column_count': (Column, 'board'),
+        'card_count': (Card, 'board'),
+        'comment_count': (Comment, 'card__board'),
+    },
+    Column: {
+        'card_count': (Card, 'column'),
+        'comment_count': (Comment, 'card__column'),
+    },
+    Card: {
+        'comment_count': (Comment, 'card'),
+    },
+}
+
+
+def add(queryset, **deltas):
+    """Add deltas to the counters of the rows of queryset in one UPDATE."""
+    increments = {
+        field: F(field) + delta for field, delta in deltas.items() if not (isinstance(delta, int) and delta == 0)
+    }
+    if increments:
+        queryset.update(**increments)
+
+
+def add_many(model, deltas):
+    """Add deltas, a {pk: {field: delta}} dict, to the counters of many rows in one UPDATE."""
+    whens = {}
+    for pk, counts in deltas.items():
+        for field, delta in counts.items():
+            if delta:
+                whens.setdefault(field, []).append(When(pk=pk, then=Value(delta)))
+    if whens:
+        model.objects.filter(pk__in=list(deltas)).update(**{
+            field: F(field) + Case(*cases, default=Value(0), output_field=IntegerField())
+            for field, cases in whens.items()
+        })
+
+
+def column_added(column, sign=1):
+    add(Board.objects.filter(pk=column.board_id), column_count=sign)
+
+
+def card_added(card, sign=1):
+    add(Board.objects.filter(pk=card.board_id), card_count=sign)
+    if card.column_id is not None:
+        add(Column.objects.filter(pk=card.column_id), card_count=sign)
+
+
+def card_moved(card, from_column_id):
+    """Move the counts of a card from the column it was in to its current one."""
+    comments = Subquery(Card.objects.filter(pk=card.pk).values('comment_count'), output_field=IntegerField())
+    if from_column_id is not None:
+        add(Column.objects.filter(pk=from_column_id), card_count=-1, comment_count=-comments)
+    if card.column_id is not None:
+        add(Column.objects.filter(pk=card.column_id), card_count=1, comment_count=comments)
+
+
+def comment_added(comment, sign=1):
+    add(Card.objects.filter(pk=comment.card_id), comment_count=sign)
+    add(Column.objects.filter(card__pk=comment.card_id), comment_count=sign)
+    add(Board.objects.filter(pk=board_pk_for_card(comment.card_id, comment._state.db)), comment_count=sign)
+
+
+def cards_written(board_pk, created=(), moved=()):
+    """
+    Counterpart of card_added and card_moved for bulk writes: count the `created` cards and move
+    the counts of the `moved` ones, a list of (card, previous column id) pairs, in two UPDATEs.
+    """
+    columns = {}
+
+    def count(column_id, cards, comments):
+        if column_id is not None:
+            counts = columns.setdefault(column_id, {'card_count': 0, 'comment_count': 0})
+            counts['card_count'] += cards
+            counts['comment_count'] += comments
+
+    for card in created:
+        count(card.column_id, 1, 0)
+    for card, from_column_id in moved:
+        count(from_column_id, -1, -card.comment_count)
+        count(card.column_id, 1, card.comment_count)
+
+    add(Board.objects.filter(pk=board_pk), card_count=len(created))
+    add_many(Column, columns)
+
+
+def _actual(model, lookup):
+    return Coalesce(Subquery(
+        model.objects.filter(**{lookup: OuterRef('pk')})
+        .order_by().values(lookup).annotate(count=Count('pk')).values('count'),
+        output_field=IntegerField()
+    ), 0)
+
+
+def recount_board(board_pk):
+    """Recompute the counters of a board and of its columns and cards, one UPDATE per model."""
+    lookups = {Board: 'pk', Column: 'board', Card: 'board'}
+    for model, counters in COUNTERS.items():
+        model.objects.filter(**{lookups[model]: board_pk}).update(
+            **{field: _actual(*source) for field, source in counters.items()}
+        )
+
+
+def recount(batch_size=1000):
+    """
+    Recompute every counter from the rows it counts, a batch of rows per UPDATE, and return the
+    number of rows of each model that were off.
+
+    Each UPDATE computes the counts itself, so writes running meanwhile are not lost.
+    """
+    repaired = {}
+    for model, counters in COUNTERS.items():
+        actual = {field: _actual(*source) for field, source in counters.items()}
+        wrong = Q()
+        for field in counters:
+            wrong |= ~Q(**{field: F('actual_' + field)})
+
+        repaired[model._meta.model_name] = 0
+        pks = model.objects.order_by('pk').values_list('pk', flat=True)
+        last = 0
+        while True:
+            batch = list(pks.filter(pk__gt=last)[:batch_size])
+            if not batch:
+                break
+            last = batch[-1]
+            stale = model.objects.filter(pk__in=batch).annotate(
+                **{'actual_' + field: expression for field, expression in actual.items()}
+            ).filter(wrong).values_list('pk', flat=True)
+            repaired[model._meta.model_name] += model.objects.filter(pk__in=list(stale)).update(**actual)
+    return repaired
@@ -0,0 +1,149 @@
+"""
+Publish/subscribe of board events.
+
+Saving or deleting anything on a board publishes a small event (see boards.signals) on the
+board's channel once the transaction commits. Subscribers, such as the server-sent events stream
+in api.streaming, receive them through the backend named by the BOARD_EVENTS_BACKEND setting.
+
+Every subscription buffers a fixed number of events. A subscriber that falls further behind is
+not allowed to hold on to more memory: its buffer is dropped and it is told to resync, which it
+can do cheaply from the board's change feed.
+"""
+import asyncio
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+RESYNC = {'event': 'resync'}
+
+
+class Subscription(object):
+    """A bounded buffer of events for one subscriber, read from an asyncio event loop."""
+
+    def __init__(self, backend, channel, maxsize, loop=None):
+        self.backend = backend
+        self.channel = channel
+        self.overflowed = False
+        self._events = deque(maxlen=maxsize)
+        self._lock = threading.Lock()
+        self._loop = loop or asyncio.get_event_loop()
+        self._ready = asyncio.Event()
+
+    def put(self, event):
+        """Buffer an event; called from any thread and never blocks the publisher."""
+        with self._lock:
+            if len(self._events) == self._events.maxlen:
+                self._events.clear()
+                self.overflowed = True
+            self._events.append(event)
+        try:
+            self._loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            # The subscriber's event loop is gone; it will be unsubscribed on its way out
+            pass
+
+    def pending(self):
+        """Return and remove the buffered events, or a single resync event after an overflow."""
+        with self._lock:
+            if self.overflowed:
+                self._events.clear()
+                self.overflowed = False
+                return [RESYNC]
+            events = list(self._events)
+            self._events.clear()
+            return events
+
+    async def get(self, timeout=None):
+        """Wait up to timeout seconds for events and return them; an empty list on timeout."""
+        events = self.pending()
+        if events:
+            return events
+        self._ready.clear()
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        return self.pending()
+
+    def close(self):
+        self.backend.unsubscribe(self)
+
+
+class BaseBackend(object):
+    """Interface of a pub/sub backend."""
+
+    def publish(self, channel, event):
+        raise NotImplementedError
+
+    def subscribe(self, channel, maxsize=None, loop=None):
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        raise NotImplementedError
+
+
+class InProcessBackend(BaseBackend):
+    """
+    Delivers events to subscribers of the same process.
+
+    Suitable for tests and single-node deployments; a deployment running several processes needs
+    a backend that fans events out between them.
+    """
+
+    def __init__(self):
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def publish(self, channel, event):
+        with self._lock:
+            subscriptions = list(self._channels.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.put(event)
+
+    def subscribe(self, channel, maxsize=None, loop=None):
+        maxsize = maxsize or getattr(settings, 'BOARD_EVENTS_BUFFER_SIZE', 100)
+        subscription = Subscription(self, channel, maxsize, loop=loop)
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._channels.get(subscription.channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._channels[subscription.channel]
+
+    def subscriber_count(self, channel):
+        with self._lock:
+            return len(self._channels.get(channel, ()))
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Return the process-wide instance of the configured backend."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                path = getattr(settings, 'BOARD_EVENTS_BACKEND', 'boards.events.InProcessBackend')
+                _backend = import_string(path)()
+    return _backend
+
+
+def board_channel(board_pk):
+    return 'board:{0}'.format(board_pk)
+
+
+def publish(board_pk, event):
+    get_backend().publish(board_channel(board_pk), event)
+
+
+def subscribe(board_pk, **kwargs):
+    return get_backend().subscribe(board_channel(board_pk), **kwargs)
@@ -0,0 +1,169 @@
+"""
+Sparse fieldsets: callers choose the fields and nested objects they need with ?fields= and
+?expand=, and only those are loaded from the database and rendered.
+
+Both take comma separated, dotted paths through the nested serializers, e.g.
+
+    ?fields=id,title,column_set.title,column_set.card_set.title,column_set.card_set.labels
+
+Once either is given, a relation is rendered as a list of primary keys unless it is expanded,
+either by naming it in ?expand= or by selecting some of its fields. Without ?fields= at some
+level all the fields of that level are rendered.
+
+narrow() turns a selection into the only()/prefetch_related() plan of a queryset, so columns
+and relations that are not rendered are not loaded either.
+"""
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+
+class Selection(object):
+    """The fields (None for all) and expanded relations chosen at one level of the tree."""
+
+    def __init__(self):
+        self.fields = None
+        self.expanded = {}
+
+    def child(self, name):
+        """Return the selection for the expanded relation `name`, or None if it is not expanded."""
+        return self.expanded.get(name)
+
+    def expand(self, name):
+        return self.expanded.setdefault(name, Selection())
+
+    def select(self, name):
+        if self.fields is None:
+            self.fields = []
+        if name not in self.fields:
+            self.fields.append(name)
+
+
+def parse(fields=None, expand=None):
+    """Return the Selection for ?fields= and ?expand= values, or None if neither was given."""
+    if fields is None and expand is None:
+        return None
+
+    root = Selection()
+    for path in filter(None, (fields or '').split(',')):
+        selection, names = root, path.strip().split('.')
+        for name in names[:-1]:
+            selection.select(name)
+            selection = selection.expand(name)
+        selection.select(names[-1])
+    if fields is not None and root.fields is None:
+        root.fields = []
+
+    for path in filter(None, (expand or '').split(',')):
+        selection = root
+        for name in path.strip().split('.'):
+            selection = selection.expand(name)
+    return root
+
+
+def from_request(request):
+    return parse(request.query_params.get('fields'), request.query_params.get('expand'))
+
+
+def nested_serializer(field):
+    """Return the serializer nested as field, if any, and whether it renders a list."""
+    if isinstance(field, serializers.ListSerializer):
+        return field.child, True
+    if isinstance(field, serializers.BaseSerializer):
+        return field, False
+    return None, False
+
+
+def select_fields(fields, selection):
+    """Apply selection to the fields of a serializer, collapsing relations not expanded."""
+    if selection.fields is not None:
+        fields = type(fields)((name, fields[name]) for name in selection.fields if name in fields)
+    for name, field in list(fields.items()):
+        nested, many = nested_serializer(field)
+        if nested is not None and selection.child(name) is None:
+            source = {} if field.source in (None, name) else {'source': field.source}
+            fields[name] = serializers.PrimaryKeyRelatedField(read_only=True, many=many, **source)
+    return fields
+
+
+class SparseFieldsMixin(object):
+    """
+    Serializer mixin rendering only the fields selected by the Selection in the 'fieldset' of
+    the context. Subclasses that change their fields override get_unselected_fields().
+    """
+
+    def get_unselected_fields(self):
+        return super(SparseFieldsMixin, self).get_fields()
+
+    def get_fields(self):
+        fields = self.get_unselected_fields()
+        selection = self.get_selection()
+        if selection is None:
+            return fields
+        return select_fields(fields, selection)
+
+    def get_selection(self):
+        names, node = [], self
+        while node.parent is not None:
+            if node.field_name:
+                names.append(node.field_name)
+            node = node.parent
+        selection = self.context.get('fieldset')
+        for name in reversed(names):
+            if selection is None:
+                break
+            selection = selection.child(name)
+        return selection
+
+
+# Order of the objects of prefetched relations, by related model name
+PREFETCH_ORDERING = {
+    'column': ('rank', 'pk'),
+    'card': ('rank', 'pk'),
+    'comment': ('created_at', 'pk'),
+    'label': ('pk',),
+    'user': ('pk',),
+}
+
+
+def model_field(model, name):
+    """Return the field or relation of model behind the attribute `name`, or None."""
+    for field in model._meta.get_fields():
+        if (field.get_accessor_name() if field.auto_created and not field.concrete else field.name) == name:
+            return field
+    return None
+
+
+def narrow(queryset, serializer, selection, required=()):
+    """
+    Restrict queryset to loading what serializer renders for selection: only() the selected
+    columns, plus the `required` ones, and prefetch only the selected relations, down the tree.
+    """
+    model = queryset.model
+    fields = select_fields(serializer.get_unselected_fields(), selection)
+    only, prefetches = {model._meta.pk.name}.union(required), []
+
+    for name, field in fields.items():
+        # Bound, nested serializers see the context of the root one
+        field.bind(name, serializer)
+        relation = model_field(model, field.source)
+        if relation is None:
+            # Computed or attached by the view (e.g. latest_comments), nothing to load
+            continue
+
+        if relation.concrete and not relation.many_to_many:
+            only.add(relation.name)
+            continue
+
+        related = relation.related_model
+        # Prefetched objects are matched to their parent by this foreign key
+        keys = [relation.field.name] if relation.one_to_many else []
+        nested, _ = nested_serializer(field)
+        child = selection.child(name)
+        if nested is not None and child is not None:
+            related_queryset = narrow(related._default_manager.all(), nested, child, keys)
+        else:
+            related_queryset = related._default_manager.only(related._meta.pk.name, *keys)
+        related_queryset = related_queryset.order_by(*PREFETCH_ORDERING.get(related._meta.model_name, ()))
+        prefetches.append(Prefetch(field.source, queryset=related_queryset))
+
+    return queryset.only(*only).prefetch_related(*prefetches)
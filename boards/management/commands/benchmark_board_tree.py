@@ -0,0 +1,98 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, transaction
+from rest_framework.renderers import JSONRenderer
+
+from boards.models import Board, Column, Label, Card, Comment
+from boards.ranking import evenly_spaced
+from boards.serializers import BoardSerializer
+from boards.tree import board_tree
+from boards.utils import bulk_create_with_pks
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the time it takes to render a board tree to JSON with the serializers and with '
+        'boards.tree, on generated boards of the given sizes. Nothing is left in the database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cards', type=int, nargs='+', default=[1000, 10000, 50000],
+                            help='Number of cards of each board to benchmark.')
+        parser.add_argument('--columns', type=int, default=10, help='Number of columns of each board.')
+        parser.add_argument('--comments', type=int, default=2, help='Number of comments on each card.')
+        parser.add_argument('--repeat', type=int, default=3, help='Report the best of this many runs.')
+
+    def handle(self, *args, **options):
+        self.stdout.write('{0:>8} {1:>14} {2:>14} {3:>9}'.format('cards', 'serializers', 'boards.tree', 'speedup'))
+        for count in options['cards']:
+            with transaction.atomic():
+                board = self.generate(count, options['columns'], options['comments'])
+                self.benchmark(board, count, options['repeat'])
+                transaction.set_rollback(True)
+
+    def generate(self, count, columns, comments):
+        user = User.objects.create(username='benchmark-{0}'.format(time.time()))
+        board = Board.objects.create(title='Benchmark Board', created_by=user)
+        labels = [Label.objects.create(board=board, title='Label {0}'.format(i)) for i in range(5)]
+        columns = bulk_create_with_pks(Column, [
+            Column(board=board, title='Column {0}'.format(i), position=i, rank=rank)
+            for i, rank in enumerate(evenly_spaced(columns))
+        ])
+
+        per_column = -(-count // len(columns))
+        ranks = evenly_spaced(per_column)
+        cards = bulk_create_with_pks(Card, [
+            Card(board=board, column=columns[i // per_column], rank=ranks[i % per_column], created_by=user,
+                 title='Card {0}'.format(i), description='A *card* description.',
+                 description_html='<p>A <em>card</em> description.</p>')
+            for i in range(count)
+        ], batch_size=500)
+
+        Card.labels.through.objects.bulk_create([
+            Card.labels.through(card_id=card.pk, label_id=labels[(i + j) % len(labels)].pk)
+            for i, card in enumerate(cards) for j in range(2)
+        ], batch_size=500)
+        Card.assignees.through.objects.bulk_create([
+            Card.assignees.through(card_id=card.pk, user_id=user.pk) for card in cards
+        ], batch_size=500)
+        Comment.objects.bulk_create([
+            Comment(card=card, message='A comment.', message_html='<p>A comment.</p>', created_by=user)
+            for card in cards for _ in range(comments)
+        ], batch_size=500)
+        return board
+
+    def benchmark(self, board, count, repeat):
+        renderer = JSONRenderer()
+
+        def serializers():
+            return renderer.render(BoardSerializer(Board.objects.with_tree().get(pk=board.pk)).data)
+
+        def tree():
+            return renderer.render(board_tree(board.pk))
+
+        results = []
+        for build in (serializers, tree):
+            try:
+                timings, body = [], None
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    body = build()
+                    timings.append(time.perf_counter() - started)
+                results.append((min(timings), body))
+            except DatabaseError as e:
+                # e.g. SQLite's limit on query parameters, which prefetch_related can exceed
+                self.stderr.write('{0} failed at {1} cards: {2}'.format(build.__name__, count, e))
+                results.append((None, None))
+
+        (drf_time, drf_body), (tree_time, tree_body) = results
+        if drf_body is not None and drf_body != tree_body:
+            self.stderr.write('Outputs differ at {0} cards!'.format(count))
+        self.stdout.write('{0:>8} {1:>14} {2:>14} {3:>9}'.format(
+            count,
+            '{0:.1f} ms'.format(drf_time * 1000) if drf_time is not None else 'failed',
+            '{0:.1f} ms'.format(tree_time * 1000),
+            '{0:.1f}x'.format(drf_time / tree_time) if drf_time is not None else '-',
+        ))
@@ -0,0 +1,31 @@
+
+from django.core.management.base import BaseCommand, CommandError
+
+from boards.archive import export_board
+from boards.models import Board
+from boards.shards import shard_for
+
+
+class Command(BaseCommand):
+    help = (
+        'Write a board with its columns, labels, cards and comments as newline-delimited JSON, '
+        'a chunk of rows at a time, for import_board.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('board_pk', type=int, help='Id of the board to export.')
+        parser.add_argument('--output', default='-', help='File to write to, standard output by default.')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Read this many rows per query.')
+
+    def handle(self, *args, **options):
+        if not Board.objects.using(shard_for(options['board_pk'])).filter(pk=options['board_pk']).exists():
+            raise CommandError('Board {0} does not exist.'.format(options['board_pk']))
+
+        lines = export_board(options['board_pk'], chunk_size=options['chunk_size'])
+        if options['output'] == '-':
+            for line in lines:
+                self.stdout.write(line.decode('utf-8'), ending='')
+        else:
+            with open(options['output'], 'wb') as out:
+                out.writelines(lines)
@@ -0,0 +1,43 @@
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from boards.archive import ArchiveError, import_board
+
+
+class Command(BaseCommand):
+    help = (
+        'Create a new board from the newline-delimited JSON written by export_board, writing its '
+        'rows in batches with bulk inserts.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to read from, or - for standard input.')
+        parser.add_argument('--user', required=True, help='Username of the owner of the new board.')
+        parser.add_argument('--title', help='Title of the new board, instead of the exported one.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Insert this many rows per query.')
+        parser.add_argument('--no-render', action='store_true',
+                            help='Leave rendering the Markdown to rerender_markdown.')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError('User {0} does not exist.'.format(options['user']))
+
+        kwargs = {'batch_size': options['batch_size'], 'title': options['title'], 'render': not options['no_render']}
+        try:
+            if options['path'] == '-':
+                board = import_board(sys.stdin.buffer, user, **kwargs)
+            else:
+                with open(options['path'], 'rb') as lines:
+                    board = import_board(lines, user, **kwargs)
+        except ArchiveError as e:
+            raise CommandError(str(e))
+
+        board.refresh_from_db()
+        self.stdout.write('Imported board {0} with {1} columns, {2} cards and {3} comments.'.format(
+            board.pk, board.column_count, board.card_count, board.comment_count
+        ))
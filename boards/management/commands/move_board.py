@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from boards.shards import ShardError, move_board
+
+
+class Command(BaseCommand):
+    help = (
+        'Move a board with its columns, labels, cards, comments and change log to another shard, '
+        'keeping it readable throughout and refusing writes to it only while the last changes are copied.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('board_pk', type=int, help='Id of the board to move.')
+        parser.add_argument('shard', help='Alias of the database to move it to, one of BOARD_SHARDS.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Copy this many rows per query.')
+        parser.add_argument('--grace', type=float, default=2,
+                            help='Seconds to let the writes under way finish once writes are refused.')
+
+    def handle(self, *args, **options):
+        try:
+            source = move_board(options['board_pk'], options['shard'], batch_size=options['batch_size'],
+                                grace=options['grace'])
+        except ShardError as e:
+            raise CommandError(str(e))
+        self.stdout.write('Moved board {0} from {1} to {2}.'.format(options['board_pk'], source, options['shard']))
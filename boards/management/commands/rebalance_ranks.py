@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models.functions import Length
+
+from boards import changes, shards
+from boards.models import Column, Card, BoardChange
+from boards.ranking import rebalance
+from boards.signals import objects_changed
+
+
+class Command(BaseCommand):
+    help = (
+        'Respace the rank keys of every list of columns or cards holding a key longer than '
+        '--max-length. Meant to be run periodically, e.g. from cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-length', type=int, default=16,
+                            help='Rebalance lists with a rank longer than this many characters.')
+
+    def handle(self, *args, **options):
+        max_length = options['max_length']
+        lists = 0
+
+        # Every shard, as boards.shards only routes queries that name a board
+        for alias in shards.aliases():
+            long_columns = Column.objects.using(alias).annotate(rank_length=Length('rank')).filter(
+                rank_length__gt=max_length
+            )
+            for board_pk in long_columns.values_list('board_id', flat=True).distinct():
+                lists += self.rebalance(board_pk, Column.objects.filter(board_id=board_pk))
+
+            long_cards = Card.objects.using(alias).annotate(rank_length=Length('rank')).filter(
+                rank_length__gt=max_length
+            )
+            for board_pk, column_pk in long_cards.values_list('board_id', 'column_id').distinct():
+                lists += self.rebalance(board_pk, Card.objects.filter(board_id=board_pk, column_id=column_pk))
+
+        self.stdout.write('Rebalanced {0} lists.'.format(lists))
+
+    def rebalance(self, board_pk, queryset):
+        with shards.for_board(board_pk) as alias, transaction.atomic(using=alias):
+            changes.lock(board_pk, alias)
+            items = list(queryset.select_for_update().order_by('rank', 'pk').only('pk', 'rank'))
+            changed = rebalance(items)
+            queryset.model.objects.bulk_update(changed, ['rank'], batch_size=500)
+            objects_changed(board_pk, changed, BoardChange.UPDATED)
+        return 1
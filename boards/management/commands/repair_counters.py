@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from boards.counters import recount
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the card and comment counters of every board, column and card from the rows '
+        'they count, fixing those that drifted, e.g. after loading fixtures or raw SQL writes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Recount this many rows per query.')
+
+    def handle(self, *args, **options):
+        repaired = recount(batch_size=options['batch_size'])
+        for model_name, count in repaired.items():
+            self.stdout.write('Repaired {0} {1} counters.'.format(count, model_name))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from boards.models import Card, Comment
+from boards.rendering import RENDERER_VERSION, rerender
+
+
+class Command(BaseCommand):
+    help = (
+        'Render the Markdown of card descriptions and comment messages whose stored HTML is out of '
+        'date, e.g. after the renderer version was bumped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Render every description and message, even if up to date.')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Save this many rows per query.')
+
+    def handle(self, *args, **options):
+        cards = rerender(Card.objects.all(), 'description', options['force'], options['batch_size'])
+        comments = rerender(Comment.objects.all(), 'message', options['force'], options['batch_size'])
+        self.stdout.write('Rendered {0} cards and {1} comments with renderer version {2}.'.format(
+            cards, comments, RENDERER_VERSION
+        ))
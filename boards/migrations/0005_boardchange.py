@@ -0,0 +1,29 @@
+# Generated by Django 3.2.25 on 2026-10-17 20:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boards', '0004_column_header_color'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BoardChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=16)),
+                ('object_id', models.IntegerField()),
+                ('action', models.CharField(choices=[('created', 'Created'), ('updated', 'Updated'), ('deleted', 'Deleted')], max_length=8)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('board', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='boards.board')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='boardchange',
+            index=models.Index(fields=['board', 'id'], name='boards_change_board_seq_idx'),
+        ),
+    ]
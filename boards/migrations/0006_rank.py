@@ -0,0 +1,52 @@
+# Generated by Django 3.2.25 on 2026-10-17 20:45
+
+from django.db import migrations, models
+
+from boards.ranking import evenly_spaced
+
+
+def rank_existing(apps, schema_editor):
+    """Rank columns by position and cards by id, which is how they were ordered before."""
+    Column = apps.get_model('boards', 'Column')
+    Card = apps.get_model('boards', 'Card')
+    alias = schema_editor.connection.alias
+
+    def assign(model, items):
+        for item, rank in zip(items, evenly_spaced(len(items))):
+            item.rank = rank
+        model.objects.using(alias).bulk_update(items, ['rank'], batch_size=500)
+
+    for board_id in Column.objects.using(alias).values_list('board_id', flat=True).distinct():
+        assign(Column, list(Column.objects.using(alias).filter(board_id=board_id).order_by('position', 'pk')))
+
+    for board_id, column_id in Card.objects.using(alias).values_list('board_id', 'column_id').distinct():
+        assign(Card, list(Card.objects.using(alias).filter(board_id=board_id, column_id=column_id).order_by('pk')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boards', '0005_boardchange'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='card',
+            name='rank',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='column',
+            name='rank',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(rank_existing, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='card',
+            index=models.Index(fields=['column', 'rank'], name='boards_card_column_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='column',
+            index=models.Index(fields=['board', 'rank'], name='boards_column_board_rank_idx'),
+        ),
+    ]
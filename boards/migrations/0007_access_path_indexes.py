@@ -0,0 +1,55 @@
+# Generated by Django 3.2.25 on 2026-10-17 20:48
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+import boards.operations
+
+
+def renumber_duplicate_positions(apps, schema_editor):
+    """Move all but the first of the columns sharing a position on a board to new positions."""
+    Column = apps.get_model('boards', 'Column')
+    alias = schema_editor.connection.alias
+    columns = Column.objects.using(alias)
+    duplicates = columns.values('board_id', 'position').annotate(count=Count('pk')).filter(count__gt=1).order_by()
+    for duplicate in duplicates:
+        shared = columns.filter(board_id=duplicate['board_id'], position=duplicate['position']).order_by('pk')
+        last = columns.filter(board_id=duplicate['board_id']).aggregate(last=Max('position'))['last']
+        for offset, column in enumerate(shared[1:], start=1):
+            column.position = last + offset
+            column.save(update_fields=['position'], using=alias)
+
+
+class Migration(migrations.Migration):
+
+    # PostgreSQL cannot build indexes concurrently inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('boards', '0006_rank'),
+    ]
+
+    operations = [
+        migrations.RunPython(renumber_duplicate_positions, migrations.RunPython.noop, atomic=True),
+        boards.operations.AddUniqueConstraintConcurrently(
+            model_name='column',
+            constraint=models.UniqueConstraint(fields=('board', 'position'), name='boards_column_board_position_uniq'),
+        ),
+        boards.operations.AddIndexConcurrently(
+            model_name='card',
+            index=models.Index(fields=['board', 'column', 'rank'], name='boards_card_board_rank_idx'),
+        ),
+        boards.operations.AddIndexConcurrently(
+            model_name='comment',
+            index=models.Index(fields=['card', 'created_at'], name='boards_comment_card_date_idx'),
+        ),
+        # Reverse lookups of a user's or a label's cards, answered from the index alone
+        boards.operations.AddTableIndex(
+            table='boards_card_assignees', columns=['user_id', 'card_id'], name='boards_card_assignees_user_idx',
+        ),
+        boards.operations.RemoveRedundantIndex(table='boards_card_assignees', columns=['user_id']),
+        boards.operations.AddTableIndex(
+            table='boards_card_labels', columns=['label_id', 'card_id'], name='boards_card_labels_label_idx',
+        ),
+        boards.operations.RemoveRedundantIndex(table='boards_card_labels', columns=['label_id']),
+    ]
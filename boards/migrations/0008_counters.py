@@ -0,0 +1,68 @@
+# Generated by Django 3.2.25 on 2026-10-17 20:51
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_existing(apps, schema_editor):
+    """Fill in the counters of the existing boards, columns and cards."""
+    Board = apps.get_model('boards', 'Board')
+    Column = apps.get_model('boards', 'Column')
+    Card = apps.get_model('boards', 'Card')
+    Comment = apps.get_model('boards', 'Comment')
+
+    def count(model, lookup):
+        return Coalesce(Subquery(
+            model.objects.filter(**{lookup: OuterRef('pk')})
+            .order_by().values(lookup).annotate(count=Count('pk')).values('count'),
+            output_field=IntegerField()
+        ), 0)
+
+    Board.objects.update(
+        column_count=count(Column, 'board'), card_count=count(Card, 'board'),
+        comment_count=count(Comment, 'card__board'),
+    )
+    Column.objects.update(card_count=count(Card, 'column'), comment_count=count(Comment, 'card__column'))
+    Card.objects.update(comment_count=count(Comment, 'card'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boards', '0007_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='board',
+            name='card_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='board',
+            name='column_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='board',
+            name='comment_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='card',
+            name='comment_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='column',
+            name='card_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='column',
+            name='comment_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_existing, migrations.RunPython.noop),
+    ]
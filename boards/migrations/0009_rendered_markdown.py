@@ -0,0 +1,41 @@
+# Generated by Django 3.2.25 on 2026-10-17 20:53
+
+from django.db import migrations, models
+
+from boards.rendering import rerender
+
+
+def render_existing(apps, schema_editor):
+    rerender(apps.get_model('boards', 'Card').objects.all(), 'description')
+    rerender(apps.get_model('boards', 'Comment').objects.all(), 'message')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boards', '0008_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='card',
+            name='description_hash',
+            field=models.CharField(blank=True, editable=False, max_length=40),
+        ),
+        migrations.AddField(
+            model_name='card',
+            name='description_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='message_hash',
+            field=models.CharField(blank=True, editable=False, max_length=40),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='message_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(render_existing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-17 21:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boards', '0009_rendered_markdown'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='board',
+            name='is_template',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.2.25 on 2026-10-17 21:20
+
+from django.db import migrations
+
+import boards.operations
+
+
+class Migration(migrations.Migration):
+
+    # PostgreSQL cannot build indexes concurrently inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('boards', '0010_board_is_template'),
+    ]
+
+    operations = [
+        boards.operations.AddFullTextIndex(
+            table='boards_card', columns=['title', 'description'], name='boards_card_search',
+        ),
+        boards.operations.AddFullTextIndex(
+            table='boards_comment', columns=['message'], name='boards_comment_search',
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.2.25 on 2026-10-17 21:15
+
+from django.db import migrations, models
+
+import boards.operations
+
+
+class Migration(migrations.Migration):
+
+    # PostgreSQL cannot build indexes concurrently inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('boards', '0011_full_text_search'),
+    ]
+
+    operations = [
+        boards.operations.AddIndexConcurrently(
+            model_name='card',
+            index=models.Index(fields=['board', 'created_at'], name='boards_card_board_created_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.2.25 on 2026-10-17 21:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0001_initial'),
+        ('boards', '0012_card_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='board',
+            name='project',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='boards', to='projects.project'),
+        ),
+    ]
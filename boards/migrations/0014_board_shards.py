@@ -0,0 +1,90 @@
+# Generated by Django 3.2.25 on 2026-10-17 21:35
+
+from django.conf import settings
+from django.core.management.color import no_style
+from django.db import migrations, models
+import django.db.models.deletion
+
+import boards.operations
+
+
+def register_boards(apps, schema_editor):
+    """Enter the existing boards in the directory, where they are, and hand out new ids after theirs."""
+    Board = apps.get_model('boards', 'Board')
+    BoardShard = apps.get_model('boards', 'BoardShard')
+    connection = schema_editor.connection
+    pks = Board.objects.using(connection.alias).values_list('pk', flat=True).iterator()
+    BoardShard.objects.using(connection.alias).bulk_create(
+        (BoardShard(board_id=pk, alias='default') for pk in pks), batch_size=1000
+    )
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [BoardShard]):
+            cursor.execute(sql)
+
+
+def mirror_users(apps, schema_editor):
+    """Copy the users to a shard being migrated, where board data is joined with them."""
+    alias = schema_editor.connection.alias
+    if alias == 'default':
+        return
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    users = User.objects.using('default').order_by('pk').iterator(chunk_size=1000)
+    User.objects.using(alias).bulk_create(users, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('projects', '0001_initial'),
+        ('boards', '0013_board_project'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BoardShard',
+            fields=[
+                ('board_id', models.AutoField(primary_key=True, serialize=False)),
+                ('alias', models.CharField(max_length=64)),
+            ],
+        ),
+        # The directory only lives in the default database, see boards.shards.ShardRouter
+        migrations.RunPython(register_boards, migrations.RunPython.noop, hints={'model_name': 'boardshard'}),
+        migrations.RunPython(mirror_users, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='board',
+            name='created_by',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='board',
+            name='project',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='boards', to='projects.project'),
+        ),
+        migrations.AlterField(
+            model_name='card',
+            name='created_by',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='card_created_by', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='created_by',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='comment_created_by', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='updated_by',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='comment_updated_by', to=settings.AUTH_USER_MODEL),
+        ),
+        # SQLite rebuilt the tables of cards and comments, dropping the triggers of their indexes
+        boards.operations.RecreateFullTextTriggers(
+            table='boards_card', columns=['title', 'description'], name='boards_card_search',
+        ),
+        boards.operations.RecreateFullTextTriggers(
+            table='boards_comment', columns=['message'], name='boards_comment_search',
+        ),
+        # After the tables SQLite rebuilt, which lose their place in sqlite_sequence
+        boards.operations.StartShardIds(
+            tables=['boards_column', 'boards_label', 'boards_card', 'boards_comment'],
+        ),
+    ]
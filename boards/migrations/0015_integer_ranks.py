@@ -0,0 +1,33 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:10
+
+from django.db import migrations
+
+from boards.ranking import rebalance
+
+
+def rerank(apps, schema_editor):
+    """Give every list of columns and cards keys with an integer part, keeping their order."""
+    Column = apps.get_model('boards', 'Column')
+    Card = apps.get_model('boards', 'Card')
+    alias = schema_editor.connection.alias
+
+    def assign(model, queryset):
+        items = list(queryset.order_by('rank', 'pk').only('pk', 'rank'))
+        model.objects.using(alias).bulk_update(rebalance(items), ['rank'], batch_size=500)
+
+    for board_id in Column.objects.using(alias).values_list('board_id', flat=True).distinct():
+        assign(Column, Column.objects.using(alias).filter(board_id=board_id))
+
+    for board_id, column_id in Card.objects.using(alias).values_list('board_id', 'column_id').distinct():
+        assign(Card, Card.objects.using(alias).filter(board_id=board_id, column_id=column_id))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boards', '0014_board_shards'),
+    ]
+
+    operations = [
+        migrations.RunPython(rerank, migrations.RunPython.noop),
+    ]
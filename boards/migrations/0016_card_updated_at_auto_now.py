@@ -0,0 +1,35 @@
+# Generated by Django 3.2.25 on 2026-10-18 11:20
+
+from django.db import migrations, models
+from django.db.models import F
+
+import boards.operations
+
+
+def stamp_cards(apps, schema_editor):
+    """Give the cards that were never stamped their creation time, as a new card would have."""
+    Card = apps.get_model('boards', 'Card')
+    Card.objects.using(schema_editor.connection.alias).filter(updated_at__isnull=True).update(
+        updated_at=F('created_at')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boards', '0015_integer_ranks'),
+    ]
+
+    operations = [
+        migrations.RunPython(stamp_cards, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='card',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        # SQLite rebuilt boards_card, dropping the triggers of its index and its place in sqlite_sequence
+        boards.operations.RecreateFullTextTriggers(
+            table='boards_card', columns=['title', 'description'], name='boards_card_search',
+        ),
+        boards.operations.StartShardIds(tables=['boards_card']),
+    ]
@@ -1,8 +1,7 @@
-from markdown import markdown
-
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.db import models
+from django.db.models import functions
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.utils.html import mark_safe
@@ -10,7 +9,8 @@ from django.template.defaultfilters import truncatechars
 
 from rest_framework.authtoken.models import Token
 
-from . import fields
+from . import fields, rendering
+from .ranking import key_between, rebalance
 
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
@@ -20,21 +20,275 @@ def create_auth_token(sender, instance=None, created=False, **kwargs):
         Token.objects.create(user=instance)
 
 
-class Board(models.Model):
+class RankedMixin(object):
+    """Ordering of a model by its fractional `rank` among its siblings."""
+
+    def siblings(self):
+        raise NotImplementedError
+
+    def place(self, after=None, before=None):
+        """
+        Set the rank so this sorts right after `after` and right before `before`.
+
+        Either neighbour may be None: with one given the other is looked up, with neither the
+        item goes to the end. Only this instance's rank changes, unless the neighbours turn out
+        to share a rank, in which case the siblings are rebalanced first and logged as updated.
+        """
+        from .signals import objects_changed
+
+        siblings = self.siblings().order_by('rank', 'pk')
+        if after is None and before is None:
+            after = siblings.last()
+        elif before is None:
+            before = siblings.filter(rank__gt=after.rank).first()
+        elif after is None:
+            after = siblings.filter(rank__lt=before.rank).last()
+
+        if after is not None and before is not None and after.rank == before.rank:
+            ordered = list(siblings)
+            changed = rebalance(ordered)
+            type(self).objects.using(siblings.db).bulk_update(changed, ['rank'])
+            # bulk_update() sends no signals: log the new order for clients following the board
+            objects_changed(self.board_id, changed, BoardChange.UPDATED)
+            ranks = {sibling.pk: sibling.rank for sibling in ordered}
+            after.rank, before.rank = ranks[after.pk], ranks[before.pk]
+
+        self.rank = key_between(after.rank if after else None, before.rank if before else None)
+
+
+class CountersMixin(object):
+    """
+    Denormalized counters, maintained by boards.counters with F() expressions.
+
+    A plain save() of an existing row leaves the counter columns alone: writing back the values
+    the instance was loaded with would undo the increments made since.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not args and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.counter_fields
+            ]
+        return super(CountersMixin, self).save(*args, **kwargs)
+
+
+class RenderedMixin(object):
+    """Markdown text fields stored along with their rendered HTML, see boards.rendering."""
+
+    rendered_fields = ()
+
+    def save(self, *args, **kwargs):
+        changed = []
+        for field in self.rendered_fields:
+            changed += rendering.refresh(self, field)
+        update_fields = kwargs.get('update_fields')
+        if changed and update_fields is not None:
+            kwargs['update_fields'] = list(update_fields) + [
+                name for name in changed if name.rsplit('_', 1)[0] in update_fields
+            ]
+        return super(RenderedMixin, self).save(*args, **kwargs)
+
+
+class CardQuerySet(models.QuerySet):
+    """QuerySet for cards."""
+
+    def with_related_pks(self):
+        """Prefetch just the primary keys of assignees and labels, for CardFlatSerializer."""
+        return self.prefetch_related(
+            models.Prefetch('assignees', queryset=User.objects.only('id')),
+            models.Prefetch('labels', queryset=Label.objects.only('id')),
+        )
+
+    def with_tree(self, comments=True):
+        """
+        Prefetch everything CardListSerializer renders in a fixed number of queries.
+
+        Leave out the comments if `comments` is False, e.g. to embed only the latest ones with
+        CommentQuerySet.attach_latest().
+        """
+        lookups = [
+            models.Prefetch('assignees', queryset=User.objects.only('id', 'username', 'email').order_by('pk')),
+            models.Prefetch('labels', queryset=Label.objects.order_by('pk')),
+        ]
+        if comments:
+            lookups.append(models.Prefetch('comment_set', queryset=Comment.objects.order_by('created_at', 'pk')))
+        return self.prefetch_related(*lookups)
+
+    def assigned_to(self, user):
+        """
+        The cards assigned to user on any board, with a `column_key` to order them by column
+        (0 for cards outside of any column). They are found from the (user, card) index of the
+        assignees through table, so the cost depends on the user's cards only.
+        """
+        return self.filter(
+            pk__in=Card.assignees.through.objects.filter(user_id=user.pk).values('card_id')
+        ).annotate(column_key=functions.Coalesce('column_id', 0))
+
+    def matching(self, labels=(), label_match='any', assignees=(), columns=(), creators=(), created_after=None,
+                 created_before=None, updated_after=None, updated_before=None, unassigned=False, unlabelled=False):
+        """
+        Filter the cards with any (label_match='all': all) of `labels`, any of `assignees`, in any of
+        `columns`, created by any of `creators`, created or updated in the given ranges, with no
+        assignees or with no labels, in a single query.
+
+        The label and assignee filters are semi-joins on the through tables, answered from their
+        (label, card) and (user, card) indexes, so the cards are neither joined nor duplicated.
+        """
+        queryset = self
+        if labels:
+            links = Card.labels.through.objects.filter(label_id__in=labels)
+            if label_match == 'all':
+                links = links.values('card_id').annotate(matched=models.Count('pk')).filter(matched=len(set(labels)))
+            queryset = queryset.filter(pk__in=links.values('card_id'))
+        if assignees:
+            queryset = queryset.filter(
+                pk__in=Card.assignees.through.objects.filter(user_id__in=assignees).values('card_id')
+            )
+        for empty, relation in ((unassigned, Card.assignees), (unlabelled, Card.labels)):
+            if empty:
+                links = relation.through.objects.filter(card_id=models.OuterRef('pk'))
+                queryset = queryset.filter(~models.Exists(links))
+        if columns:
+            queryset = queryset.filter(column_id__in=columns)
+        if creators:
+            queryset = queryset.filter(created_by_id__in=creators)
+
+        ranges = {
+            'created_at__gte': created_after, 'created_at__lt': created_before,
+            'updated_at__gte': updated_after, 'updated_at__lt': updated_before,
+        }
+        return queryset.filter(**{lookup: value for lookup, value in ranges.items() if value is not None})
+
+
+class ColumnQuerySet(models.QuerySet):
+    """QuerySet for columns."""
+
+    def with_tree(self, comments=True):
+        """Prefetch the cards of each column and everything nested under them."""
+        return self.prefetch_related(
+            models.Prefetch('card_set', queryset=Card.objects.order_by('rank', 'pk').with_tree(comments)),
+        )
+
+
+class BoardQuerySet(models.QuerySet):
+    """QuerySet for boards."""
+
+    def visible_to(self, user):
+        """
+        The boards user can see: those of the projects of user's teams and user's own boards
+        without a project, or every board for staff. The user's projects are resolved once per
+        request and cached, so this is a filter on the indexed project and creator columns.
+        """
+        from projects.access import project_pks
+
+        if user.is_staff:
+            return self
+        if not user.is_authenticated:
+            return self.none()
+        return self.filter(
+            models.Q(project__in=project_pks(user)) | models.Q(project__isnull=True, created_by=user)
+        )
+
+    def with_tree(self, comments=True):
+        """Prefetch the whole column/card/comment tree BoardSerializer renders.
+
+        The number of queries is constant regardless of the size of the board.
+        """
+        return self.prefetch_related(
+            models.Prefetch('column_set', queryset=Column.objects.order_by('rank', 'pk').with_tree(comments)),
+        )
+
+    def delete(self):
+        from .signals import deleting_boards
+
+        with deleting_boards():
+            return super(BoardQuerySet, self).delete()
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
+class CommentQuerySet(models.QuerySet):
+    """QuerySet for comments."""
+
+    def attach_latest(self, cards, count):
+        """
+        Set `latest_comments` on each of cards to its latest `count` comments, oldest first.
+
+        All the cards are served by a single query ranking the comments of each card with a
+        window function, however many cards and comments there are (one per shard the cards come
+        from, see boards.shards).
+        """
+        cards = list(cards)
+        shards = {}
+        for card in cards:
+            card.latest_comments = []
+            shards.setdefault(card._state.db, {})[card.pk] = card
+        if not cards or count <= 0:
+            return cards
+
+        for using, by_pk in shards.items():
+            queryset = self.using(using) if using is not None else self
+            ranked = queryset.filter(card__in=list(by_pk)).annotate(comment_rank=models.Window(
+                expression=functions.RowNumber(),
+                partition_by=[models.F('card_id')],
+                order_by=[models.F('created_at').desc(), models.F('id').desc()],
+            ))
+            sql, params = ranked.query.sql_with_params()
+            latest = queryset.raw(
+                'SELECT * FROM ({0}) ranked WHERE comment_rank <= %s ORDER BY card_id, created_at, id'.format(sql),
+                params + (count,)
+            )
+            for comment in latest:
+                by_pk[comment.card_id].latest_comments.append(comment)
+        return cards
+
+
+class Board(CountersMixin, models.Model):
     """Represents a board."""
 
     title = models.CharField(max_length=255, blank=False, null=False)
-    created_by = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Boards may live on another shard than their creator and project, see boards.shards, so no constraints
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False)
+    # The teams of the project can see the board; without one only its creator can, see boards.access
+    project = models.ForeignKey('projects.Project', on_delete=models.SET_NULL, blank=True, null=True,
+                                related_name='boards', db_constraint=False)
+    # Templates are boards new boards are cloned from, see boards.clone
+    is_template = models.BooleanField(default=False)
+
+    # Counters
+    column_count = models.IntegerField(default=0, editable=False)
+    card_count = models.IntegerField(default=0, editable=False)
+    comment_count = models.IntegerField(default=0, editable=False)
+
+    counter_fields = ('column_count', 'card_count', 'comment_count')
+
+    objects = BoardQuerySet.as_manager()
 
     def __str__(self):
         return '{0}'.format(self.title)
 
     def save(self, *args, **kwargs):
         self.full_clean()
+        if self.pk is None and not args:
+            # New boards get their id and their database from the shard directory
+            from .shards import allocate
+
+            self.pk, kwargs['using'] = allocate()
+            kwargs['force_insert'] = True
         return super(Board, self).save(*args, **kwargs)
 
+    def delete(self, *args, **kwargs):
+        # Without logging or counting every row the board cascades to, see boards.signals
+        from .signals import deleting_boards
+
+        with deleting_boards():
+            return super(Board, self).delete(*args, **kwargs)
+
 
-class Column(models.Model):
+class Column(RankedMixin, CountersMixin, models.Model):
     """Represents a column."""
 
     # Parent
@@ -43,11 +297,42 @@ class Column(models.Model):
     # Fields
     title = models.CharField(max_length=32)
     position = models.IntegerField(default=1, blank=False, null=False)
+    rank = models.CharField(max_length=255, blank=True, editable=False)
     header_color = fields.ColorField(default='#00FF00')
 
+    # Counters
+    card_count = models.IntegerField(default=0, editable=False)
+    comment_count = models.IntegerField(default=0, editable=False)
+
+    counter_fields = ('card_count', 'comment_count')
+
+    objects = ColumnQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['board', 'rank'], name='boards_column_board_rank_idx'),
+        ]
+        constraints = [
+            # ColumnDetail looks columns up by their position on the board
+            models.UniqueConstraint(fields=['board', 'position'], name='boards_column_board_position_uniq'),
+        ]
+
     def __str__(self):
         return '{0}: {1}'.format(self.board, self.title)
 
+    def save(self, *args, **kwargs):
+        if not self.rank:
+            self.place()
+        return super(Column, self).save(*args, **kwargs)
+
+    def siblings(self):
+        return Column.objects.db_manager(hints={'instance': self}).filter(board_id=self.board_id).exclude(pk=self.pk)
+
+    def move(self, after=None, before=None):
+        """Move the column between two other columns of the board, updating only its own row."""
+        self.place(after=after, before=before)
+        self.save(update_fields=['rank'])
+
 
 class Label(models.Model):
     """Represents a label."""
@@ -63,7 +348,7 @@ class Label(models.Model):
         return '{0}: {1}'.format(self.board, self.title)
 
 
-class Card(models.Model):
+class Card(RankedMixin, RenderedMixin, CountersMixin, models.Model):
     """Represents a card."""
 
     # Parent
@@ -73,18 +358,71 @@ class Card(models.Model):
     # Fields
     title = models.CharField(max_length=255, null=False)
     description = models.TextField()
+    description_html = models.TextField(blank=True, editable=False)
+    description_hash = models.CharField(max_length=40, blank=True, editable=False)
+    rank = models.CharField(max_length=255, blank=True, editable=False)
 
     assignees = models.ManyToManyField(User, blank=True, related_name='card_assignees')
     labels = models.ManyToManyField(Label, blank=True, related_name='card_labels')
 
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(blank=True, null=True)  # Blank for django-admin
+    # Stamped by every save; bulk writes set it themselves
+    updated_at = models.DateTimeField(auto_now=True)
+
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='card_created_by', db_constraint=False)
+
+    # Counters
+    comment_count = models.IntegerField(default=0, editable=False)
 
-    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='card_created_by')
+    counter_fields = ('comment_count',)
+    rendered_fields = ('description',)
+
+    objects = CardQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['column', 'rank'], name='boards_card_column_rank_idx'),
+            models.Index(fields=['board', 'column', 'rank'], name='boards_card_board_rank_idx'),
+            models.Index(fields=['board', 'created_at'], name='boards_card_board_created_idx'),
+        ]
 
     def __str__(self):
         return '{0}: {1}'.format(self.column, self.title)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        card = super(Card, cls).from_db(db, field_names, values)
+        # The column and rank the card was loaded with, to move its counts and rank when it changes column
+        if 'column_id' in card.__dict__:
+            card.loaded_column_id = card.column_id
+        if 'rank' in card.__dict__:
+            card.loaded_rank = card.rank
+        return card
+
+    def save(self, *args, **kwargs):
+        # A card given another column but not a rank in it, e.g. by a PUT, goes to its end
+        moved = getattr(self, 'loaded_column_id', self.column_id) != self.column_id
+        if not self.rank or moved and self.rank == getattr(self, 'loaded_rank', None):
+            self.place()
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'rank' not in update_fields:
+                kwargs['update_fields'] = list(update_fields) + ['rank']
+        result = super(Card, self).save(*args, **kwargs)
+        self.loaded_rank = self.rank
+        return result
+
+    def siblings(self):
+        return Card.objects.db_manager(hints={'instance': self}).filter(
+            board_id=self.board_id, column_id=self.column_id
+        ).exclude(pk=self.pk)
+
+    def move(self, column=None, after=None, before=None):
+        """Move the card between two cards of `column` (default: its own), updating only its own row."""
+        if column is not None:
+            self.column = column
+        self.place(after=after, before=before)
+        self.save(update_fields=['column', 'rank', 'updated_at'])
+
     # Functions to deal with Django Admin edit_list limitations
     def display_assignees(self):
         return ', '.join([user.username for user in self.assignees.all()])
@@ -101,8 +439,11 @@ class Card(models.Model):
     def short_description(self):
         return truncatechars(self.description, 100)
 
+    def get_description_as_markdown(self):
+        return mark_safe(rendering.rendered(self, 'description'))
+
 
-class Comment(models.Model):
+class Comment(RenderedMixin, models.Model):
     """Represents a comment."""
 
     # Parent
@@ -110,16 +451,74 @@ class Comment(models.Model):
 
     # Fields
     message = models.TextField()
+    message_html = models.TextField(blank=True, editable=False)
+    message_hash = models.CharField(max_length=40, blank=True, editable=False)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(blank=True, null=True)  # Blank for django-admin
 
-    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='comment_created_by')
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='comment_created_by',
+                                   db_constraint=False)
     updated_by = models.ForeignKey(User, blank=True, on_delete=models.SET_NULL, null=True,
-                                   related_name='comment_updated_by')
+                                   related_name='comment_updated_by', db_constraint=False)
+
+    rendered_fields = ('message',)
+
+    objects = CommentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['card', 'created_at'], name='boards_comment_card_date_idx'),
+        ]
 
     def __str__(self):
         return truncatechars(self.message, 30)
 
     def get_message_as_markdown(self):
-        return mark_safe(markdown(self.message, safe_mode='escape'))
+        return mark_safe(rendering.rendered(self, 'message'))
+
+
+class BoardChange(models.Model):
+    """An entry in a board's append-only change log."""
+
+    CREATED = 'created'
+    UPDATED = 'updated'
+    DELETED = 'deleted'
+    ACTION_CHOICES = (
+        (CREATED, 'Created'),
+        (UPDATED, 'Updated'),
+        (DELETED, 'Deleted'),
+    )
+
+    # Parent: no constraint, so tombstones outlive the board itself
+    board = models.ForeignKey(Board, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False,
+                              related_name='+')
+
+    # Fields
+    model = models.CharField(max_length=16)
+    object_id = models.IntegerField()
+    action = models.CharField(max_length=8, choices=ACTION_CHOICES)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['board', 'id'], name='boards_change_board_seq_idx'),
+        ]
+
+    def __str__(self):
+        return '{0} {1} {2}'.format(self.model, self.object_id, self.action)
+
+
+class BoardShard(models.Model):
+    """
+    The directory of board shards: the database alias each board lives in, see boards.shards.
+
+    It hands out the ids of new boards, so they are unique across shards.
+    """
+
+    board_id = models.AutoField(primary_key=True)
+    alias = models.CharField(max_length=64)
+
+    def __str__(self):
+        return '{0} on {1}'.format(self.board_id, self.alias)
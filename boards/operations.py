@@ -0,0 +1,312 @@
+"""
+Migration operations that build indexes without long table locks on PostgreSQL.
+
+On PostgreSQL indexes are built CONCURRENTLY, which lets reads and writes carry on while the
+index is built; migrations using these operations must set `atomic = False`. Every other backend
+gets the ordinary operation, so the same migration runs on SQLite during development and tests.
+
+AddFullTextIndex builds the full-text indexes boards.search queries, which differ per backend.
+StartShardIds gives the tables of board data disjoint ids on each shard.
+"""
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.migrations.operations import AddIndex, AddConstraint
+from django.db.migrations.operations.base import Operation
+
+
+def _is_postgresql(schema_editor):
+    return schema_editor.connection.vendor == 'postgresql'
+
+
+class AddIndexConcurrently(AddIndex):
+    """AddIndex, built with CREATE INDEX CONCURRENTLY on PostgreSQL."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if not _is_postgresql(schema_editor):
+            return super(AddIndexConcurrently, self).database_forwards(app_label, schema_editor, from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.add_index(model, self.index, concurrently=True)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if not _is_postgresql(schema_editor):
+            return super(AddIndexConcurrently, self).database_backwards(app_label, schema_editor, from_state, to_state)
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.remove_index(model, self.index, concurrently=True)
+
+
+class AddUniqueConstraintConcurrently(AddConstraint):
+    """
+    AddConstraint for a plain UniqueConstraint on fields.
+
+    On PostgreSQL the unique index is built concurrently first and then attached to the table as
+    the constraint, which only takes a brief lock.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if not _is_postgresql(schema_editor):
+            return super(AddUniqueConstraintConcurrently, self).database_forwards(
+                app_label, schema_editor, from_state, to_state
+            )
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            table = schema_editor.quote_name(model._meta.db_table)
+            name = schema_editor.quote_name(self.constraint.name)
+            columns = ', '.join(
+                schema_editor.quote_name(model._meta.get_field(field).column) for field in self.constraint.fields
+            )
+            schema_editor.execute('CREATE UNIQUE INDEX CONCURRENTLY {0} ON {1} ({2})'.format(name, table, columns))
+            schema_editor.execute('ALTER TABLE {0} ADD CONSTRAINT {1} UNIQUE USING INDEX {1}'.format(table, name))
+
+
+class AddTableIndex(Operation):
+    """
+    Create an index on columns of a table that has no model of its own to declare it on, such as
+    the through table of an automatically created many-to-many relation.
+    """
+
+    reduces_to_sql = False
+    reversible = True
+
+    def __init__(self, table, columns, name):
+        self.table = table
+        self.columns = columns
+        self.name = name
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        schema_editor.execute('CREATE INDEX {0}{1} ON {2} ({3})'.format(
+            'CONCURRENTLY ' if _is_postgresql(schema_editor) else '',
+            schema_editor.quote_name(self.name),
+            schema_editor.quote_name(self.table),
+            ', '.join(schema_editor.quote_name(column) for column in self.columns),
+        ))
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        schema_editor.execute('DROP INDEX {0}{1}'.format(
+            'CONCURRENTLY ' if _is_postgresql(schema_editor) else '',
+            schema_editor.quote_name(self.name),
+        ))
+
+    def describe(self):
+        return 'Create index {0} on {1} ({2})'.format(self.name, self.table, ', '.join(self.columns))
+
+    def deconstruct(self):
+        return self.__class__.__name__, [], {'table': self.table, 'columns': self.columns, 'name': self.name}
+
+
+class RemoveRedundantIndex(Operation):
+    """
+    Drop the plain index on exactly `columns` of a table, made redundant by a composite index that
+    starts with the same columns. The index is found by introspection, as Django names the ones it
+    creates for foreign keys itself.
+    """
+
+    reduces_to_sql = False
+    reversible = True
+
+    def __init__(self, table, columns):
+        self.table = table
+        self.columns = columns
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        connection = schema_editor.connection
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, self.table)
+        for name, constraint in constraints.items():
+            if (constraint['index'] and not constraint['unique'] and not constraint['primary_key']
+                    and constraint['columns'] == list(self.columns)):
+                schema_editor.execute('DROP INDEX {0}{1}'.format(
+                    'CONCURRENTLY ' if _is_postgresql(schema_editor) else '',
+                    schema_editor.quote_name(name),
+                ))
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        name = schema_editor._create_index_name(self.table, list(self.columns))
+        schema_editor.execute('CREATE INDEX {0}{1} ON {2} ({3})'.format(
+            'CONCURRENTLY ' if _is_postgresql(schema_editor) else '',
+            schema_editor.quote_name(name),
+            schema_editor.quote_name(self.table),
+            ', '.join(schema_editor.quote_name(column) for column in self.columns),
+        ))
+
+    def describe(self):
+        return 'Drop the index on {0} ({1})'.format(self.table, ', '.join(self.columns))
+
+    def deconstruct(self):
+        return self.__class__.__name__, [], {'table': self.table, 'columns': self.columns}
+
+
+class AddFullTextIndex(Operation):
+    """
+    Index text columns of a table for full-text search, kept in sync by triggers on every write,
+    bulk inserts and raw SQL included.
+
+    On PostgreSQL the table gets a tsvector column `search_vector`, the columns weighted in the
+    order given (A, B, ...), filled by a trigger and indexed with GIN under `name`. On SQLite
+    `name` is an external content FTS5 table over the columns, filled by triggers on the table.
+    Other backends get no index and cannot be searched.
+
+    SQLite drops the triggers of a table that a later migration rebuilds to alter it, so such a
+    migration has to end with RecreateFullTextTriggers.
+    """
+
+    reduces_to_sql = False
+    reversible = True
+
+    def __init__(self, table, columns, name, config='english'):
+        self.table = table
+        self.columns = columns
+        self.name = name
+        self.config = config
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        vendor = schema_editor.connection.vendor
+        if vendor == 'postgresql':
+            self.create_postgresql(schema_editor)
+        elif vendor == 'sqlite':
+            self.create_sqlite(schema_editor)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        quote = schema_editor.quote_name
+        vendor = schema_editor.connection.vendor
+        if vendor == 'postgresql':
+            schema_editor.execute('DROP INDEX CONCURRENTLY {0}'.format(quote(self.name)))
+            schema_editor.execute('DROP TRIGGER {0} ON {1}'.format(quote(self.name), quote(self.table)))
+            schema_editor.execute('DROP FUNCTION {0}()'.format(quote(self.name)))
+            schema_editor.execute('ALTER TABLE {0} DROP COLUMN search_vector'.format(quote(self.table)))
+        elif vendor == 'sqlite':
+            for suffix in ('insert', 'update', 'delete'):
+                schema_editor.execute('DROP TRIGGER {0}'.format(quote('{0}_{1}'.format(self.name, suffix))))
+            schema_editor.execute('DROP TABLE {0}'.format(quote(self.name)))
+
+    def document(self, schema_editor, row):
+        """The weighted tsvector of the columns of `row` (NEW, or the table itself)."""
+        return ' || '.join(
+            "setweight(to_tsvector('{0}', coalesce({1}.{2}, '')), '{3}')".format(
+                self.config, row, schema_editor.quote_name(column), weight
+            )
+            for column, weight in zip(self.columns, 'ABCD')
+        )
+
+    def create_postgresql(self, schema_editor):
+        quote = schema_editor.quote_name
+        table, name = quote(self.table), quote(self.name)
+        schema_editor.execute('ALTER TABLE {0} ADD COLUMN search_vector tsvector'.format(table))
+        schema_editor.execute(
+            'CREATE FUNCTION {0}() RETURNS trigger AS $$ BEGIN NEW.search_vector := {1}; RETURN NEW; END $$ '
+            'LANGUAGE plpgsql'.format(name, self.document(schema_editor, 'NEW'))
+        )
+        schema_editor.execute(
+            'CREATE TRIGGER {0} BEFORE INSERT OR UPDATE OF {1} ON {2} FOR EACH ROW EXECUTE PROCEDURE {0}()'.format(
+                name, ', '.join(quote(column) for column in self.columns), table
+            )
+        )
+        schema_editor.execute('UPDATE {0} SET search_vector = {1}'.format(table, self.document(schema_editor, table)))
+        schema_editor.execute('CREATE INDEX CONCURRENTLY {0} ON {1} USING gin (search_vector)'.format(name, table))
+
+    def create_sqlite(self, schema_editor):
+        quote = schema_editor.quote_name
+        name = quote(self.name)
+        columns = ', '.join(quote(column) for column in self.columns)
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE {0} USING fts5({1}, content={2}, content_rowid='id', "
+            "tokenize='porter unicode61')".format(name, columns, "'{0}'".format(self.table))
+        )
+        schema_editor.execute("INSERT INTO {0} ({0}) VALUES ('rebuild')".format(name))
+        self.create_sqlite_triggers(schema_editor)
+
+    def create_sqlite_triggers(self, schema_editor):
+        quote = schema_editor.quote_name
+        table, name = quote(self.table), quote(self.name)
+        columns = ', '.join(quote(column) for column in self.columns)
+        new = ', '.join('new.{0}'.format(quote(column)) for column in self.columns)
+        old = ', '.join('old.{0}'.format(quote(column)) for column in self.columns)
+        insert = 'INSERT INTO {0} (rowid, {1}) VALUES (new.id, {2});'.format(name, columns, new)
+        delete = "INSERT INTO {0} ({0}, rowid, {1}) VALUES ('delete', old.id, {2});".format(name, columns, old)
+
+        schema_editor.execute('CREATE TRIGGER {0} AFTER INSERT ON {1} BEGIN {2} END'.format(
+            quote(self.name + '_insert'), table, insert
+        ))
+        schema_editor.execute('CREATE TRIGGER {0} AFTER UPDATE OF {1} ON {2} BEGIN {3} {4} END'.format(
+            quote(self.name + '_update'), columns, table, delete, insert
+        ))
+        schema_editor.execute('CREATE TRIGGER {0} AFTER DELETE ON {1} BEGIN {2} END'.format(
+            quote(self.name + '_delete'), table, delete
+        ))
+
+    def describe(self):
+        return 'Create full-text index {0} on {1} ({2})'.format(self.name, self.table, ', '.join(self.columns))
+
+    def deconstruct(self):
+        kwargs = {'table': self.table, 'columns': self.columns, 'name': self.name}
+        if self.config != 'english':
+            kwargs['config'] = self.config
+        return self.__class__.__name__, [], kwargs
+
+
+class RecreateFullTextTriggers(AddFullTextIndex):
+    """
+    Put back the triggers of an AddFullTextIndex on SQLite after an operation rebuilt its table.
+    The rows keep their ids, so the index itself is still in sync. Nothing to do elsewhere.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'sqlite':
+            self.create_sqlite_triggers(schema_editor)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        # Reversing the rebuilding operation rebuilds the table again
+        self.database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def describe(self):
+        return 'Recreate the triggers of full-text index {0} on {1}'.format(self.name, self.table)
+
+
+class StartShardIds(Operation):
+    """
+    Make the ids of tables start at a range of their own on each of the BOARD_SHARDS, the shard's
+    position in the list times BOARD_SHARD_ID_SPACING, so rows keep their ids when their board
+    moves to another shard (see boards.shards). Nothing to do on 'default', whose ids start at 1.
+    """
+
+    reduces_to_sql = False
+    reversible = True
+
+    def __init__(self, tables):
+        self.tables = tables
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        alias = schema_editor.connection.alias
+        shards = list(getattr(settings, 'BOARD_SHARDS', [DEFAULT_DB_ALIAS]))
+        if alias not in shards or shards.index(alias) == 0:
+            return
+        start = shards.index(alias) * getattr(settings, 'BOARD_SHARD_ID_SPACING', 100000000)
+        for table in self.tables:
+            if _is_postgresql(schema_editor):
+                schema_editor.execute("SELECT setval(pg_get_serial_sequence(%s, 'id'), %s)", [table, start])
+            elif schema_editor.connection.vendor == 'sqlite':
+                # The next id of an AUTOINCREMENT table follows the largest of its rows and of this
+                schema_editor.execute('DELETE FROM sqlite_sequence WHERE name = %s', [table])
+                schema_editor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)', [table, start])
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        pass
+
+    def describe(self):
+        return 'Start the ids of {0} at the range of the shard'.format(', '.join(self.tables))
+
+    def deconstruct(self):
+        return self.__class__.__name__, [], {'tables': self.tables}
@@ -0,0 +1,153 @@
+"""
+Fractional rank keys for ordering columns and cards.
+
+A rank is a string of base 36 digits made of an integer part followed by a fraction. The first
+digit of the integer part gives its length: "i" to "z" start integers of 1 to 18 more digits
+counting up from "i0", "h" down to "0" integers of 1 to 18 more digits counting down from "hz",
+so integers of any length sort in order ("gzz" < "hz" < "i0" < "iz" < "j00"). The fraction is
+read as one (so "i0" < "i0h" < "i0hz" < "i1").
+
+Appending or prepending steps the integer part, so a list of n appended items has keys of
+O(log n) digits. Inserting between two keys only extends a fraction when their integers are
+adjacent. There is always a key between any two distinct keys, so moving an item only rewrites
+that item's rank. Fractions never end in the smallest digit, which keeps room in front of every
+key. Digits and lowercase letters sort the same way in every common database collation.
+
+Repeated inserts at the same spot make keys longer; rebalance() numbers a list of keys again
+(see the rebalance_ranks management command).
+"""
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+BASE = len(DIGITS)
+
+# Heads of the one digit integers, the smallest positive and the largest negative
+POSITIVE, NEGATIVE = 'i', 'h'
+FIRST = POSITIVE + DIGITS[0]
+SMALLEST_INTEGER = DIGITS[0] * (DIGITS.index(NEGATIVE) + 2)
+
+
+def _integer_length(head):
+    """The length of an integer part starting with head."""
+    if head >= POSITIVE:
+        return DIGITS.index(head) - DIGITS.index(POSITIVE) + 2
+    return DIGITS.index(NEGATIVE) - DIGITS.index(head) + 2
+
+
+def validate(key):
+    """Raise ValueError unless key is a well formed rank."""
+    if not key or key.strip(DIGITS) or len(key) < _integer_length(key[0]) or key == SMALLEST_INTEGER \
+            or key[-1] == DIGITS[0] and len(key) > _integer_length(key[0]):
+        raise ValueError('Invalid rank key: {0!r}'.format(key))
+
+
+def _split(key):
+    length = _integer_length(key[0])
+    return key[:length], key[length:]
+
+
+def _step(integer, carry_digit, step, next_head):
+    """Add step (1 or -1) to the digits of integer, moving to the next head when they overflow."""
+    head, digits = integer[0], list(integer[1:])
+    for i in reversed(range(len(digits))):
+        if digits[i] != carry_digit:
+            digits[i] = DIGITS[DIGITS.index(digits[i]) + step]
+            return head + ''.join(digits)
+        digits[i] = DIGITS[-1] if carry_digit == DIGITS[0] else DIGITS[0]
+    return next_head(head, digits)
+
+
+def _increment(integer):
+    """The integer part right after integer, or None if it is the largest."""
+    def next_head(head, digits):
+        if head == NEGATIVE:
+            return FIRST
+        if head == DIGITS[-1]:
+            return None
+        # Positive integers gain a digit, negative ones lose one
+        digits = digits + [DIGITS[0]] if head >= POSITIVE else digits[:-1]
+        return DIGITS[DIGITS.index(head) + 1] + ''.join(digits)
+    return _step(integer, DIGITS[-1], 1, next_head)
+
+
+def _decrement(integer):
+    """The integer part right before integer, or None if it is the smallest."""
+    def next_head(head, digits):
+        if head == POSITIVE:
+            return NEGATIVE + DIGITS[-1]
+        if head == DIGITS[0]:
+            return None
+        digits = digits[:-1] if head >= POSITIVE else digits + [DIGITS[-1]]
+        return DIGITS[DIGITS.index(head) - 1] + ''.join(digits)
+    return _step(integer, DIGITS[0], -1, next_head)
+
+
+def _midpoint(a, b):
+    """Return a fraction strictly between a and b, where b is None for "no upper bound"."""
+    if b is not None:
+        # Keep the common prefix, padding a with zeros as fractions are
+        n = 0
+        while n < len(b) and (a[n] if n < len(a) else DIGITS[0]) == b[n]:
+            n += 1
+        if n:
+            return b[:n] + _midpoint(a[n:], b[n:])
+
+    digit_a = DIGITS.index(a[0]) if a else 0
+    digit_b = DIGITS.index(b[0]) if b is not None else BASE
+    if digit_b - digit_a > 1:
+        return DIGITS[(digit_a + digit_b) // 2]
+    # The first digits are consecutive
+    if b is not None and len(b) > 1:
+        return b[0]
+    return DIGITS[digit_a] + _midpoint(a[1:], None)
+
+
+def key_between(before=None, after=None):
+    """
+    Return a rank that sorts after `before` and before `after`.
+
+    Either may be None to mean the start or the end of the list.
+    """
+    for key in (before, after):
+        if key is not None:
+            validate(key)
+    if before is not None and after is not None and before >= after:
+        raise ValueError('{0!r} must sort before {1!r}'.format(before, after))
+
+    if before is None and after is None:
+        return FIRST
+    if before is None:
+        integer, fraction = _split(after)
+        if integer == SMALLEST_INTEGER:
+            # Never a key of its own, see validate()
+            return integer + _midpoint('', fraction)
+        return integer if fraction else _decrement(integer)
+    if after is None:
+        integer, fraction = _split(before)
+        return _increment(integer) or integer + _midpoint(fraction, None)
+
+    integer_before, fraction_before = _split(before)
+    integer_after, fraction_after = _split(after)
+    if integer_before == integer_after:
+        return integer_before + _midpoint(fraction_before, fraction_after)
+    integer = _increment(integer_before)
+    if integer < after:
+        return integer
+    return integer_before + _midpoint(fraction_before, None)
+
+
+def evenly_spaced(count):
+    """Return count ascending keys, consecutive integers from the first key on."""
+    keys, key = [], FIRST
+    for _ in range(count):
+        keys.append(key)
+        key = _increment(key)
+    return keys
+
+
+def rebalance(items, field='rank'):
+    """Give items, already in order, evenly spaced ranks; return those whose rank changed."""
+    changed = []
+    for item, key in zip(items, evenly_spaced(len(items))):
+        if getattr(item, field) != key:
+            setattr(item, field, key)
+            changed.append(item)
+    return changed
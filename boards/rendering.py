@@ -0,0 +1,111 @@
+"""
+Markdown rendering of comment messages and card descriptions.
+
+The rendered HTML is stored next to its source along with a hash of the source and of the
+renderer version, and only rendered again when that hash changes: on save when the source was
+edited, or by the rerender_markdown management command after RENDERER_VERSION is bumped. Renders
+that are not stored go through an in-process LRU cache.
+
+Raw HTML in the source is escaped rather than passed through, and links and images may only
+use the schemes in SAFE_SCHEMES.
+"""
+import hashlib
+import html
+import re
+from functools import lru_cache
+
+from markdown import Markdown
+from markdown.extensions import Extension
+from markdown.treeprocessors import Treeprocessor
+from markdown.util import AMP_SUBSTITUTE
+
+# Bump whenever a change to the renderer changes its output, then run rerender_markdown
+RENDERER_VERSION = 2
+
+SAFE_SCHEMES = ('http', 'https', 'mailto')
+
+
+class SafeLinksProcessor(Treeprocessor):
+    """Drop link and image URLs with a scheme other than those in SAFE_SCHEMES."""
+
+    def run(self, root):
+        for element in root.iter():
+            for attribute in ('href', 'src'):
+                url = element.get(attribute)
+                if url is None:
+                    continue
+                # Browsers decode character references in attributes, e.g. "javascript&colon;", and
+                # then ignore whitespace and control characters in a scheme
+                url = url.replace(AMP_SUBSTITUTE, '&')
+                while html.unescape(url) != url:
+                    url = html.unescape(url)
+                url = re.sub(r'[\x00-\x20\x7f]', '', url)
+                if ':' in url.split('/', 1)[0] and url.split(':', 1)[0].lower() not in SAFE_SCHEMES:
+                    element.set(attribute, '')
+
+
+class EscapeHtmlExtension(Extension):
+    """Escape raw HTML, like the safe_mode='escape' option of Markdown before 3.0."""
+
+    def extendMarkdown(self, md):
+        md.preprocessors.deregister('html_block')
+        md.inlinePatterns.deregister('html')
+        md.treeprocessors.register(SafeLinksProcessor(md), 'safe_links', 0)
+
+
+def content_hash(text):
+    """Return the hash under which the HTML rendered from text is stored."""
+    return hashlib.sha1('{0}:{1}'.format(RENDERER_VERSION, text).encode('utf-8')).hexdigest()
+
+
+def render(text):
+    """Render Markdown text to sanitized HTML."""
+    return Markdown(extensions=[EscapeHtmlExtension()]).convert(text)
+
+
+@lru_cache(maxsize=1024)
+def render_cached(text):
+    """render(), memoized for text that has no stored rendering."""
+    return render(text)
+
+
+def refresh(instance, field):
+    """
+    Render instance.<field> into <field>_html if it changed since it was last rendered.
+
+    Return the names of the fields that were updated.
+    """
+    digest = content_hash(getattr(instance, field))
+    if getattr(instance, field + '_hash') == digest:
+        return []
+    setattr(instance, field + '_html', render(getattr(instance, field)))
+    setattr(instance, field + '_hash', digest)
+    return [field + '_html', field + '_hash']
+
+
+def rendered(instance, field):
+    """Return the HTML of instance.<field>, stored or, if out of date, rendered now."""
+    if getattr(instance, field + '_hash') == content_hash(getattr(instance, field)):
+        return getattr(instance, field + '_html')
+    return render_cached(getattr(instance, field))
+
+
+def rerender(queryset, field, force=False, batch_size=500):
+    """
+    Render <field> of every row of queryset whose stored HTML is out of date, or of every row
+    if force is set, saving a batch of rows at a time. Return the number of rows rendered.
+    """
+    fields = [field + '_html', field + '_hash']
+    stale, count = [], 0
+    for instance in queryset.order_by('pk').only('pk', field, field + '_hash').iterator(chunk_size=batch_size):
+        if force:
+            setattr(instance, field + '_hash', '')
+        if refresh(instance, field):
+            stale.append(instance)
+        if len(stale) == batch_size:
+            queryset.model.objects.bulk_update(stale, fields)
+            count, stale = count + len(stale), []
+    if stale:
+        queryset.model.objects.bulk_update(stale, fields)
+        count += len(stale)
+    return count
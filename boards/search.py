@@ -0,0 +1,160 @@
+"""
+Ranked full-text search over card titles and descriptions and comment messages.
+
+The indexes are built by the AddFullTextIndex migration operation and kept in sync by database
+triggers: a tsvector column with a GIN index on PostgreSQL, an FTS5 table on SQLite. Both are
+queried here with raw SQL: cards and comments matching every term of the query, best first.
+
+SearchResults is sliced and counted like a queryset, so DRF paginators page through the hits
+with LIMIT/OFFSET and only the objects of the page are loaded. Across boards it searches every
+shard (see boards.shards) and merges their best hits.
+"""
+import heapq
+import itertools
+import re
+
+from django.db import NotSupportedError, connections, router
+
+from . import shards
+from .models import Card, Comment
+
+# Hits of either kind, as (kind, id, card id, board id, score) rows; the lower the score the better
+QUERIES = {
+    'postgresql': {
+        'card': (
+            "SELECT 'card' AS kind, c.id, c.id AS card_id, c.board_id, "
+            "-ts_rank(c.search_vector, q) AS score "
+            "FROM boards_card c, plainto_tsquery('english', %s) q WHERE c.search_vector @@ q"
+        ),
+        'comment': (
+            "SELECT 'comment' AS kind, m.id, m.card_id, c.board_id, "
+            "-ts_rank(m.search_vector, q) AS score "
+            "FROM boards_comment m JOIN boards_card c ON c.id = m.card_id, plainto_tsquery('english', %s) q "
+            "WHERE m.search_vector @@ q"
+        ),
+    },
+    'sqlite': {
+        'card': (
+            "SELECT 'card' AS kind, c.id, c.id AS card_id, c.board_id, "
+            "bm25(boards_card_search, 4.0, 1.0) AS score "
+            "FROM boards_card_search JOIN boards_card c ON c.id = boards_card_search.rowid "
+            "WHERE boards_card_search MATCH %s"
+        ),
+        'comment': (
+            "SELECT 'comment' AS kind, m.id, m.card_id, c.board_id, "
+            "bm25(boards_comment_search) AS score "
+            "FROM boards_comment_search JOIN boards_comment m ON m.id = boards_comment_search.rowid "
+            "JOIN boards_card c ON c.id = m.card_id WHERE boards_comment_search MATCH %s"
+        ),
+    },
+}
+
+
+def terms(query):
+    """The words of a search query; anything else, operators included, is ignored."""
+    return re.findall(r'\w+', query or '')
+
+
+def match(vendor, words):
+    """The search query matching all of words, in the syntax of the backend."""
+    if vendor == 'sqlite':
+        # Quoted, so words such as AND or NEAR are not FTS5 operators
+        return ' '.join('"{0}"'.format(word) for word in words)
+    return ' '.join(words)
+
+
+class SearchResults(object):
+    """
+    The cards and comments matching query on the boards board_pks (None for all), best first.
+
+    Each hit is a dict with the 'type' ('card' or 'comment'), 'board', 'card' and 'object'.
+    """
+
+    def __init__(self, query, board_pks=None, kinds=('card', 'comment')):
+        self.words = terms(query)
+        self.board_pks = None if board_pks is None else list(board_pks)
+        self.kinds = kinds
+        self.using = router.db_for_read(Card)
+        # Every shard, unless searching the current board's
+        self.aliases = shards.aliases() if shards.enabled() and shards.current() is None else [self.using]
+
+    def sql(self, using=None):
+        connection = connections[using or self.using]
+        if connection.vendor not in QUERIES:
+            raise NotSupportedError('Full-text search is not supported on {0}.'.format(connection.vendor))
+        parts, params = [], []
+        for kind in self.kinds:
+            sql = QUERIES[connection.vendor][kind]
+            params.append(match(connection.vendor, self.words))
+            if self.board_pks is not None:
+                sql += ' AND c.board_id IN ({0})'.format(', '.join(['%s'] * len(self.board_pks)))
+                params.extend(self.board_pks)
+            parts.append(sql)
+        return ' UNION ALL '.join(parts), params
+
+    def is_empty(self):
+        return not self.words or self.board_pks == []
+
+    def count(self):
+        if self.is_empty():
+            return 0
+        total = 0
+        for using in self.aliases:
+            sql, params = self.sql(using)
+            with connections[using].cursor() as cursor:
+                cursor.execute('SELECT COUNT(*) FROM ({0}) hits'.format(sql), params)
+                total += cursor.fetchone()[0]
+        return total
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or key.step is not None:
+            raise TypeError('Search results can only be sliced.')
+        start = key.start or 0
+        if self.is_empty() or (key.stop is not None and key.stop <= start):
+            return []
+        if len(self.aliases) == 1:
+            using = self.aliases[0]
+            return self.hits([row + (using,) for row in self.rows(using, start, key.stop)])
+        # The best `stop` hits of each shard, merged
+        streams = [[row + (using,) for row in self.rows(using, 0, key.stop)] for using in self.aliases]
+        return self.hits(itertools.islice(heapq.merge(*streams, key=lambda row: row[4:5] + row[:2]), start, key.stop))
+
+    def rows(self, using, start, stop):
+        """The (kind, id, card id, board id, score) rows of the hits [start:stop] in database using."""
+        sql, params = self.sql(using)
+        sql = 'SELECT kind, id, card_id, board_id, score FROM ({0}) hits ORDER BY score, kind, id'.format(sql)
+        if stop is not None:
+            sql += ' LIMIT {0:d}'.format(stop - start)
+        elif start:
+            sql += ' LIMIT -1' if connections[using].vendor == 'sqlite' else ' LIMIT ALL'
+        if start:
+            sql += ' OFFSET {0:d}'.format(start)
+        with connections[using].cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def hits(self, rows):
+        """Load the objects of the hit rows, one query per kind and database."""
+        rows = list(rows)
+        objects = {}
+        for using in {row[5] for row in rows}:
+            pks = {kind: [row[1] for row in rows if row[0] == kind and row[5] == using] for kind in self.kinds}
+            objects[using] = {
+                'card': Card.objects.using(using).with_related_pks().in_bulk(pks['card']) if pks.get('card') else {},
+                'comment': Comment.objects.using(using).in_bulk(pks['comment']) if pks.get('comment') else {},
+            }
+        return [
+            {'type': kind, 'board': board_pk, 'card': card_pk, 'object': objects[using][kind][pk]}
+            for kind, pk, card_pk, board_pk, _, using in rows if pk in objects[using][kind]
+        ]
+
+
+def matching_cards(query):
+    """The primary keys of the cards whose title or description match query, for the admin."""
+    results = SearchResults(query, kinds=('card',))
+    if results.is_empty():
+        return []
+    sql, params = results.sql()
+    with connections[results.using].cursor() as cursor:
+        cursor.execute('SELECT id FROM ({0}) hits'.format(sql), params)
+        return [row[0] for row in cursor.fetchall()]
@@ -2,10 +2,14 @@ from django.contrib.auth.models import User
 from rest_framework import serializers
 from rest_framework.relations import PrimaryKeyRelatedField
 
+from floboard.metrics import TimedSerializerMixin
+from projects.access import project_pks
+
+from .fieldsets import SparseFieldsMixin
 from .models import Board, Column, Card, Comment, Label
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer to map the User instance to JSON."""
 
     class Meta:
@@ -13,7 +17,7 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ('id', 'username', 'email')
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer to map the Comment instance to JSON."""
 
     def create(self, validated_data):
@@ -26,11 +30,11 @@ class CommentSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Comment
-        fields = ('id', 'card', 'message', 'updated_at', 'created_by', 'updated_by')
+        fields = ('id', 'card', 'message', 'message_html', 'updated_at', 'created_by', 'updated_by')
         read_only_fields = ('id', 'board', 'card')
 
 
-class LabelSerializer(serializers.ModelSerializer):
+class LabelSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer to map the Label instance to JSON."""
 
     def create(self, validated_data):
@@ -47,19 +51,32 @@ class LabelSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'board')
 
 
-class CardListSerializer(serializers.ModelSerializer):
-    """Serializer to map the Card instance to JSON."""
+class CardListSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    """
+    Serializer to map the Card instance to JSON.
+
+    With a number of comments in the context, as {'comments': N}, comment_set only holds the
+    latest N comments, as attached by CommentQuerySet.attach_latest(), and comment_count the total.
+    """
     assignees = UserSerializer(many=True, read_only=True)
     labels = LabelSerializer(many=True)
     comment_set = CommentSerializer(many=True, read_only=True)
 
+    def get_unselected_fields(self):
+        fields = super(CardListSerializer, self).get_unselected_fields()
+        if self.context.get('comments') is not None:
+            fields['comment_set'] = CommentSerializer(many=True, read_only=True, source='latest_comments')
+            fields['comment_count'] = serializers.IntegerField(read_only=True)
+        return fields
+
     class Meta:
         model = Card
-        fields = ('id', 'board', 'column', 'title', 'description', 'created_by', 'assignees', 'labels', 'comment_set')
-        read_only_fields = ('id', 'board')
+        fields = ('id', 'board', 'column', 'rank', 'title', 'description', 'description_html', 'created_by',
+                  'assignees', 'labels', 'comment_set')
+        read_only_fields = ('id', 'board', 'rank')
 
 
-class CardCreateSerializer(serializers.ModelSerializer):
+class CardCreateSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer to map the Card instance to JSON."""
     assignees = UserSerializer(many=True, read_only=True)
     comment_set = CommentSerializer(many=True, read_only=True)
@@ -77,14 +94,24 @@ class CardCreateSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Card
-        fields = ('id', 'board', 'column', 'title', 'description', 'created_by', 'assignees', 'labels', 'comment_set')
-        read_only_fields = ('id', 'board')
+        fields = ('id', 'board', 'column', 'rank', 'title', 'description', 'description_html', 'created_by',
+                  'assignees', 'labels', 'comment_set')
+        read_only_fields = ('id', 'board', 'rank')
 
 
-class ColumnSerializer(serializers.ModelSerializer):
+class ColumnSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer to map the Column instance to JSON."""
     card_set = CardListSerializer(many=True, read_only=True)
 
+    def validate_position(self, value):
+        board = self.instance.board if self.instance else self.context['board']
+        columns = Column.objects.filter(board=board, position=value)
+        if self.instance:
+            columns = columns.exclude(pk=self.instance.pk)
+        if columns.exists():
+            raise serializers.ValidationError('This board already has a column at position {0}.'.format(value))
+        return value
+
     def create(self, validated_data):
         board = self.context['board']
         column = Column.objects.create(
@@ -95,15 +122,155 @@ class ColumnSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Column
-        fields = ('id', 'board', 'title', 'position', 'header_color', 'card_set')
-        read_only_fields = ('id', 'board')
+        fields = ('id', 'board', 'title', 'position', 'rank', 'header_color', 'card_set')
+        read_only_fields = ('id', 'board', 'rank')
 
 
-class BoardSerializer(serializers.ModelSerializer):
+class BoardSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer to map the Board instance to JSON."""
     column_set = ColumnSerializer(many=True, read_only=True)
 
+    def validate_project(self, value):
+        request = self.context.get('request')
+        if value is None or request is None or request.user.is_staff or value.pk in project_pks(request.user):
+            return value
+        raise serializers.ValidationError('Invalid pk "{0}" - not a project of your teams.'.format(value.pk))
+
+    class Meta:
+        model = Board
+        fields = ('id', 'title', 'created_by', 'project', 'is_template', 'column_set')
+        # Set from the request, see BoardList: access to boards without a project goes by it
+        read_only_fields = ('created_by', )
+
+
+class BoardSummarySerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    """Serializer to map the Board instance to a lightweight JSON summary."""
+
+    class Meta:
+        model = Board
+        fields = ('id', 'title', 'created_by', 'project', 'is_template', 'column_count', 'card_count', 'comment_count')
+
+
+class ColumnFlatSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    """Serializer to map the Column instance to JSON without its cards."""
+
+    class Meta:
+        model = Column
+        fields = ('id', 'board', 'title', 'position', 'rank', 'header_color')
+        read_only_fields = ('id', 'board', 'rank')
+
+
+class CardFlatSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    """Serializer to map the Card instance to JSON with related objects as primary keys."""
+
+    class Meta:
+        model = Card
+        fields = ('id', 'board', 'column', 'rank', 'title', 'description', 'description_html', 'created_by',
+                  'assignees', 'labels')
+        read_only_fields = ('id', 'board', 'rank')
+
+
+class BoardFlatSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    """Serializer to map the Board instance to JSON without its columns."""
+
     class Meta:
         model = Board
-        fields = ('id', 'title', 'created_by', 'column_set')
+        fields = ('id', 'title', 'created_by', 'project', 'is_template')
+
+
+class CardBulkItemSerializer(serializers.ModelSerializer):
+    """
+    Serializer to validate one card of a bulk write.
+
+    Related objects are given as primary keys and checked against the sets of known keys passed
+    in the context, so validating many cards does not query the database once per card.
+    """
+    id = serializers.IntegerField(required=False)
+    column = serializers.IntegerField(required=False, allow_null=True)
+    created_by = serializers.IntegerField(required=False)
+    assignees = serializers.ListField(child=serializers.IntegerField(), required=False)
+    labels = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+    def validate(self, attrs):
+        errors = {}
+        if self.partial and 'id' not in attrs:
+            errors['id'] = ['This field is required.']
+        if not self.partial and 'created_by' not in attrs:
+            errors['created_by'] = ['This field is required.']
+
+        def check(field, pks, known):
+            missing = [pk for pk in pks if pk not in known]
+            if missing:
+                errors[field] = ['Invalid pk "{0}" - object does not exist.'.format(pk) for pk in missing]
+
+        if attrs.get('id') is not None:
+            check('id', [attrs['id']], self.context['cards'])
+        if attrs.get('column') is not None:
+            check('column', [attrs['column']], self.context['columns'])
+        if 'created_by' in attrs:
+            check('created_by', [attrs['created_by']], self.context['users'])
+        check('assignees', attrs.get('assignees', []), self.context['users'])
+        check('labels', attrs.get('labels', []), self.context['labels'])
+
+        if errors:
+            raise serializers.ValidationError(errors)
+        return attrs
+
+    class Meta:
+        model = Card
+        fields = ('id', 'column', 'title', 'description', 'created_by', 'assignees', 'labels')
+
+
+class MoveSerializer(serializers.Serializer):
+    """Serializer to validate a move between two neighbours, given by primary key."""
+    after = serializers.IntegerField(required=False, allow_null=True)
+    before = serializers.IntegerField(required=False, allow_null=True)
+    column = serializers.IntegerField(required=False, allow_null=True)
+
+
+class CloneSerializer(serializers.Serializer):
+    """Serializer to validate what to copy when cloning a board or instantiating a template."""
+    title = serializers.CharField(max_length=255, required=False)
+    cards = serializers.BooleanField(default=True)
+    comments = serializers.BooleanField(default=False)
+    is_template = serializers.BooleanField(default=False)
+
+
+class SearchHitSerializer(TimedSerializerMixin, serializers.Serializer):
+    """Serializer to map a card or comment found by boards.search to JSON."""
+    type = serializers.CharField()
+    board = serializers.IntegerField()
+    card = serializers.IntegerField()
+    object = serializers.SerializerMethodField()
+
+    def get_object(self, hit):
+        if hit['type'] == 'card':
+            return CardFlatSerializer(hit['object']).data
+        return CommentSerializer(hit['object']).data
+
+
+class IntegerListField(serializers.ListField):
+    """A list of integers, given repeated (?label=1&label=2) and/or comma separated (?label=1,2)."""
+    child = serializers.IntegerField()
+
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            data = [data]
+        if isinstance(data, list):
+            data = [value for item in data for value in str(item).split(',') if value.strip()]
+        return super(IntegerListField, self).to_internal_value(data)
+
 
+class CardFilterSerializer(serializers.Serializer):
+    """Serializer to validate the query parameters filtering cards, see CardQuerySet.matching()."""
+    label = IntegerListField(source='labels', required=False)
+    label_match = serializers.ChoiceField(choices=('any', 'all'), default='any')
+    assignee = IntegerListField(source='assignees', required=False)
+    column = IntegerListField(source='columns', required=False)
+    created_by = IntegerListField(source='creators', required=False)
+    created_after = serializers.DateTimeField(required=False)
+    created_before = serializers.DateTimeField(required=False)
+    updated_after = serializers.DateTimeField(required=False)
+    updated_before = serializers.DateTimeField(required=False)
+    unassigned = serializers.BooleanField(required=False)
+    unlabelled = serializers.BooleanField(required=False)
@@ -0,0 +1,470 @@
+"""
+Horizontal sharding of board data across databases, by board.
+
+A board and everything under it (its columns, labels, cards with their label and assignee links,
+comments and change log) live in one of the BOARD_SHARDS database aliases. Users, tokens,
+projects and the BoardShard directory, which maps every board id to its shard, stay in 'default'.
+The directory hands out the ids of new boards. The rows under a board get theirs from its shard,
+where they start at a range of its own (see the StartShardIds migration operation), so they stay
+unique when boards move. Users are also copied to the other shards, by the 0014 migration when
+one is migrated and then by boards.signals, so that board data can be joined with them there.
+
+ShardRouter sends the queries of board models to the shard of the instance they are about, if
+any, else to the shard of the current board. ShardMiddleware makes the board of a
+/boards/<board_pk>/... request current, use() and for_board() do so for other code, and the
+receivers of board model signals run on the shard of their instance. Other queries of board
+models, Model.objects.create() included, go to 'default'; fan_out() runs queries spanning boards
+on every shard instead and merges the results in order.
+
+move_board() moves a board to another shard while it stays readable: it copies the board, blocks
+writes to it (ShardMiddleware answers them with a 503), copies what changed meanwhile according
+to the change log, switches the directory over and removes the original. Writes still under way
+after the grace period it gives them are lost.
+
+With BOARD_SHARDS left at ['default'] nothing is routed, only new boards are entered in the
+directory. Requests and management commands that span boards (the admin, repair_counters,
+rerender_markdown) only see the boards in 'default'.
+"""
+import contextlib
+import contextvars
+import functools
+import heapq
+import itertools
+import random
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+from django.db.models import Max
+from django.http import JsonResponse
+
+from . import counters
+from .models import Board, BoardChange, BoardShard, Card, Column, Comment, Label
+from .utils import iterate_in_chunks
+
+SHARD_KEY = 'shard:board:{board_pk}'
+FROZEN_KEY = 'shard:board:{board_pk}:frozen'
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# The tables of a board, parents first, with the lookup from each of them to the board
+TABLES = (
+    (Board, 'pk'),
+    (Column, 'board'),
+    (Label, 'board'),
+    (Card, 'board'),
+    (Card.labels.through, 'card__board'),
+    (Card.assignees.through, 'card__board'),
+    (Comment, 'card__board'),
+    (BoardChange, 'board'),
+)
+
+SHARDED_MODELS = frozenset(model for model, _ in TABLES)
+
+# Rows copied with new ids: the links of cards, only ever looked up by card, and the change log,
+# see _copy_log()
+RENUMBERED = (Card.labels.through, Card.assignees.through, BoardChange)
+LINKS = RENUMBERED[:2]
+
+# Model name in the change log -> model, parents first
+LOGGED_MODELS = (('board', Board), ('column', Column), ('label', Label), ('card', Card), ('comment', Comment))
+
+_current = contextvars.ContextVar('board_shard', default=None)
+
+
+class ShardError(ValueError):
+    """A board that cannot be moved."""
+
+
+def aliases():
+    return list(getattr(settings, 'BOARD_SHARDS', [DEFAULT_DB_ALIAS]))
+
+
+def enabled():
+    return aliases() != [DEFAULT_DB_ALIAS]
+
+
+def _timeout():
+    return getattr(settings, 'BOARD_SHARD_TIMEOUT', 60 * 60)
+
+
+def shard_for(board_pk):
+    """The alias of the shard of board board_pk; 'default' for a board not in the directory."""
+    if not enabled() or board_pk is None:
+        return DEFAULT_DB_ALIAS
+    key = SHARD_KEY.format(board_pk=board_pk)
+    alias = cache.get(key)
+    if alias is None:
+        # Never from a replica, which may not know of a new board yet
+        alias = BoardShard.objects.using(DEFAULT_DB_ALIAS).filter(pk=board_pk).values_list('alias', flat=True).first()
+        if alias is None:
+            return DEFAULT_DB_ALIAS
+        cache.set(key, alias, _timeout())
+    return alias
+
+
+def shard_of(instance):
+    """The alias of the shard of an instance of a board model, or None if it cannot tell."""
+    if instance._state.db in aliases():
+        return instance._state.db
+    if isinstance(instance, Board):
+        board_pk = instance.pk
+    elif isinstance(instance, Comment):
+        card = instance._state.fields_cache.get('card')
+        return None if card is None else shard_of(card)
+    else:
+        board_pk = getattr(instance, 'board_id', None)
+    return None if board_pk is None else shard_for(board_pk)
+
+
+def allocate():
+    """Enter a new board in the directory, on the current shard or else a random one, and return its id and shard."""
+    alias = _current.get() or random.choice(aliases())
+    entry = BoardShard.objects.using(DEFAULT_DB_ALIAS).create(alias=alias)
+    if enabled():
+        cache.set(SHARD_KEY.format(board_pk=entry.pk), alias, _timeout())
+    return entry.pk, alias
+
+
+def current():
+    return _current.get()
+
+
+@contextlib.contextmanager
+def use(alias):
+    """Make alias the shard of the queries of board models within the block."""
+    token = _current.set(alias)
+    try:
+        yield alias
+    finally:
+        _current.reset(token)
+
+
+def for_board(board_pk):
+    """Make the shard of board board_pk current within the block."""
+    return use(shard_for(board_pk))
+
+
+def on_instance_shard(receiver):
+    """Run a signal receiver with the shard the instance sending the signal is on current."""
+    @functools.wraps(receiver)
+    def wrapper(sender, instance, **kwargs):
+        if instance._state.db not in aliases() or instance._state.db == _current.get():
+            return receiver(sender, instance, **kwargs)
+        with use(instance._state.db):
+            return receiver(sender, instance, **kwargs)
+    return wrapper
+
+
+def within(alias, iterable):
+    """Iterate over iterable with alias current, e.g. the body of a streamed response."""
+    iterator = iter(iterable)
+    while True:
+        with use(alias):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+class ShardRouter(object):
+    """
+    Send the queries of board models to their shard. The default database is left to the routers
+    after this one, which may read it from a replica.
+    """
+
+    def route(self, model, hints):
+        if model not in SHARDED_MODELS or not enabled():
+            return None
+        alias = None
+        instance = hints.get('instance')
+        if instance is not None and type(instance) in SHARDED_MODELS:
+            alias = shard_of(instance)
+        if alias is None:
+            alias = _current.get()
+        return None if alias == DEFAULT_DB_ALIAS else alias
+
+    def db_for_read(self, model, **hints):
+        if model is User:
+            # The users of board data, e.g. the assignees of a card, are joined with it on its shard
+            instance = hints.get('instance')
+            if instance is None or type(instance) not in SHARDED_MODELS or not enabled():
+                return None
+            alias = shard_of(instance)
+            return None if alias == DEFAULT_DB_ALIAS else alias
+        return self.route(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self.route(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Board data refers to users and projects in the default database
+        if enabled() and (type(obj1) in SHARDED_MODELS or type(obj2) in SHARDED_MODELS):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if app_label == 'boards' and model_name == 'boardshard':
+            return db == DEFAULT_DB_ALIAS
+        return None
+
+
+def mirror_users(users, fields=None, using=None):
+    """
+    Copy users, or just their `fields`, from 'default' to the shard `using` or else to every
+    other shard, so that board data can be joined with its users there.
+    """
+    users = list(users)
+    targets = [using] if using is not None else [alias for alias in aliases() if alias != DEFAULT_DB_ALIAS]
+    names = fields or [field.attname for field in User._meta.concrete_fields if not field.primary_key]
+    for alias in targets:
+        existing = set(User.objects.using(alias).filter(pk__in=[user.pk for user in users])
+                       .values_list('pk', flat=True))
+        for user in users:
+            if user.pk in existing:
+                User.objects.using(alias).filter(pk=user.pk).update(**{name: getattr(user, name) for name in names})
+        User.objects.using(alias).bulk_create([user for user in users if user.pk not in existing])
+
+
+def forget_users(pks):
+    """Remove the copies of the users pks from the shards, and their cards' links to them."""
+    for alias in aliases():
+        if alias != DEFAULT_DB_ALIAS:
+            Card.assignees.through.objects.using(alias).filter(user_id__in=pks)._raw_delete(alias)
+            User.objects.using(alias).filter(pk__in=pks)._raw_delete(alias)
+
+
+class ShardMiddleware(object):
+    """Make the board of a request under /boards/<board_pk>/ current, and hold off writes to a board being moved."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _current.set(None)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        alias = getattr(request, 'board_shard', None)
+        if alias is not None and response.streaming:
+            response.streaming_content = within(alias, response.streaming_content)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        board_pk = view_kwargs.get('board_pk')
+        if board_pk is None or not enabled():
+            return None
+        if request.method not in SAFE_METHODS and cache.get(FROZEN_KEY.format(board_pk=board_pk)):
+            response = JsonResponse({'detail': 'The board is being moved, try again shortly.'}, status=503)
+            response['Retry-After'] = '5'
+            return response
+        request.board_shard = shard_for(board_pk)
+        _current.set(request.board_shard)
+        return None
+
+
+class _Sorted(object):
+    """A value sorting ascending, or descending if reverse is set."""
+
+    __slots__ = ('value', 'reverse')
+
+    def __init__(self, value, reverse):
+        self.value, self.reverse = value, reverse
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __lt__(self, other):
+        return other.value < self.value if self.reverse else self.value < other.value
+
+
+class FanOut(object):
+    """
+    A queryset run on every shard, the results merged in the order of its order_by().
+
+    It supports what the list views and paginators use: filter(), exclude(), order_by(),
+    slicing, iteration, count() and iterate_in_chunks(). A slice [a:b] reads up to b rows from
+    each shard, so deep pages are better reached with keyset than with offset pagination.
+    """
+
+    def __init__(self, queryset, aliases):
+        self.queryset = queryset
+        self.aliases = aliases
+        self.model = queryset.model
+
+    def _chain(self, queryset):
+        return FanOut(queryset, self.aliases)
+
+    def all(self):
+        return self._chain(self.queryset.all())
+
+    def filter(self, *args, **kwargs):
+        return self._chain(self.queryset.filter(*args, **kwargs))
+
+    def exclude(self, *args, **kwargs):
+        return self._chain(self.queryset.exclude(*args, **kwargs))
+
+    def order_by(self, *fields):
+        return self._chain(self.queryset.order_by(*fields))
+
+    @property
+    def ordered(self):
+        return self.queryset.ordered
+
+    def key(self):
+        ordering = list(self.queryset.query.order_by) or list(self.model._meta.ordering) or ['pk']
+        fields = [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+        return lambda obj: tuple(_Sorted(getattr(obj, name), reverse) for name, reverse in fields)
+
+    def count(self):
+        return sum(self.queryset.using(alias).count() for alias in self.aliases)
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or key.step is not None:
+            raise TypeError('Querysets of every shard can only be sliced.')
+        start, stop = key.start or 0, key.stop
+        querysets = [self.queryset.using(alias) for alias in self.aliases]
+        if stop is not None:
+            querysets = [queryset[:stop] for queryset in querysets]
+        return list(itertools.islice(heapq.merge(*querysets, key=self.key()), start, stop))
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def iterate_in_chunks(self, size):
+        streams = [
+            itertools.chain.from_iterable(iterate_in_chunks(self.queryset.using(alias), size))
+            for alias in self.aliases
+        ]
+        merged = heapq.merge(*streams, key=self.key())
+        while True:
+            chunk = list(itertools.islice(merged, size))
+            if not chunk:
+                return
+            yield chunk
+
+
+def fan_out(queryset):
+    """queryset, run on every shard if there are several."""
+    if not enabled():
+        return queryset
+    return FanOut(queryset, aliases())
+
+
+def _copy(model, queryset, alias, batch_size, ids=None):
+    """Insert the rows of queryset in shard alias, keeping their ids or else taking them from `ids`."""
+    names = [field.attname for field in model._meta.concrete_fields if model not in RENUMBERED or not field.primary_key]
+    batch = []
+    for row in queryset.values_list(*names).iterator(chunk_size=batch_size):
+        obj = model(**dict(zip(names, row)))
+        if ids is not None:
+            obj.pk = next(ids)
+        batch.append(obj)
+        if len(batch) == batch_size:
+            model.objects.using(alias).bulk_create(batch)
+            batch = []
+    model.objects.using(alias).bulk_create(batch)
+
+
+def _delete(queryset, alias):
+    # Without signals, which would log the rows as deleted in the change log the board keeps
+    queryset._raw_delete(alias)
+
+
+def _copy_log(board_pk, source, target, after, batch_size):
+    """
+    Copy the change log entries of board board_pk after cursor `after` to shard target and return
+    the cursor of the last one. They are numbered after every entry there and every cursor handed
+    out for the board, so cursors keep increasing: clients catch up with the whole log once.
+    """
+    entries = BoardChange.objects.using(source).filter(board_id=board_pk, id__gt=after)
+    last = entries.aggregate(Max('id'))['id__max']
+    if last is None:
+        return after
+    start = max(last, BoardChange.objects.using(target).aggregate(Max('id'))['id__max'] or 0)
+    _copy(BoardChange, entries.filter(id__lte=last).order_by('id'), target, batch_size, ids=itertools.count(start + 1))
+    connection = connections[target]
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [BoardChange]):
+            cursor.execute(sql)
+    return last
+
+
+def _replay(board_pk, source, target, since, batch_size):
+    """Copy the rows of board board_pk logged as changed after cursor since again, or delete them."""
+    changed = {}
+    entries = BoardChange.objects.using(source).filter(board_id=board_pk, id__gt=since)
+    for name, pk in entries.values_list('model', 'object_id'):
+        changed.setdefault(name, set()).add(pk)
+
+    # The links of a card are logged as changes to the card
+    cards = list(changed.get('card', ()))
+    for through in LINKS:
+        _delete(through.objects.using(target).filter(card_id__in=cards), target)
+    for name, model in reversed(LOGGED_MODELS):
+        _delete(model.objects.using(target).filter(pk__in=list(changed.get(name, ()))), target)
+    for name, model in LOGGED_MODELS:
+        _copy(model, model.objects.using(source).filter(pk__in=list(changed.get(name, ()))), target, batch_size)
+    for through in LINKS:
+        _copy(through, through.objects.using(source).filter(card_id__in=cards), target, batch_size)
+    # Counters are updated without being logged
+    with use(target):
+        counters.recount_board(board_pk)
+
+
+def remove_board(board_pk, alias):
+    """Delete the rows of board board_pk from shard alias, without logging it."""
+    with transaction.atomic(using=alias):
+        for model, lookup in reversed(TABLES):
+            _delete(model.objects.using(alias).filter(**{lookup: board_pk}), alias)
+
+
+def move_board(board_pk, target, batch_size=1000, grace=2):
+    """
+    Move board board_pk and everything under it to shard target, keeping their ids but those of
+    the change log (see _copy_log()), and return the shard it was on. Writes to the board are refused for `grace` seconds, to let those under
+    way finish, plus the time to copy what they changed.
+
+    Raise ShardError if the board cannot be moved, e.g. as ids of its rows are taken on target,
+    leaving it where it was.
+    """
+    source = shard_for(board_pk)
+    if target not in aliases():
+        raise ShardError('{0!r} is not one of the shards {1}.'.format(target, ', '.join(aliases())))
+    if not Board.objects.using(source).filter(pk=board_pk).exists():
+        raise ShardError('Board {0} does not exist.'.format(board_pk))
+    if source == target:
+        raise ShardError('Board {0} is already on {1!r}.'.format(board_pk, target))
+
+    since = BoardChange.objects.using(source).filter(board_id=board_pk).aggregate(Max('id'))['id__max'] or 0
+    try:
+        with transaction.atomic(using=target):
+            for model, lookup in TABLES[:-1]:
+                _copy(model, model.objects.using(source).filter(**{lookup: board_pk}).order_by('pk'), target,
+                      batch_size)
+            copied = _copy_log(board_pk, source, target, 0, batch_size)
+    except DatabaseError as e:
+        raise ShardError('Board {0} cannot be copied to {1!r}: {2}'.format(board_pk, target, e))
+
+    frozen = FROZEN_KEY.format(board_pk=board_pk)
+    cache.set(frozen, True, _timeout())
+    try:
+        time.sleep(grace)
+        with transaction.atomic(using=target):
+            _replay(board_pk, source, target, since, batch_size)
+            _copy_log(board_pk, source, target, copied, batch_size)
+        BoardShard.objects.using(DEFAULT_DB_ALIAS).update_or_create(pk=board_pk, defaults={'alias': target})
+        cache.set(SHARD_KEY.format(board_pk=board_pk), target, _timeout())
+    except BaseException:
+        remove_board(board_pk, target)
+        raise
+    finally:
+        cache.delete(frozen)
+
+    remove_board(board_pk, source)
+    return source
@@ -0,0 +1,233 @@
+import contextlib
+import contextvars
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from projects.models import Project
+
+from . import access, cache, changes, counters, events, shards, tokens
+from .models import Board, Column, Label, Card, Comment, BoardChange
+from .serializers import UserSerializer
+
+BOARD_MODELS = (Board, Column, Label, Card, Comment)
+
+# Set while boards are deleted, see deleting_boards()
+_deleting_boards = contextvars.ContextVar('deleting_boards', default=False)
+
+
+@contextlib.contextmanager
+def deleting_boards():
+    """
+    Delete boards within the block. The columns, labels, cards and comments that go with them are
+    neither logged nor counted: the board's own tombstone stands for them, and their counters go
+    too, which keeps a delete to a fixed number of queries besides the cascade itself.
+    """
+    token = _deleting_boards.set(True)
+    try:
+        yield
+    finally:
+        _deleting_boards.reset(token)
+
+
+def board_changed(board_pk):
+    """Invalidate the cached snapshots of a board.
+
+    The version is bumped straight away and again once the transaction commits, so a reader that
+    rebuilds the snapshot from not yet committed data cannot leave it cached.
+    """
+    if board_pk is None:
+        return
+    cache.bump_version(board_pk)
+    transaction.on_commit(lambda: cache.bump_version(board_pk), using=shards.shard_for(board_pk))
+
+
+def object_changed(board_pk, instance, action):
+    """Log a change to an object of a board and publish it once the transaction commits."""
+    entry = changes.record(board_pk, instance, action)
+    event = {'seq': entry.pk, 'model': entry.model, 'id': entry.object_id, 'action': action}
+    transaction.on_commit(lambda: events.publish(board_pk, event), using=entry._state.db)
+
+
+def objects_changed(board_pk, instances, action):
+    """Counterpart of object_changed for bulk writes, which do not send model signals."""
+    if not instances:
+        return
+    entries = changes.record_many(board_pk, instances, action)
+    published = [
+        {'seq': entry.pk, 'model': entry.model, 'id': entry.object_id, 'action': action} for entry in entries
+    ]
+
+    def publish():
+        for event in published:
+            events.publish(board_pk, event)
+
+    transaction.on_commit(publish, using=entries[0]._state.db)
+    board_changed(board_pk)
+
+
+@shards.on_instance_shard
+def board_object_saved(sender, instance, created, **kwargs):
+    board_pk = cache.board_pk_for(instance)
+    object_changed(board_pk, instance, BoardChange.CREATED if created else BoardChange.UPDATED)
+    board_changed(board_pk)
+
+
+@shards.on_instance_shard
+def board_object_deleted(sender, instance, **kwargs):
+    if _deleting_boards.get() and not isinstance(instance, Board):
+        return
+    board_pk = cache.board_pk_for(instance)
+    object_changed(board_pk, instance, BoardChange.DELETED)
+    board_changed(board_pk)
+
+
+for model in BOARD_MODELS:
+    # Connected per model: a receiver for every sender would disable fast deletes project-wide
+    post_save.connect(board_object_saved, sender=model)
+    post_delete.connect(board_object_deleted, sender=model)
+
+
+# Counters: raw saves come from fixtures, whose counts repair_counters recomputes
+
+@receiver(post_save, sender=Column)
+@shards.on_instance_shard
+def column_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.column_added(instance)
+
+
+@receiver(post_delete, sender=Column)
+@shards.on_instance_shard
+def column_deleted(sender, instance, **kwargs):
+    if _deleting_boards.get():
+        return
+    counters.column_added(instance, -1)
+
+
+@receiver(post_save, sender=Card)
+@shards.on_instance_shard
+def card_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.card_added(instance)
+    elif hasattr(instance, 'loaded_column_id') and instance.loaded_column_id != instance.column_id:
+        counters.card_moved(instance, instance.loaded_column_id)
+    instance.loaded_column_id = instance.column_id
+
+
+@receiver(post_delete, sender=Card)
+@shards.on_instance_shard
+def card_deleted(sender, instance, **kwargs):
+    if _deleting_boards.get():
+        return
+    counters.card_added(instance, -1)
+
+
+@receiver(post_save, sender=Comment)
+@shards.on_instance_shard
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.comment_added(instance)
+
+
+@receiver(post_delete, sender=Comment)
+@shards.on_instance_shard
+def comment_deleted(sender, instance, **kwargs):
+    if _deleting_boards.get():
+        return
+    counters.comment_added(instance, -1)
+
+
+@receiver(m2m_changed, sender=Card.labels.through)
+@receiver(m2m_changed, sender=Card.assignees.through)
+@shards.on_instance_shard
+def card_relations_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            cards = [instance]
+        else:
+            return
+    else:
+        # A label's or a user's cards were changed; a user's may span several boards.
+        if action in ('post_add', 'post_remove'):
+            cards = Card.objects.filter(pk__in=pk_set)
+        elif action == 'pre_clear':
+            related_name = 'card_labels' if isinstance(instance, Label) else 'card_assignees'
+            cards = getattr(instance, related_name).all()
+        else:
+            return
+        cards = list(cards.only('pk', 'board_id'))
+
+    for card in cards:
+        object_changed(card.board_id, card, BoardChange.UPDATED)
+    for board_pk in {card.board_id for card in cards}:
+        board_changed(board_pk)
+
+
+# Cached token authentication, see boards.tokens
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def token_changed(sender, instance, **kwargs):
+    tokens.invalidate(instance.key)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    # Logging in only updates last_login, which cached users can do without
+    if created or (update_fields is not None and set(update_fields) == {'last_login'}):
+        return
+    keys = list(Token.objects.filter(user_id=instance.pk).values_list('key', flat=True))
+    if keys:
+        tokens.invalidate(*keys)
+
+
+# Board snapshots and ETags embed the users assigned to cards, see boards.cache
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_renamed(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and not set(update_fields) & set(UserSerializer.Meta.fields)):
+        return
+    for alias in shards.aliases():
+        assigned = Card.objects.using(alias).filter(assignees=instance.pk)
+        for board_pk in assigned.order_by().values_list('board_id', flat=True).distinct():
+            board_changed(board_pk)
+
+
+# Users copied to the shards, see boards.shards
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_mirrored(sender, instance, update_fields=None, **kwargs):
+    if shards.enabled() and not (update_fields is not None and set(update_fields) == {'last_login'}):
+        shards.mirror_users([instance], fields=update_fields and [sender._meta.get_field(name).attname
+                                                                   for name in update_fields])
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_unmirrored(sender, instance, **kwargs):
+    if shards.enabled():
+        shards.forget_users([instance.pk])
+
+
+# Board access, see boards.access
+
+@receiver(post_save, sender=Board)
+def board_saved(sender, instance, **kwargs):
+    access.forget(instance.pk)
+
+
+@receiver(post_delete, sender=Board)
+def board_deleted(sender, instance, **kwargs):
+    # Keep who could see the board, so they can still read its change log
+    access.remember(instance)
+
+
+@receiver(pre_delete, sender=Project)
+def project_deleted(sender, instance, **kwargs):
+    # Its boards lose their project with an UPDATE, which sends no signals
+    access.forget(*instance.boards.values_list('pk', flat=True))
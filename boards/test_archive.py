@@ -0,0 +1,102 @@
+import json
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from .archive import ArchiveError, export_board, import_board
+from .changes import changes_since
+from .models import Board, Column, Label, Card, Comment
+from .tree import board_tree
+
+
+def without_ids(tree):
+    """A board tree with its ids left out, to compare boards with different ids."""
+    if isinstance(tree, list):
+        return [without_ids(item) for item in tree]
+    if isinstance(tree, dict):
+        return {key: without_ids(value) for key, value in tree.items()
+                if key not in ('id', 'board', 'column', 'card', 'labels')}
+    return tree
+
+
+class BoardArchiveTest(TestCase):
+    """This class defines the test suite for the NDJSON export and import of boards."""
+
+    def setUp(self):
+        User = get_user_model()
+        self.users = [
+            User.objects.create_user('user{0}'.format(i), email='user{0}@test.com'.format(i), password='test')
+            for i in range(2)
+        ]
+        self.board = Board.objects.create(title='Test Board', created_by=self.users[0])
+        labels = [Label.objects.create(board=self.board, title='Label {0}'.format(i)) for i in range(2)]
+        columns = [Column.objects.create(board=self.board, title='Column {0}'.format(i), position=i) for i in range(2)]
+        for i in range(4):
+            card = Card.objects.create(board=self.board, column=columns[i % 2], title='Card {0}'.format(i),
+                                       description='*Card* {0}.'.format(i), created_by=self.users[i % 2])
+            card.labels.set(labels[:i % 3])
+            card.assignees.set(self.users[:i % 3])
+            for j in range(i):
+                Comment.objects.create(card=card, message='Comment {0}.'.format(j), created_by=self.users[j % 2])
+        Card.objects.create(board=self.board, column=None, title='Loose Card', description='',
+                            created_by=self.users[0])
+        Comment.objects.update(created_at=timezone.now() - timedelta(days=3))
+
+    def test_import_recreates_the_exported_board(self):
+        board = import_board(export_board(self.board.pk, chunk_size=2), self.users[1], batch_size=2)
+        self.assertNotEqual(board.pk, self.board.pk)
+        self.assertEqual(board.created_by, self.users[1])
+        self.assertEqual(without_ids(board_tree(board.pk)['column_set']),
+                         without_ids(board_tree(self.board.pk)['column_set']))
+
+        board.refresh_from_db()
+        self.assertEqual((board.column_count, board.card_count, board.comment_count), (2, 5, 6))
+        self.assertEqual(
+            sorted(Card.objects.filter(board=board).values_list('title', 'labels__title')),
+            sorted(Card.objects.filter(board=self.board).values_list('title', 'labels__title')),
+        )
+
+    def test_import_logs_the_created_rows(self):
+        board = import_board(export_board(self.board.pk), self.users[1])
+        logged = {}
+        for change in changes_since(board.pk, limit=1000)['changes']:
+            logged[change['model']] = logged.get(change['model'], 0) + 1
+        self.assertEqual(logged, {'board': 1, 'column': 2, 'label': 2, 'card': 5, 'comment': 6})
+
+    def test_import_ranks_lists_with_malformed_ranks_again(self):
+        records = [json.loads(line) for line in export_board(self.board.pk)]
+        cards = [record['data'] for record in records if record['type'] == 'card' and record['data']['column']]
+        ranks = ['b', 'a']
+        for record in records:
+            if record['type'] == 'column':
+                record['data']['rank'] = ranks.pop()
+        cards[0]['rank'], cards[2]['rank'] = 'z' + '0' * 299, 'i0'
+        board = import_board([json.dumps(record) for record in records], self.users[1])
+        self.assertEqual(list(Column.objects.filter(board=board).order_by('rank').values_list('title', 'rank')),
+                         [('Column 0', 'i0'), ('Column 1', 'i1')])
+        column = Column.objects.get(board=board, title='Column 0')
+        self.assertEqual(list(Card.objects.filter(column=column).order_by('rank').values_list('title', 'rank')),
+                         [('Card 2', 'i0'), ('Card 0', 'i1')])
+
+    def test_import_writes_a_fixed_number_of_queries_per_batch(self):
+        lines = list(export_board(self.board.pk))
+        with self.assertNumQueries(48):
+            import_board(lines, self.users[1], batch_size=1000)
+
+    def test_import_rejects_bad_lines_and_leaves_nothing_behind(self):
+        lines = list(export_board(self.board.pk))
+        boards = Board.objects.count()
+        for bad in (lines[1:], lines[:1] + [b'{"type": "card", "data": {"id": 1, "column": 999}}'],
+                    lines + [b'not json']):
+            with self.assertRaises(ArchiveError):
+                import_board(bad, self.users[0])
+        self.assertEqual(Board.objects.count(), boards)
+
+    def test_export_and_import_commands(self):
+        out = StringIO()
+        call_command('export_board', self.board.pk, stdout=out)
+        self.assertEqual(out.getvalue().encode('utf-8'), b''.join(export_board(self.board.pk)))
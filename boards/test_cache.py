@@ -0,0 +1,84 @@
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from . import cache as board_cache
+from .models import Board, Column, Label, Card, Comment
+
+
+class BoardSnapshotCacheTest(TestCase):
+    """This class defines the test suite for the board snapshot cache."""
+
+    def setUp(self):
+        cache.clear()
+        board_cache.reset_stats()
+        board_cache.board_pk_for_card.cache_clear()
+        self.user = get_user_model().objects.create_user('test', email='testuser@test.com', password='test')
+        self.board = Board(title='Test Board', created_by=self.user)
+        self.board.save()
+        self.column = Column.objects.create(board=self.board, title='Backlog', position=1)
+        self.label = Label.objects.create(board=self.board, title='Red Label', color='#FF0000')
+        self.card = Card.objects.create(board=self.board, column=self.column, title='Test Card',
+                                        description='Test Card description.', created_by=self.user)
+
+    def assertBumps(self, write):
+        version = board_cache.get_version(self.board.pk)
+        write()
+        self.assertGreater(board_cache.get_version(self.board.pk), version)
+
+    def test_snapshot_is_built_once_and_then_served_from_cache(self):
+        builds = []
+        for _ in range(3):
+            snapshot = board_cache.get_snapshot(self.board.pk, lambda: builds.append(1) or {'id': self.board.pk})
+        self.assertEqual(snapshot, {'id': self.board.pk})
+        self.assertEqual(len(builds), 1)
+        stats = board_cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['rebuilds']), (2, 1, 1))
+
+    def test_writes_bump_the_board_version(self):
+        self.assertBumps(lambda: Board.objects.get(pk=self.board.pk).save())
+        self.assertBumps(lambda: Column.objects.create(board=self.board, title='Done', position=2))
+        self.assertBumps(lambda: self.label.save())
+        self.assertBumps(lambda: self.card.save())
+        self.assertBumps(lambda: Comment.objects.create(card=self.card, message='Hi.', created_by=self.user))
+        self.assertBumps(lambda: Comment.objects.get().delete())
+        self.assertBumps(lambda: self.card.labels.add(self.label))
+        self.assertBumps(lambda: self.label.card_labels.clear())
+        self.assertBumps(lambda: self.user.card_assignees.add(self.card))
+        self.assertBumps(lambda: self.user.card_assignees.clear())
+        self.assertBumps(lambda: self.column.delete())
+
+    def test_renaming_an_assignee_bumps_the_boards_of_their_cards(self):
+        self.card.assignees.add(self.user)
+        self.user.username = 'renamed'
+        self.assertBumps(lambda: self.user.save())
+        self.assertBumps(lambda: self.user.save(update_fields=['email']))
+        version = board_cache.get_version(self.board.pk)
+        self.user.save(update_fields=['last_login'])
+        self.assertEqual(board_cache.get_version(self.board.pk), version)
+
+    @override_settings(BOARD_VERSION_TIMEOUT=0.1)
+    def test_versions_expire(self):
+        key = board_cache.VERSION_KEY.format(board_pk=0)
+        board_cache.get_version(0)
+        self.assertIsNotNone(cache.get(key))
+        time.sleep(0.2)
+        self.assertIsNone(cache.get(key))
+
+    def test_concurrent_misses_are_coalesced(self):
+        builds = []
+
+        def build():
+            builds.append(1)
+            time.sleep(0.1)
+            return {'id': self.board.pk}
+
+        threads = [threading.Thread(target=board_cache.get_snapshot, args=(self.board.pk, build)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(builds), 1)
@@ -0,0 +1,78 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from .changes import changes_since
+from .clone import clone_board
+from .models import Board, Column, Label, Card, Comment
+from .tree import board_tree
+
+
+def without_ids(tree):
+    """A board tree with its ids, authors and times left out, to compare copies of boards."""
+    if isinstance(tree, list):
+        return [without_ids(item) for item in tree]
+    if isinstance(tree, dict):
+        return {key: without_ids(value) for key, value in tree.items()
+                if key not in ('id', 'board', 'column', 'card', 'labels', 'created_by', 'created_at')}
+    return tree
+
+
+class CloneBoardTest(TestCase):
+    """This class defines the test suite for the deep copies of boards."""
+
+    def setUp(self):
+        User = get_user_model()
+        self.users = [
+            User.objects.create_user('user{0}'.format(i), email='user{0}@test.com'.format(i), password='test')
+            for i in range(2)
+        ]
+        self.board = Board.objects.create(title='Test Board', created_by=self.users[0])
+        self.populate(self.board, cards=4)
+
+    def populate(self, board, cards):
+        labels = [Label.objects.create(board=board, title='Label {0}'.format(i)) for i in range(2)]
+        columns = [Column.objects.create(board=board, title='Column {0}'.format(i), position=i) for i in range(2)]
+        columns[1].move(before=columns[0])
+        for i in range(cards):
+            card = Card.objects.create(board=board, column=columns[i % 2], title='Card {0}'.format(i),
+                                       description='*Card* {0}.'.format(i), created_by=self.users[0])
+            card.labels.set(labels[:i % 3])
+            card.assignees.set(self.users[:i % 3])
+            for j in range(i):
+                Comment.objects.create(card=card, message='Comment {0}.'.format(j), created_by=self.users[j % 2])
+
+    def test_clone_copies_the_whole_tree(self):
+        clone = clone_board(self.board, self.users[1], title='Copy', comments=True)
+        self.assertEqual((clone.title, clone.created_by, clone.is_template), ('Copy', self.users[1], False))
+        self.assertEqual(without_ids(board_tree(clone.pk)['column_set']),
+                         without_ids(board_tree(self.board.pk)['column_set']))
+        self.assertEqual(
+            sorted(Card.objects.filter(board=clone).values_list('title', 'labels__title')),
+            sorted(Card.objects.filter(board=self.board).values_list('title', 'labels__title')),
+        )
+        self.assertFalse(Card.objects.filter(board=clone).exclude(created_by=self.users[1]).exists())
+
+        clone.refresh_from_db()
+        self.assertEqual((clone.column_count, clone.card_count, clone.comment_count), (2, 4, 6))
+
+    def test_clone_logs_the_copied_rows(self):
+        clone = clone_board(self.board, self.users[1], comments=True)
+        logged = {}
+        for change in changes_since(clone.pk, limit=1000)['changes']:
+            logged[change['model']] = logged.get(change['model'], 0) + 1
+        self.assertEqual(logged, {'board': 1, 'column': 2, 'label': 2, 'card': 4, 'comment': 6})
+
+    def test_clone_without_cards_copies_only_columns_and_labels(self):
+        template = clone_board(self.board, self.users[0], cards=False, is_template=True)
+        self.assertTrue(template.is_template)
+        self.assertEqual(Column.objects.filter(board=template).count(), 2)
+        self.assertEqual(Label.objects.filter(board=template).count(), 2)
+        self.assertFalse(Card.objects.filter(board=template).exists())
+
+    def test_clone_runs_the_same_number_of_queries_for_any_board_size(self):
+        with self.assertNumQueries(49):
+            clone_board(self.board, self.users[1], comments=True)
+        board = Board.objects.create(title='Bigger Board', created_by=self.users[0])
+        self.populate(board, cards=12)
+        with self.assertNumQueries(49):
+            clone_board(board, self.users[1], comments=True)
@@ -0,0 +1,93 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from .bulk import BulkCardWrite
+from .models import Board, BoardChange, Column, Card, Comment
+
+
+class CounterTest(TestCase):
+    """This class defines the test suite for the denormalized board, column and card counters."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('test', email='testuser@test.com', password='test')
+        self.board = Board(title='Test Board', created_by=self.user)
+        self.board.save()
+        self.todo = Column.objects.create(board=self.board, title='To Do', position=1)
+        self.done = Column.objects.create(board=self.board, title='Done', position=2)
+        self.card = self.new_card(self.todo)
+        for i in range(3):
+            Comment.objects.create(card=self.card, message='Comment {0}.'.format(i), created_by=self.user)
+
+    def new_card(self, column):
+        return Card.objects.create(board=self.board, column=column, title='Test Card',
+                                   description='Test Card description.', created_by=self.user)
+
+    def assertCounts(self, obj, **counts):
+        obj.refresh_from_db()
+        self.assertEqual({field: getattr(obj, field) for field in counts}, counts)
+
+    def test_counters_follow_creates_and_deletes(self):
+        self.assertCounts(self.board, column_count=2, card_count=1, comment_count=3)
+        self.assertCounts(self.todo, card_count=1, comment_count=3)
+        self.assertCounts(self.card, comment_count=3)
+
+        self.card.comment_set.first().delete()
+        self.assertCounts(self.card, comment_count=2)
+        self.assertCounts(self.todo, card_count=1, comment_count=2)
+
+        self.card.delete()
+        self.assertCounts(self.board, column_count=2, card_count=0, comment_count=0)
+        self.assertCounts(self.todo, card_count=0, comment_count=0)
+
+    def test_deleting_a_board_skips_the_counters_and_log_of_its_rows(self):
+        other = Board(title='Other Board', created_by=self.user)
+        other.save()
+        Column.objects.create(board=other, title='To Do', position=1)
+        for delete in (self.board.delete, Board.objects.filter(pk=other.pk).delete):
+            seen = BoardChange.objects.latest('id').pk
+            with CaptureQueriesContext(connection) as queries:
+                delete()
+            self.assertFalse([query['sql'] for query in queries if query['sql'].startswith('UPDATE')])
+            self.assertEqual(list(BoardChange.objects.filter(id__gt=seen).values_list('model', 'action')),
+                             [('board', BoardChange.DELETED)])
+
+    def test_moving_a_card_moves_its_counts(self):
+        self.card.move(column=self.done)
+        self.assertCounts(self.todo, card_count=0, comment_count=0)
+        self.assertCounts(self.done, card_count=1, comment_count=3)
+        self.assertCounts(self.board, card_count=1, comment_count=3)
+
+    def test_saving_a_stale_instance_keeps_the_counters(self):
+        board = Board.objects.get(pk=self.board.pk)
+        self.new_card(self.todo)
+        board.title = 'Renamed Board'
+        board.save()
+        self.assertCounts(self.board, title='Renamed Board', card_count=2)
+
+    def test_bulk_writes_update_the_counters(self):
+        write = BulkCardWrite(self.board, {
+            'create': [{'column': self.done.pk, 'title': 'New Card', 'description': 'New Card description.',
+                        'created_by': self.user.pk}],
+            'update': [{'id': self.card.pk, 'column': self.done.pk}],
+        })
+        self.assertTrue(write.is_valid())
+        write.save()
+        self.assertCounts(self.board, card_count=2, comment_count=3)
+        self.assertCounts(self.todo, card_count=0, comment_count=0)
+        self.assertCounts(self.done, card_count=2, comment_count=3)
+
+    def test_repair_counters_command_fixes_drifted_counters(self):
+        Column.objects.filter(pk=self.todo.pk).update(card_count=7)
+        Card.objects.filter(pk=self.card.pk).update(comment_count=0)
+        out = StringIO()
+        call_command('repair_counters', batch_size=1, stdout=out)
+        self.assertIn('Repaired 1 column counters.', out.getvalue())
+        self.assertIn('Repaired 1 card counters.', out.getvalue())
+        self.assertIn('Repaired 0 board counters.', out.getvalue())
+        self.assertCounts(self.todo, card_count=1, comment_count=3)
+        self.assertCounts(self.card, comment_count=3)
@@ -0,0 +1,67 @@
+import asyncio
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from . import events
+from .models import Board, Column
+
+
+class InProcessBackendTest(TestCase):
+    """This class defines the test suite for the in-process board events backend."""
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.backend = events.InProcessBackend()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_subscribers_receive_events_of_their_channel(self):
+        subscription = self.backend.subscribe('board:1', loop=self.loop)
+        other = self.backend.subscribe('board:2', loop=self.loop)
+        self.backend.publish('board:1', {'seq': 1})
+        self.assertEqual(self.loop.run_until_complete(subscription.get(timeout=1)), [{'seq': 1}])
+        self.assertEqual(other.pending(), [])
+
+    def test_slow_subscribers_are_told_to_resync(self):
+        subscription = self.backend.subscribe('board:1', maxsize=3, loop=self.loop)
+        for seq in range(5):
+            self.backend.publish('board:1', {'seq': seq})
+        self.assertEqual(subscription.pending(), [events.RESYNC])
+        self.backend.publish('board:1', {'seq': 5})
+        self.assertEqual(subscription.pending(), [{'seq': 5}])
+
+    def test_closed_subscriptions_are_forgotten(self):
+        subscription = self.backend.subscribe('board:1', loop=self.loop)
+        subscription.close()
+        self.assertEqual(self.backend.subscriber_count('board:1'), 0)
+
+
+class BoardEventsPublishingTest(TestCase):
+    """This class defines the test suite for events published by model writes."""
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.user = get_user_model().objects.create_user('test', email='testuser@test.com', password='test')
+        self.board = Board(title='Test Board', created_by=self.user)
+        self.board.save()
+        self.subscription = events.subscribe(self.board.pk, loop=self.loop)
+
+    def tearDown(self):
+        self.subscription.close()
+        self.loop.close()
+
+    def test_events_are_published_once_the_write_commits(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            column = Column.objects.create(board=self.board, title='Backlog', position=1)
+            self.assertEqual(self.subscription.pending(), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            column.delete()
+
+        published = self.subscription.pending()
+        self.assertEqual(
+            [(event['model'], event['action']) for event in published],
+            [('column', 'created'), ('column', 'deleted')]
+        )
+        self.assertLess(published[0]['seq'], published[1]['seq'])
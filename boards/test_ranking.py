@@ -0,0 +1,125 @@
+import random
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from .models import Board, BoardChange, Column, Card
+from .ranking import key_between, evenly_spaced, rebalance
+
+
+class RankKeyTest(TestCase):
+    """This class defines the test suite for fractional rank keys."""
+
+    def test_key_between_sorts_between_its_neighbours(self):
+        keys = [key_between()]
+        for _ in range(500):
+            i = random.randint(0, len(keys))
+            before = keys[i - 1] if i > 0 else None
+            after = keys[i] if i < len(keys) else None
+            keys.insert(i, key_between(before, after))
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(len(set(keys)), len(keys))
+
+    def test_key_between_rejects_misordered_neighbours(self):
+        with self.assertRaises(ValueError):
+            key_between('i1', 'i0')
+        with self.assertRaises(ValueError):
+            key_between('i0h', 'i0h')
+        for key in ('a0', 'i', 'i0h0', 'I0', '0' * 19):
+            with self.assertRaises(ValueError):
+                key_between(key)
+
+    def test_appended_and_prepended_keys_stay_short(self):
+        first = last = key_between()
+        appended, prepended = [first], [first]
+        for _ in range(5000):
+            last, first = key_between(last), key_between(None, first)
+            appended.append(last)
+            prepended.insert(0, first)
+        self.assertEqual(appended, sorted(appended))
+        self.assertEqual(prepended, sorted(prepended))
+        self.assertLessEqual(max(len(key) for key in appended + prepended), 4)
+
+    def test_evenly_spaced_keys_are_short_and_ordered(self):
+        keys = evenly_spaced(1000)
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(len(set(keys)), 1000)
+        self.assertTrue(all(len(key) <= 3 for key in keys))
+
+    def test_rebalance_returns_only_changed_items(self):
+        class Item(object):
+            def __init__(self, rank):
+                self.rank = rank
+
+        items = [Item(rank) for rank in evenly_spaced(3)]
+        self.assertEqual(rebalance(items), [])
+        items.append(Item('zzzzzzzzzzzzzzzzzzzz'))
+        self.assertEqual(rebalance(items), items[3:])
+
+
+class RankedModelTest(TestCase):
+    """This class defines the test suite for moving ranked columns and cards."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('test', email='testuser@test.com', password='test')
+        self.board = Board(title='Test Board', created_by=self.user)
+        self.board.save()
+        self.columns = [Column.objects.create(board=self.board, title=str(i), position=i) for i in range(3)]
+        self.cards = [
+            Card.objects.create(board=self.board, column=self.columns[0], title=str(i), description='.',
+                                created_by=self.user)
+            for i in range(3)
+        ]
+
+    def titles(self, queryset):
+        return list(queryset.order_by('rank', 'pk').values_list('title', flat=True))
+
+    def test_new_items_are_ranked_last(self):
+        self.assertEqual(self.titles(self.board.column_set.all()), ['0', '1', '2'])
+        self.assertEqual(self.titles(self.columns[0].card_set.all()), ['0', '1', '2'])
+
+    def test_moving_a_card_updates_one_row(self):
+        card = self.cards[2]
+        with self.assertNumQueries(2):
+            card.place(after=self.cards[0])
+            Card.objects.filter(pk=card.pk).update(rank=card.rank)
+        self.assertEqual(self.titles(self.columns[0].card_set.all()), ['0', '2', '1'])
+
+    def test_moving_between_tied_neighbours_rebalances_them(self):
+        Card.objects.filter(pk__in=[self.cards[0].pk, self.cards[1].pk]).update(rank='i0')
+        seen = BoardChange.objects.latest('id').pk
+        card = Card.objects.get(pk=self.cards[2].pk)
+        card.move(after=Card.objects.get(pk=self.cards[0].pk), before=Card.objects.get(pk=self.cards[1].pk))
+        self.assertEqual(self.titles(self.columns[0].card_set.all()), ['0', '2', '1'])
+        # The siblings given new ranks are logged too
+        self.assertEqual(
+            set(BoardChange.objects.filter(id__gt=seen).values_list('object_id', 'action')),
+            {(self.cards[1].pk, BoardChange.UPDATED), (card.pk, BoardChange.UPDATED)}
+        )
+
+    def test_a_card_given_another_column_goes_to_its_end(self):
+        Card.objects.create(board=self.board, column=self.columns[1], title='3', description='.', created_by=self.user)
+        card = Card.objects.get(pk=self.cards[0].pk)
+        card.column = self.columns[1]
+        card.save()
+        self.assertEqual(self.titles(self.columns[1].card_set.all()), ['3', '0'])
+        # Unless it is given a rank there too
+        card.move(column=self.columns[0], before=Card.objects.get(pk=self.cards[1].pk))
+        self.assertEqual(self.titles(self.columns[0].card_set.all()), ['0', '1', '2'])
+
+    def test_moving_a_card_to_another_column(self):
+        self.cards[0].move(column=self.columns[1])
+        self.assertEqual(self.titles(self.columns[1].card_set.all()), ['0'])
+        self.assertEqual(self.titles(self.columns[0].card_set.all()), ['1', '2'])
+
+    def test_rebalance_ranks_command_shortens_long_keys(self):
+        rank = self.cards[0].rank
+        for _ in range(30):
+            rank = key_between(rank, self.cards[1].rank)
+        Card.objects.filter(pk=self.cards[0].pk).update(rank=rank)
+        call_command('rebalance_ranks', max_length=4, stdout=StringIO())
+        ranks = list(self.columns[0].card_set.order_by('rank').values_list('title', 'rank'))
+        self.assertEqual([title for title, _ in ranks], ['0', '1', '2'])
+        self.assertTrue(all(len(rank) == 2 for _, rank in ranks))
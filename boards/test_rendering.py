@@ -0,0 +1,68 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from . import rendering
+from .models import Board, Column, Card, Comment
+
+
+class RenderingTest(TestCase):
+    """This class defines the test suite for the stored Markdown rendering."""
+
+    def setUp(self):
+        rendering.render_cached.cache_clear()
+        self.user = get_user_model().objects.create_user('test', email='testuser@test.com', password='test')
+        self.board = Board(title='Test Board', created_by=self.user)
+        self.board.save()
+        self.column = Column.objects.create(board=self.board, title='Backlog', position=1)
+        self.card = Card.objects.create(board=self.board, column=self.column, title='Test Card',
+                                        description='Some *emphasis*.', created_by=self.user)
+
+    def test_render_escapes_html_and_unsafe_links(self):
+        html = rendering.render('<script>alert(1)</script> [a](javascript:alert(1)) [b](https://example.com)')
+        self.assertNotIn('<script>', html)
+        self.assertIn('&lt;script&gt;', html)
+        self.assertIn('<a href="">a</a>', html)
+        self.assertIn('<a href="https://example.com">b</a>', html)
+
+    def test_render_drops_links_with_encoded_schemes(self):
+        for scheme in ('javascript&colon;', 'javascript&#58;', 'javascript&#x3A;', 'javascript&amp;colon;',
+                       'java&#x09;script:'):
+            html = rendering.render('[a]({0}alert(1)) ![b]({0}alert(1))'.format(scheme))
+            self.assertIn('<a href="">a</a>', html)
+            self.assertIn('src=""', html)
+        html = rendering.render('[a](https://example.com/?a=1&amp;b=2)')
+        self.assertIn('href="https://example.com/?a=1&amp;b=2"', html)
+
+    def test_html_is_stored_on_save_and_only_rendered_again_on_change(self):
+        self.assertEqual(self.card.description_html, '<p>Some <em>emphasis</em>.</p>')
+        with mock.patch.object(rendering, 'render', wraps=rendering.render) as render:
+            self.card.title = 'Renamed Card'
+            self.card.save()
+            self.assertEqual(render.call_count, 0)
+            self.card.description = 'Some **strong** words.'
+            self.card.save(update_fields=['description'])
+            self.assertEqual(render.call_count, 1)
+        self.card.refresh_from_db()
+        self.assertEqual(self.card.description_html, '<p>Some <strong>strong</strong> words.</p>')
+
+    def test_stored_html_is_served_without_rendering(self):
+        comment = Comment.objects.create(card=self.card, message='Hello *world*', created_by=self.user)
+        comment = Comment.objects.get(pk=comment.pk)
+        with mock.patch.object(rendering, 'render') as render:
+            self.assertEqual(comment.get_message_as_markdown(), '<p>Hello <em>world</em></p>')
+            self.assertFalse(render.called)
+
+    def test_rerender_markdown_command_renders_stale_rows_after_a_version_bump(self):
+        Comment.objects.create(card=self.card, message='Hello *world*', created_by=self.user)
+        out = StringIO()
+        call_command('rerender_markdown', stdout=out)
+        self.assertIn('Rendered 0 cards and 0 comments', out.getvalue())
+        with mock.patch.object(rendering, 'RENDERER_VERSION', rendering.RENDERER_VERSION + 1):
+            call_command('rerender_markdown', batch_size=1, stdout=out)
+            self.assertIn('Rendered 1 cards and 1 comments', out.getvalue())
+            self.card.refresh_from_db()
+            self.assertEqual(self.card.description_hash, rendering.content_hash(self.card.description))
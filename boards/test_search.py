@@ -0,0 +1,50 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from .models import Board, Column, Card, Comment
+from .search import SearchResults, matching_cards
+
+
+class SearchTest(TestCase):
+    """This class defines the test suite for the full-text search of cards and comments."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('test', email='testuser@test.com', password='test')
+        self.board = Board.objects.create(title='Test Board', created_by=self.user)
+        self.other = Board.objects.create(title='Other Board', created_by=self.user)
+        column = Column.objects.create(board=self.board, title='Backlog', position=1)
+        self.title = Card.objects.create(board=self.board, column=column, title='Login bug',
+                                         description='Fails with an error.', created_by=self.user)
+        self.description = Card.objects.create(board=self.board, column=column, title='Password reset',
+                                               description='Related to the login bug.', created_by=self.user)
+        self.comment = Comment.objects.create(card=self.description, message='Found another bug at login.',
+                                              created_by=self.user)
+        self.elsewhere = Card.objects.create(board=self.other, title='Bug triage', description='Weekly.',
+                                             created_by=self.user)
+
+    def hits(self, query, board_pks=None):
+        return [(hit['type'], hit['object'].pk) for hit in SearchResults(query, board_pks)[0:10]]
+
+    def test_search_ranks_cards_and_comments_matching_every_word(self):
+        hits = self.hits('login bug', [self.board.pk])
+        # A match in the title outranks one in the description
+        self.assertEqual(hits[0], ('card', self.title.pk))
+        self.assertLess(hits.index(('card', self.title.pk)), hits.index(('card', self.description.pk)))
+        self.assertEqual(sorted(hits[1:]), [('card', self.description.pk), ('comment', self.comment.pk)])
+        self.assertEqual(SearchResults('bug').count(), 4)
+        self.assertEqual(SearchResults('bug')[1:3], SearchResults('bug')[0:3][1:])
+
+    def test_index_follows_updates_deletes_and_bulk_inserts(self):
+        self.title.title = 'Sign-in problem'
+        self.title.save()
+        self.comment.delete()
+        Card.objects.bulk_create([Card(board=self.board, title='Another login issue', description='', rank='z',
+                                       created_by=self.user)])
+        self.assertEqual([title for title in Card.objects.filter(pk__in=matching_cards('login')).values_list(
+            'title', flat=True).order_by('title')], ['Another login issue', 'Password reset'])
+        self.assertEqual(self.hits('problem'), [('card', self.title.pk)])
+
+    def test_search_ignores_query_syntax(self):
+        self.assertEqual(self.hits('"bug" AND NEAR( OR'), self.hits('bug AND NEAR OR'))
+        self.assertEqual(SearchResults('  ').count(), 0)
+        self.assertEqual(SearchResults('-').count(), 0)
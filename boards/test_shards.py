@@ -0,0 +1,164 @@
+import json
+import unittest
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import router
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from . import shards
+from .models import Board, BoardChange, BoardShard, Column, Label, Card, Comment
+
+
+@override_settings(BOARD_SHARDS=['default', 'shard'])
+class ShardRoutingTest(SimpleTestCase):
+    """This class defines the test suite for routing board data to its shard."""
+
+    def setUp(self):
+        cache.clear()
+        cache.set(shards.SHARD_KEY.format(board_pk=1), 'shard')
+        cache.set(shards.SHARD_KEY.format(board_pk=2), 'default')
+
+    def test_instances_go_to_the_shard_of_their_board(self):
+        self.assertEqual(router.db_for_write(Board, instance=Board(pk=1)), 'shard')
+        self.assertEqual(router.db_for_read(Card, instance=Card(board_id=1)), 'shard')
+        self.assertEqual(router.db_for_read(Comment, instance=Comment(card=Card(board_id=1))), 'shard')
+        self.assertEqual(router.db_for_write(Column, instance=Column(board_id=2)), 'default')
+
+    def test_other_queries_go_to_the_current_shard(self):
+        self.assertEqual(router.db_for_read(Card), 'default')
+        with shards.for_board(1):
+            self.assertEqual(router.db_for_read(Card), 'shard')
+            self.assertEqual(router.db_for_write(Label), 'shard')
+            # Users live in 'default', their copies are only read joined with board data
+            self.assertEqual(router.db_for_read(get_user_model()), 'default')
+            self.assertEqual(router.db_for_read(get_user_model(), instance=Card(board_id=1)), 'shard')
+        self.assertEqual(router.db_for_read(Card), 'default')
+
+    def test_the_directory_is_only_migrated_in_default(self):
+        self.assertFalse(router.allow_migrate('shard', 'boards', model_name='boardshard'))
+        self.assertTrue(router.allow_migrate('default', 'boards', model_name='boardshard'))
+        self.assertTrue(router.allow_migrate('shard', 'boards', model_name='card'))
+
+    def test_middleware_makes_the_board_current_and_holds_off_writes_while_it_moves(self):
+        seen = []
+
+        def view(request):
+            seen.append(router.db_for_read(Card))
+            return HttpResponse()
+
+        middleware = shards.ShardMiddleware(lambda request: middleware.process_view(request, view, (), {'board_pk': 1})
+                                            or view(request))
+        factory = RequestFactory()
+        self.assertEqual(middleware(factory.post('/')).status_code, 200)
+        cache.set(shards.FROZEN_KEY.format(board_pk=1), True)
+        self.assertEqual(middleware(factory.get('/')).status_code, 200)
+        response = middleware(factory.post('/'))
+        self.assertEqual((response.status_code, response['Retry-After']), (503, '5'))
+        self.assertEqual(seen, ['shard', 'shard'])
+        self.assertIsNone(shards.current())
+
+    def test_fan_out_merges_the_shards_in_order(self):
+        rows = {
+            'default': [SimpleNamespace(id=i, title=str(i)) for i in (9, 6, 2)],
+            'shard': [SimpleNamespace(id=i, title=str(i)) for i in (8, 7, 5, 1)],
+        }
+        queryset = mock.Mock(model=Board)
+        queryset.query.order_by = ['-id']
+        queryset.using.side_effect = rows.get
+        fanned = shards.FanOut(queryset, ['default', 'shard'])
+        self.assertEqual([row.id for row in fanned[1:4]], [8, 7, 6])
+        self.assertEqual([row.id for row in fanned], [9, 8, 7, 6, 5, 2, 1])
+
+    @override_settings(BOARD_SHARDS=['default'])
+    def test_nothing_is_routed_without_shards(self):
+        with shards.use('shard'):
+            self.assertEqual(router.db_for_read(Card, instance=Card(board_id=1)), 'default')
+        queryset = Board.objects.all()
+        self.assertIs(shards.fan_out(queryset), queryset)
+
+
+@unittest.skipUnless(len(settings.BOARD_SHARDS) > 1, 'Needs a second database in BOARD_SHARDS.')
+class ShardedBoardTest(TestCase):
+    """This class defines the test suite for boards spread over several databases."""
+
+    databases = '__all__'
+
+    def setUp(self):
+        cache.clear()
+        self.source, self.target = settings.BOARD_SHARDS[:2]
+        self.user = get_user_model().objects.create_user('test', email='testuser@test.com', password='test')
+        with shards.use(self.source):
+            self.board = Board.objects.create(title='Test Board', created_by=self.user)
+        with shards.use(self.target):
+            self.other = Board.objects.create(title='Other Board', created_by=self.user)
+        with shards.for_board(self.board.pk):
+            self.column = Column.objects.create(board=self.board, title='Backlog', position=1)
+            self.label = Label.objects.create(board=self.board, title='Bug')
+            self.card = Card.objects.create(board=self.board, column=self.column, title='Login bug',
+                                            created_by=self.user)
+            self.card.labels.add(self.label)
+            self.card.assignees.add(self.user)
+            Comment.objects.create(card=self.card, message='Confirmed.', created_by=self.user)
+        with shards.for_board(self.other.pk):
+            Card.objects.create(board=self.other, title='Other bug', created_by=self.user)
+
+    def test_boards_are_written_to_their_shard(self):
+        self.assertEqual(BoardShard.objects.get(pk=self.board.pk).alias, self.source)
+        self.assertEqual(Card.objects.using(self.source).get().title, 'Login bug')
+        self.assertEqual(Card.objects.using(self.target).get().title, 'Other bug')
+        self.assertTrue(BoardChange.objects.using(self.target).filter(board_id=self.other.pk).exists())
+        with shards.for_board(self.board.pk):
+            card = Card.objects.with_related_pks().get(pk=self.card.pk)
+        self.assertEqual([user.pk for user in card.assignees.all()], [self.user.pk])
+
+    def test_board_list_fans_out(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get('/api/v1/boards/')
+        self.assertEqual([board['id'] for board in response.data['results']], sorted([self.board.pk, self.other.pk]))
+        response = client.get('/api/v1/boards/?stream=true&tree=true')
+        self.assertEqual([len(board['column_set']) for board in json.loads(b''.join(response.streaming_content))],
+                         [1, 0] if self.board.pk < self.other.pk else [0, 1])
+        response = client.get('/api/v1/boards/{0}/cards/'.format(self.other.pk))
+        self.assertEqual([card['title'] for card in response.data], ['Other bug'])
+
+    def test_move_board_copies_it_and_its_later_changes(self):
+        since = BoardChange.objects.using(self.source).order_by('id').last().pk
+
+        def write_during_the_grace_period(seconds):
+            with shards.for_board(self.board.pk):
+                Card.objects.filter(pk=self.card.pk).get().delete()
+                Card.objects.create(board=self.board, column=self.column, title='Late card', created_by=self.user)
+
+        with mock.patch.object(shards.time, 'sleep', write_during_the_grace_period):
+            self.assertEqual(shards.move_board(self.board.pk, self.target, grace=0), self.source)
+
+        self.assertEqual(shards.shard_for(self.board.pk), self.target)
+        self.assertFalse(Board.objects.using(self.source).filter(pk=self.board.pk).exists())
+        self.assertFalse(Card.objects.using(self.source).exists())
+        with shards.for_board(self.board.pk):
+            board = Board.objects.get(pk=self.board.pk)
+            self.assertEqual(board._state.db, self.target)
+            self.assertEqual(list(Card.objects.filter(board=board).values_list('title', flat=True)), ['Late card'])
+            self.assertEqual((board.column_count, board.card_count, board.comment_count), (1, 1, 0))
+            self.assertEqual(list(Label.objects.filter(board=board).values_list('title', flat=True)), ['Bug'])
+            self.assertGreater(BoardChange.objects.filter(board=board).order_by('id').last().pk, since)
+
+    def test_rebalance_ranks_covers_every_shard(self):
+        Card.objects.using(self.target).update(rank='i0' + 'h' * 20)
+        call_command('rebalance_ranks', max_length=4, stdout=StringIO())
+        self.assertEqual(list(Card.objects.using(self.target).values_list('rank', flat=True)), ['i0'])
+
+    def test_a_board_cannot_be_moved_where_it_is(self):
+        with self.assertRaises(shards.ShardError):
+            shards.move_board(self.board.pk, self.source)
+        with self.assertRaises(shards.ShardError):
+            shards.move_board(self.board.pk, 'nowhere')
@@ -0,0 +1,46 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from .models import Board, Column, Label, Card, Comment
+from .serializers import BoardSerializer
+from .tree import board_tree
+
+
+class BoardTreeTest(TestCase):
+    """This class defines the test suite for the values_list() serialization of board trees."""
+
+    def setUp(self):
+        User = get_user_model()
+        self.users = [
+            User.objects.create_user('user{0}'.format(i), email='user{0}@test.com'.format(i), password='test')
+            for i in range(3)
+        ]
+        self.board = Board(title='Test Board', created_by=self.users[0])
+        self.board.save()
+        labels = [Label.objects.create(board=self.board, title='Label {0}'.format(i)) for i in range(3)]
+        columns = [Column.objects.create(board=self.board, title='Column {0}'.format(i), position=i) for i in range(3)]
+        columns[2].move(before=columns[0])
+        for i in range(6):
+            card = Card.objects.create(board=self.board, column=columns[i % 2], title='Card {0}'.format(i),
+                                       description='*Card* {0}.'.format(i), created_by=self.users[i % 3])
+            card.labels.set(labels[::-1][:i % 4])
+            card.assignees.set(self.users[::-1][:i % 3])
+            for j in range(i % 3):
+                Comment.objects.create(card=card, message='Comment {0}.'.format(j), created_by=self.users[j],
+                                       updated_at=timezone.now() if j else None, updated_by=self.users[j])
+        Card.objects.create(board=self.board, column=None, title='Loose Card', description='',
+                            created_by=self.users[0])
+
+        other = Board.objects.create(title='Other Board', created_by=self.users[1])
+        Column.objects.create(board=other, title='Other Column', position=1)
+
+    def test_board_tree_renders_exactly_like_the_serializers(self):
+        expected = JSONRenderer().render(BoardSerializer(Board.objects.with_tree().get(pk=self.board.pk)).data)
+        with self.assertNumQueries(6):
+            tree = board_tree(self.board.pk)
+        self.assertEqual(JSONRenderer().render(tree), expected)
+
+    def test_board_tree_of_a_missing_board_is_none(self):
+        self.assertIsNone(board_tree(self.board.pk + 100))
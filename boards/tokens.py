@@ -0,0 +1,126 @@
+"""
+Cache of the users API tokens authenticate, for api.authentication.CachedTokenAuthentication.
+
+A token is looked up in a bounded, in-process LRU first, then in the shared cache, and only then
+in the database. Entries expire after TOKEN_CACHE_TIMEOUT seconds in the shared cache and after
+TOKEN_CACHE_LOCAL_TIMEOUT seconds in the LRU of each process.
+
+boards.signals drops the entry of a token when it is deleted or regenerated and when its user is
+saved, e.g. deactivated. That reaches the shared cache and the LRU of the process making the
+change; the LRUs of other processes keep a revoked token for at most TOKEN_CACHE_LOCAL_TIMEOUT.
+
+Keys are stored hashed, so the cache never holds usable credentials.
+"""
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+TOKEN_KEY = 'token:{digest}'
+
+_lock = threading.Lock()
+_local = OrderedDict()
+
+_stats = {
+    'local_hits': 0,
+    'shared_hits': 0,
+    'misses': 0,
+    'invalidations': 0,
+}
+
+
+def _size():
+    return getattr(settings, 'TOKEN_CACHE_SIZE', 10000)
+
+
+def _timeout():
+    return getattr(settings, 'TOKEN_CACHE_TIMEOUT', 5 * 60)
+
+
+def _local_timeout():
+    return getattr(settings, 'TOKEN_CACHE_LOCAL_TIMEOUT', 30)
+
+
+def _record(name):
+    with _lock:
+        _stats[name] += 1
+
+
+def stats():
+    """Return a copy of this process's hit, miss and invalidation counters, and the hit rate."""
+    with _lock:
+        counts = dict(_stats)
+        counts['local_size'] = len(_local)
+    lookups = counts['local_hits'] + counts['shared_hits'] + counts['misses']
+    counts['hit_rate'] = (counts['local_hits'] + counts['shared_hits']) / lookups if lookups else 0.0
+    return counts
+
+
+def reset_stats():
+    with _lock:
+        for name in _stats:
+            _stats[name] = 0
+
+
+def digest(key):
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def get(key):
+    """Return the user token `key` authenticates, or None if it is not cached."""
+    name = digest(key)
+    now = time.monotonic()
+    with _lock:
+        entry = _local.get(name)
+        if entry is not None:
+            if entry[1] > now:
+                _local.move_to_end(name)
+                _stats['local_hits'] += 1
+                # A copy, as requests may set attributes on their user
+                return copy.copy(entry[0])
+            del _local[name]
+
+    user = cache.get(TOKEN_KEY.format(digest=name))
+    if user is None:
+        _record('misses')
+        return None
+    _record('shared_hits')
+    _keep(name, user)
+    return user
+
+
+def store(key, user):
+    """Cache the user token `key` authenticates."""
+    name = digest(key)
+    cache.set(TOKEN_KEY.format(digest=name), user, _timeout())
+    _keep(name, user)
+
+
+def _keep(name, user):
+    # A copy, as the caller goes on to use user for a request
+    user = copy.copy(user)
+    with _lock:
+        _local[name] = (user, time.monotonic() + _local_timeout())
+        _local.move_to_end(name)
+        while len(_local) > _size():
+            _local.popitem(last=False)
+
+
+def invalidate(*keys):
+    """Forget the users of the tokens `keys`, here and in the shared cache."""
+    names = [digest(key) for key in keys]
+    with _lock:
+        for name in names:
+            _local.pop(name, None)
+        _stats['invalidations'] += len(names)
+    cache.delete_many([TOKEN_KEY.format(digest=name) for name in names])
+
+
+def clear():
+    """Empty this process's LRU, e.g. between tests."""
+    with _lock:
+        _local.clear()
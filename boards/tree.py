@@ -0,0 +1,88 @@
+"""
+Fast, read-only serialization of a whole board tree.
+
+board_tree() returns the same data as BoardSerializer(Board.objects.with_tree().get(pk=pk)).data,
+down to the order of keys and items, so both render to identical JSON. Instead of model
+instances and serializer fields per attribute, it reads flat values_list() rows of the columns,
+cards, assignee and label links and comments of the board, one query each, and assembles the
+nested dicts in a single pass over them using dicts keyed by primary key.
+
+The keys come from the Meta.fields of the serializers, so the two stay in step. Fields that need
+more than their column value (only DateTimeFields so far) are converted by the DRF field itself.
+"""
+from django.db import models
+from rest_framework import fields as drf_fields
+
+from .models import Board, Column, Card, Comment
+from .serializers import (
+    BoardSerializer, ColumnSerializer, CardListSerializer, CommentSerializer, LabelSerializer, UserSerializer
+)
+
+NESTED = ('column_set', 'card_set', 'assignees', 'labels', 'comment_set')
+
+
+def reader(model, serializer_class, prefix=''):
+    """
+    Return the values_list() lookups of the flat fields serializer_class renders for model, and
+    a function turning such a row (or its tail from `start`) into the serializer's dict.
+    """
+    names = serializer_class.Meta.fields
+    flat = [name for name in names if name not in NESTED]
+    converters = {}
+    for i, name in enumerate(flat):
+        if isinstance(model._meta.get_field(name), models.DateTimeField):
+            converters[i] = drf_fields.DateTimeField().to_representation
+
+    def read(row, start=0):
+        obj = dict.fromkeys(names)
+        obj.update(zip(flat, row[start:]))
+        for i, convert in converters.items():
+            value = row[start + i]
+            obj[flat[i]] = None if value is None else convert(value)
+        return obj
+
+    return [prefix + name for name in flat], read
+
+
+def board_tree(board_pk):
+    """Return the representation of board board_pk BoardSerializer gives, or None if there is none."""
+    board_lookups, read_board = reader(Board, BoardSerializer)
+    row = Board.objects.filter(pk=board_pk).values_list(*board_lookups).first()
+    if row is None:
+        return None
+    board = read_board(row)
+
+    column_lookups, read_column = reader(Column, ColumnSerializer)
+    columns = {}
+    board['column_set'] = []
+    for row in Column.objects.filter(board_id=board_pk).order_by('rank', 'pk').values_list(*column_lookups):
+        column = read_column(row)
+        column['card_set'] = []
+        board['column_set'].append(column)
+        columns[column['id']] = column
+
+    card_lookups, read_card = reader(Card, CardListSerializer)
+    cards = {}
+    for row in Card.objects.filter(column__board_id=board_pk).order_by('rank', 'pk').values_list(*card_lookups):
+        card = read_card(row)
+        card['assignees'], card['labels'], card['comment_set'] = [], [], []
+        columns[card['column']]['card_set'].append(card)
+        cards[card['id']] = card
+
+    user_lookups, read_user = reader(Card.assignees.field.related_model, UserSerializer, prefix='user__')
+    links = Card.assignees.through.objects.filter(card__column__board_id=board_pk).order_by('user_id', 'card_id')
+    for row in links.values_list('card_id', *user_lookups):
+        cards[row[0]]['assignees'].append(read_user(row, 1))
+
+    label_lookups, read_label = reader(Card.labels.field.related_model, LabelSerializer, prefix='label__')
+    links = Card.labels.through.objects.filter(card__column__board_id=board_pk).order_by('label_id', 'card_id')
+    for row in links.values_list('card_id', *label_lookups):
+        cards[row[0]]['labels'].append(read_label(row, 1))
+
+    comment_lookups, read_comment = reader(Comment, CommentSerializer)
+    comments = Comment.objects.filter(card__column__board_id=board_pk).order_by('created_at', 'pk')
+    for row in comments.values_list(*comment_lookups):
+        comment = read_comment(row)
+        cards[comment['card']]['comment_set'].append(comment)
+
+    return board
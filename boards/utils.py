@@ -0,0 +1,48 @@
+from django.db import router, transaction
+
+
+def bulk_create_with_pks(model, objs, batch_size=None):
+    """
+    bulk_create() objs and make sure each of them has its primary key set afterwards.
+
+    Backends that return ids from a multi-row INSERT (PostgreSQL) get them for free. On the others
+    (SQLite) the inserts hold the database's write lock until the surrounding transaction ends,
+    so the newly created rows are the last len(objs) ids of the table and one more query fetches
+    them.
+    """
+    objs = list(objs)
+    if not objs:
+        return objs
+    using = router.db_for_write(model, instance=objs[0])
+    with transaction.atomic(using=using):
+        model.objects.using(using).bulk_create(objs, batch_size=batch_size)
+        if objs[0].pk is None:
+            pks = model.objects.using(using).order_by('-pk').values_list('pk', flat=True)[:len(objs)]
+            for obj, pk in zip(objs, reversed(list(pks))):
+                obj.pk = pk
+    return objs
+
+
+def iterate_in_chunks(queryset, size):
+    """
+    Yield the objects of queryset in order, as lists of at most `size` objects with their
+    prefetches done, so that only one list of objects is held in memory at a time.
+    """
+    if hasattr(queryset, 'iterate_in_chunks'):
+        # A boards.shards.FanOut, merging the chunks of every shard
+        yield from queryset.iterate_in_chunks(size)
+        return
+    pks = queryset.prefetch_related(None).values_list('pk', flat=True).iterator(chunk_size=size)
+    chunk = []
+    for pk in pks:
+        chunk.append(pk)
+        if len(chunk) == size:
+            yield _fetch(queryset, chunk)
+            chunk = []
+    if chunk:
+        yield _fetch(queryset, chunk)
+
+
+def _fetch(queryset, pks):
+    objs = {obj.pk: obj for obj in queryset.filter(pk__in=pks)}
+    return [objs[pk] for pk in pks if pk in objs]
@@ -0,0 +1,27 @@
+"""
+ASGI config for floboard project.
+
+It exposes the ASGI callable as a module-level variable named ``application``. Board event
+streams are served by api.streaming directly, everything else by Django.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "floboard.settings")
+
+django_application = get_asgi_application()
+
+from api.streaming import EVENTS_PATH, board_events  # noqa: E402 (needs the app registry)
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http':
+        match = EVENTS_PATH.match(scope['path'])
+        if match:
+            return await board_events(scope, receive, send, **match.groupdict())
+    return await django_application(scope, receive, send)
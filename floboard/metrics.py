@@ -0,0 +1,382 @@
+"""
+Per-endpoint metrics of the API, exposed at /metrics in the Prometheus text exposition format.
+
+MetricsMiddleware records every request to a view of the API by URL name (api:board_detail,
+api:card_list, ...) and method: a histogram of its latency and of the SQL queries it ran, the
+time those queries and its serializers took, the size of its response and its status. Requests
+only update this process's totals in memory, under a lock.
+
+Serializer time is the time spent in the to_representation() of serializers with
+TimedSerializerMixin, or within serializing(), counted once however deeply they nest. Streamed
+response bodies are produced after the middleware returns: their size is added when they end,
+the time and queries they take are not counted.
+
+A single process serves /metrics from its own totals. With METRICS_DIRECTORY set, every process
+also writes its totals to a file of its own there, at most every METRICS_FLUSH_SECONDS and when
+it exits, and /metrics adds up the files of all of them, so the totals of a process are at most
+that old. The files of processes that have exited are added to a single EXITED file and removed,
+under a lock, so their totals keep counting without the directory growing with every worker. Its
+processes are told apart by pid, so the directory must not be shared between hosts.
+
+/metrics is for staff, or for bearers of METRICS_TOKEN if set.
+"""
+import atexit
+import contextlib
+import contextvars
+import copy
+import fcntl
+import glob
+import json
+import os
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+# URL namespaces whose requests are recorded
+NAMESPACES = ('api', )
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# In METRICS_DIRECTORY: the totals of the processes that have exited, and the lock of that file
+EXITED = 'metrics-exited.json'
+LOCK = 'metrics.lock'
+PROCESS_FILE = re.compile(r'^metrics-(\d+)\.json$')
+
+_lock = threading.Lock()
+# View -> method -> totals, see _empty()
+_totals = {}
+_next_flush = 0.0
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+def _buckets():
+    return tuple(getattr(settings, 'METRICS_BUCKETS', (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)))
+
+
+def _query_buckets():
+    return tuple(getattr(settings, 'METRICS_QUERY_BUCKETS', (0, 1, 2, 5, 10, 20, 50, 100)))
+
+
+def _directory():
+    return getattr(settings, 'METRICS_DIRECTORY', None)
+
+
+def _flush_seconds():
+    return getattr(settings, 'METRICS_FLUSH_SECONDS', 10)
+
+
+def _token():
+    return getattr(settings, 'METRICS_TOKEN', None)
+
+
+class Measurement(object):
+    """What a request took so far, besides its latency."""
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.serializing = False
+
+    def __call__(self, execute, sql, params, many, context):
+        # A connection execute_wrapper
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.query_seconds += time.perf_counter() - start
+            self.queries += 1
+
+
+@contextlib.contextmanager
+def serializing():
+    """Count the time spent in the block as serializer time of the current request."""
+    measurement = _current.get()
+    if measurement is None or measurement.serializing:
+        yield
+        return
+    measurement.serializing = True
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        measurement.serializing = False
+        measurement.serializer_seconds += time.perf_counter() - start
+
+
+class TimedSerializerMixin(object):
+    """Serializer mixin counting the time spent in to_representation() as serializer time."""
+
+    def to_representation(self, instance):
+        with serializing():
+            return super(TimedSerializerMixin, self).to_representation(instance)
+
+
+def _bucket(value, bounds):
+    """The index of the first of bounds value is at most, len(bounds) for none."""
+    for i, bound in enumerate(bounds):
+        if value <= bound:
+            return i
+    return len(bounds)
+
+
+def _empty():
+    return {
+        'duration': [0] * (len(_buckets()) + 1),
+        'duration_sum': 0.0,
+        'queries': [0] * (len(_query_buckets()) + 1),
+        'queries_sum': 0,
+        'query_seconds': 0.0,
+        'serializer_seconds': 0.0,
+        'response_bytes': 0,
+        'statuses': {},
+    }
+
+
+def record(view, method, status, seconds, measurement, size):
+    with _lock:
+        totals = _totals.setdefault(view, {}).get(method)
+        if totals is None:
+            totals = _totals[view][method] = _empty()
+        totals['duration'][_bucket(seconds, _buckets())] += 1
+        totals['duration_sum'] += seconds
+        totals['queries'][_bucket(measurement.queries, _query_buckets())] += 1
+        totals['queries_sum'] += measurement.queries
+        totals['query_seconds'] += measurement.query_seconds
+        totals['serializer_seconds'] += measurement.serializer_seconds
+        totals['response_bytes'] += size
+        status = str(status)
+        totals['statuses'][status] = totals['statuses'].get(status, 0) + 1
+
+
+def add_bytes(view, method, size):
+    with _lock:
+        totals = _totals.get(view, {}).get(method)
+        if totals is not None:
+            totals['response_bytes'] += size
+
+
+def snapshot():
+    """A copy of this process's totals."""
+    with _lock:
+        return {'buckets': _buckets(), 'query_buckets': _query_buckets(), 'views': copy.deepcopy(_totals)}
+
+
+def reset():
+    """Forget this process's totals, e.g. between tests."""
+    global _next_flush
+    with _lock:
+        _totals.clear()
+    _next_flush = 0.0
+
+
+def merge(snapshots):
+    """Add up snapshots, skipping those taken with other buckets."""
+    merged = {'buckets': _buckets(), 'query_buckets': _query_buckets(), 'views': {}}
+    for taken in snapshots:
+        if tuple(taken['buckets']) != merged['buckets'] or tuple(taken['query_buckets']) != merged['query_buckets']:
+            continue
+        for view, methods in taken['views'].items():
+            for method, totals in methods.items():
+                into = merged['views'].setdefault(view, {}).setdefault(method, _empty())
+                for name, value in totals.items():
+                    if name == 'statuses':
+                        for status, count in value.items():
+                            into['statuses'][status] = into['statuses'].get(status, 0) + count
+                    elif isinstance(value, list):
+                        into[name] = [a + b for a, b in zip(into[name], value)]
+                    else:
+                        into[name] += value
+    return merged
+
+
+def _path(directory):
+    return os.path.join(directory, 'metrics-{0}.json'.format(os.getpid()))
+
+
+def flush():
+    """Write this process's totals to METRICS_DIRECTORY, if set."""
+    global _next_flush
+    directory = _directory()
+    if not directory:
+        return
+    _next_flush = time.monotonic() + _flush_seconds()
+    path = _path(directory)
+    # Written aside and renamed, so readers never see half a file
+    with open(path + '.tmp', 'w') as out:
+        json.dump(snapshot(), out)
+    os.replace(path + '.tmp', path)
+
+
+def _flush_if_due():
+    if _directory() and time.monotonic() >= _next_flush:
+        flush()
+
+
+atexit.register(flush)
+
+
+def _load(path):
+    """The snapshot in path, or None if it is gone or from a process that died writing it."""
+    try:
+        with open(path) as lines:
+            return json.load(lines)
+    except (OSError, ValueError):
+        return None
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Someone else's
+        return True
+    return True
+
+
+def _fold_exited(directory):
+    """Add the files of processes that have exited to the EXITED file and remove them."""
+    with open(os.path.join(directory, LOCK), 'a') as lock:
+        # Held while reading and removing, so no file is added twice
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        exited = []
+        for name in os.listdir(directory):
+            match = PROCESS_FILE.match(name)
+            if match and not _alive(int(match.group(1))):
+                exited.append(os.path.join(directory, name))
+        if not exited:
+            return
+        into = os.path.join(directory, EXITED)
+        snapshots = [_load(path) for path in [into] + exited]
+        with open(into + '.tmp', 'w') as out:
+            json.dump(merge(taken for taken in snapshots if taken is not None), out)
+        os.replace(into + '.tmp', into)
+        for path in exited:
+            os.remove(path)
+
+
+def collect():
+    """The totals to expose: this process's, or those of every process writing to METRICS_DIRECTORY."""
+    directory = _directory()
+    if not directory:
+        return snapshot()
+    flush()
+    _fold_exited(directory)
+    snapshots = [_load(path) for path in glob.glob(os.path.join(directory, 'metrics-*.json'))]
+    return merge(taken for taken in snapshots if taken is not None)
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join('{0}="{1}"'.format(name, _label(value)) for name, value in labels.items()) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# Name, type, help
+METRICS = (
+    ('floboard_http_request_duration_seconds', 'histogram', 'Time taken to answer API requests.'),
+    ('floboard_http_request_queries', 'histogram', 'SQL queries run per API request.'),
+    ('floboard_http_request_query_seconds_total', 'counter', 'Time spent in the SQL queries of API requests.'),
+    ('floboard_http_request_serializer_seconds_total', 'counter', 'Time spent serializing API responses.'),
+    ('floboard_http_response_size_bytes_total', 'counter', 'Bytes of API response bodies.'),
+    ('floboard_http_requests_total', 'counter', 'API requests answered, by status.'),
+)
+
+
+def exposition(totals):
+    """totals, as returned by collect(), in the Prometheus text exposition format."""
+    series = [(view, method, values) for view, methods in sorted(totals['views'].items())
+              for method, values in sorted(methods.items())]
+    lines = []
+    for name, kind, description in METRICS:
+        lines.append('# HELP {0} {1}'.format(name, description))
+        lines.append('# TYPE {0} {1}'.format(name, kind))
+        for view, method, values in series:
+            if kind == 'histogram':
+                field, bounds = ('duration', totals['buckets']) if 'duration' in name else \
+                    ('queries', totals['query_buckets'])
+                cumulative = 0
+                for bound, count in zip(list(bounds) + ['+Inf'], values[field]):
+                    cumulative += count
+                    lines.append('{0}_bucket{1} {2}'.format(
+                        name, _labels(view=view, method=method, le=_number(bound)), cumulative
+                    ))
+                labels = _labels(view=view, method=method)
+                lines.append('{0}_sum{1} {2}'.format(name, labels, _number(values[field + '_sum'])))
+                lines.append('{0}_count{1} {2}'.format(name, labels, cumulative))
+            elif name == 'floboard_http_requests_total':
+                for status, count in sorted(values['statuses'].items()):
+                    lines.append('{0}{1} {2}'.format(name, _labels(view=view, method=method, status=status), count))
+            else:
+                field = {
+                    'floboard_http_request_query_seconds_total': 'query_seconds',
+                    'floboard_http_request_serializer_seconds_total': 'serializer_seconds',
+                    'floboard_http_response_size_bytes_total': 'response_bytes',
+                }[name]
+                lines.append('{0}{1} {2}'.format(name, _labels(view=view, method=method), _number(values[field])))
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """The metrics of the API, for Prometheus to scrape with METRICS_TOKEN, or for staff."""
+    token = _token()
+    bearer = token and constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), 'Bearer ' + token)
+    if not bearer and not request.user.is_staff:
+        return HttpResponseForbidden()
+    return HttpResponse(exposition(collect()), content_type=CONTENT_TYPE)
+
+
+def _counted(iterable, view, method):
+    """Add the size of a streamed body to the totals once it has been sent."""
+    size = 0
+    try:
+        for chunk in iterable:
+            size += len(chunk)
+            yield chunk
+    finally:
+        add_bytes(view, method, size)
+
+
+class MetricsMiddleware(object):
+    """Record the latency, queries, serializer time, response size and status of API requests."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        measurement = Measurement()
+        token = _current.set(measurement)
+        start = time.perf_counter()
+        try:
+            with contextlib.ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(measurement))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        seconds = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        if match is None or match.namespace not in NAMESPACES:
+            return response
+        view, method = match.view_name, request.method
+        size = 0 if response.streaming else len(response.content)
+        record(view, method, response.status_code, seconds, measurement, size)
+        if response.streaming:
+            response.streaming_content = _counted(response.streaming_content, view, method)
+        _flush_if_due()
+        return response
@@ -0,0 +1,178 @@
+"""
+Routing of reads to read replicas of the database.
+
+ReplicaMiddleware lets the reads of safe (GET, HEAD, OPTIONS) requests to the API go to one of
+the DATABASE_REPLICAS aliases, picked once per request. ReplicaRouter sends every other read,
+every read inside a transaction or after a write of the same request, and every write to the
+primary, 'default'.
+
+A client that wrote reads from the primary for the next REPLICA_PIN_SECONDS, so it sees its own
+writes despite replication lag. Clients are told apart by their Authorization header or session
+cookie, pinned in the shared cache.
+
+Whatever is cached for every client, such as board snapshots, is built inside primary(): built
+from a lagging replica right after a write, it would be cached under the new version of the data
+and served, stale, to everyone until the next write. For the same reason the views answering
+with an ETag of a board's version read from the primary too.
+
+A replica that cannot be connected to is skipped by this process for REPLICA_RETRY_SECONDS;
+with none left reads go to the primary. A replica failing in the middle of a request is not
+retried. Streamed response bodies are read after the middleware returns, from the primary.
+
+To try it locally, add a second SQLite alias to DATABASES (a copy of the first file) and list it
+in DATABASE_REPLICAS.
+"""
+import contextlib
+import contextvars
+import hashlib
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+PIN_KEY = 'replica:pin:{digest}'
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# URL namespaces whose safe requests may read from replicas
+NAMESPACES = ('api', )
+
+_lock = threading.Lock()
+# Alias -> time.monotonic() until which it is skipped
+_down = {}
+
+_reads = contextvars.ContextVar('replica_reads', default=None)
+
+
+def _replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def _pin_seconds():
+    return getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+
+
+def _retry_seconds():
+    return getattr(settings, 'REPLICA_RETRY_SECONDS', 30)
+
+
+def available(alias):
+    """Whether replica alias can be connected to, trying again at most every REPLICA_RETRY_SECONDS."""
+    with _lock:
+        if _down.get(alias, 0) > time.monotonic():
+            return False
+    try:
+        connections[alias].ensure_connection()
+    except DatabaseError:
+        with _lock:
+            _down[alias] = time.monotonic() + _retry_seconds()
+        return False
+    with _lock:
+        _down.pop(alias, None)
+    return True
+
+
+def choose_replica():
+    """One of the available replicas at random, or None."""
+    aliases = [alias for alias in _replicas() if available(alias)]
+    return random.choice(aliases) if aliases else None
+
+
+def pin_key(request):
+    """Cache key of the client of request, or None for a client that cannot be told apart."""
+    credentials = request.META.get('HTTP_AUTHORIZATION') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not credentials:
+        return None
+    return PIN_KEY.format(digest=hashlib.sha256(credentials.encode('utf-8')).hexdigest())
+
+
+class Reads(object):
+    """Where the reads of the current request go."""
+
+    def __init__(self):
+        self.replicas = False
+        self.wrote = False
+        self.replica = None
+        self.chosen = False
+
+    def alias(self):
+        if not self.replicas or self.wrote:
+            return None
+        if not self.chosen:
+            self.replica, self.chosen = choose_replica(), True
+        return self.replica
+
+
+@contextlib.contextmanager
+def primary():
+    """Read from the primary within the block, whatever the request is allowed."""
+    token = _reads.set(None)
+    try:
+        yield
+    finally:
+        _reads.reset(token)
+
+
+class ReplicaRouter(object):
+    """Reads from the replica ReplicaMiddleware allows, writes and everything else to the primary."""
+
+    def db_for_read(self, model, **hints):
+        reads = _reads.get()
+        if reads is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return reads.alias()
+
+    def db_for_write(self, model, **hints):
+        reads = _reads.get()
+        if reads is not None:
+            reads.wrote = True
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db not in (None, DEFAULT_DB_ALIAS, *_replicas()):
+            # An object of another database altogether, such as a board shard
+            return None
+        # Explicitly, or objects read from a replica would be saved there
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *_replicas()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas follow the primary's schema
+        if db in _replicas():
+            return False
+        return None
+
+
+class ReplicaMiddleware(object):
+    """Allow the safe requests of unpinned clients to read from replicas, and pin clients that wrote."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        reads = Reads()
+        token = _reads.set(reads)
+        try:
+            response = self.get_response(request)
+        finally:
+            _reads.reset(token)
+        key = pin_key(request)
+        if reads.wrote and key is not None:
+            cache.set(key, True, _pin_seconds())
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        reads = _reads.get()
+        if reads is None or request.method not in SAFE_METHODS or not _replicas():
+            return None
+        if request.resolver_match.namespace not in NAMESPACES:
+            return None
+        key = pin_key(request)
+        reads.replicas = key is None or not cache.get(key)
+        return None
@@ -41,12 +41,15 @@ INSTALLED_APPS = [
     'rest_framework',
     'rest_framework.authtoken',
     # Internal Apps
-    'boards',
+    'boards.apps.BoardConfig',
     'projects',
 ]
 
 MIDDLEWARE = [
+    'floboard.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'floboard.replicas.ReplicaMiddleware',
+    'boards.shards.ShardMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -77,6 +80,8 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'floboard.wsgi.application'
 
+ASGI_APPLICATION = 'floboard.asgi.application'
+
 # Database
 # https://docs.djangoproject.com/en/2.0/ref/settings/#databases
 
@@ -90,6 +95,46 @@ DATABASES = {
     }
 }
 
+# Read replicas, see floboard.replicas: POSTGRES_REPLICA_HOSTS lists the hosts of streaming replicas
+# of the primary, comma separated. The reads of safe API requests go to them, except for a client
+# for REPLICA_PIN_SECONDS after it wrote. An unreachable replica is skipped for REPLICA_RETRY_SECONDS.
+
+for i, host in enumerate(filter(None, os.environ.get('POSTGRES_REPLICA_HOSTS', '').split(','))):
+    DATABASES['replica{0}'.format(i + 1)] = dict(DATABASES['default'], HOST=host.strip(), TEST={'MIRROR': 'default'})
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias.startswith('replica')]
+
+# Board shards, see boards.shards: POSTGRES_SHARD_HOSTS lists the hosts of further databases to
+# spread boards over, comma separated, each to be migrated with `migrate --database shardN`. New
+# boards go to a random shard, move_board moves existing ones. The shard of a board is cached for
+# BOARD_SHARD_TIMEOUT seconds. Column, label, card and comment ids on shardN start at N times
+# BOARD_SHARD_ID_SPACING, so boards keep them when moved.
+
+for i, host in enumerate(filter(None, os.environ.get('POSTGRES_SHARD_HOSTS', '').split(','))):
+    DATABASES['shard{0}'.format(i + 1)] = dict(DATABASES['default'], HOST=host.strip())
+
+BOARD_SHARDS = ['default'] + [alias for alias in DATABASES if alias.startswith('shard')]
+BOARD_SHARD_TIMEOUT = 60 * 60
+BOARD_SHARD_ID_SPACING = 100000000
+
+# Shards first, as the replica router sends every other write to the primary
+DATABASE_ROUTERS = ['boards.shards.ShardRouter', 'floboard.replicas.ReplicaRouter']
+
+REPLICA_PIN_SECONDS = 5
+REPLICA_RETRY_SECONDS = 30
+
+# API metrics, see floboard.metrics: exposed at /metrics to staff, and to bearers of METRICS_TOKEN
+# if set. The latencies of requests are counted into METRICS_BUCKETS seconds, their queries into
+# METRICS_QUERY_BUCKETS. With several worker processes, set METRICS_DIRECTORY to a directory they
+# share on their host: each writes its totals there at most every METRICS_FLUSH_SECONDS and
+# /metrics adds them up.
+
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+METRICS_QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+METRICS_DIRECTORY = os.environ.get('METRICS_DIRECTORY') or None
+METRICS_FLUSH_SECONDS = 10
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
+
 # Password validation
 # https://docs.djangoproject.com/en/2.0/ref/settings/#auth-password-validators
 
@@ -113,10 +158,76 @@ AUTH_PASSWORD_VALIDATORS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
-    )
+        # TokenAuthentication, with the user of each token cached
+        'api.authentication.CachedTokenAuthentication',
+    ),
+    'DEFAULT_PERMISSION_CLASSES': (
+        'rest_framework.permissions.IsAuthenticated',
+        # Views nested under a board are only for those who can see it, see boards.access
+        'api.permissions.HasBoardAccess',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        # Uses orjson when it is installed
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+}
+
+# Caches
+# https://docs.djangoproject.com/en/2.0/topics/cache/
+# Local memory by default (tests, single process); point CACHE_BACKEND/CACHE_LOCATION at a shared
+# backend such as memcached in production so every worker sees the same board versions.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
 }
 
+# Board snapshots: seconds a serialized board is kept, and how long concurrent readers wait for
+# another worker to finish rebuilding one. Board versions, which snapshots and ETags derive from,
+# are kept BOARD_VERSION_TIMEOUT seconds, no less than a snapshot.
+BOARD_SNAPSHOT_TIMEOUT = 60 * 60
+BOARD_VERSION_TIMEOUT = 24 * 60 * 60
+BOARD_SNAPSHOT_LOCK_TIMEOUT = 10
+
+# Board events: pub/sub backend, events buffered per subscriber before it is told to resync, and
+# seconds between keep-alives on an idle stream.
+
+BOARD_EVENTS_BACKEND = 'boards.events.InProcessBackend'
+BOARD_EVENTS_BUFFER_SIZE = 100
+BOARD_EVENTS_HEARTBEAT = 15
+
+# Cached token authentication: most tokens kept per process, and seconds a token's user is kept
+# in the shared cache and in each process (the longest a revoked token works in other processes).
+
+TOKEN_CACHE_SIZE = 10000
+TOKEN_CACHE_TIMEOUT = 5 * 60
+TOKEN_CACHE_LOCAL_TIMEOUT = 30
+
+# Board access, see boards.access: for how many seconds the projects of each user and the project
+# and creator of each board are cached. Both are invalidated when they change.
+
+PROJECT_ACCESS_TIMEOUT = 60 * 60
+BOARD_ACCESS_TIMEOUT = 60 * 60
+
+# Most cards a single bulk card request may create or update.
+
+BULK_CARDS_MAX = 1000
+
+# Most of the latest comments per card that ?comments= may embed in card, column and board payloads.
+
+EMBEDDED_COMMENTS_MAX = 100
+
+# Objects loaded and encoded at a time by list endpoints streamed with ?stream=true.
+
+STREAM_CHUNK_SIZE = 500
+
+# Rows read per query by board exports and written per bulk insert by board imports.
+
+ARCHIVE_BATCH_SIZE = 1000
+
 # Internationalization
 # https://docs.djangoproject.com/en/2.0/topics/i18n/
 
@@ -0,0 +1,106 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from boards.models import Board
+
+from . import metrics
+
+
+@override_settings(METRICS_BUCKETS=(0.1, 1), METRICS_QUERY_BUCKETS=(0, 10), METRICS_DIRECTORY=None, METRICS_TOKEN=None)
+class MetricsTest(TestCase):
+    """This class defines the test suite for the API metrics."""
+
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        self.user = get_user_model().objects.create_user('test', email='testuser@test.com', password='test')
+        self.board = Board.objects.create(title='Test Board', created_by=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_api_requests_are_recorded_by_view_and_method(self):
+        response = self.client.get('/api/v1/boards/{0}/'.format(self.board.pk))
+        self.client.get('/api/v1/boards/0/')
+        self.client.get('/admin/')
+        views = metrics.snapshot()['views']
+        self.assertEqual(list(views), ['api:board_detail'])
+        totals = views['api:board_detail']['GET']
+        self.assertEqual(totals['statuses'], {'200': 1, '404': 1})
+        self.assertEqual(sum(totals['duration']), 2)
+        self.assertGreater(totals['queries_sum'], 0)
+        self.assertGreater(totals['query_seconds'], 0)
+        self.assertGreater(totals['serializer_seconds'], 0)
+        self.assertGreaterEqual(totals['response_bytes'], len(response.content))
+
+    def test_streamed_bodies_are_counted_once_sent(self):
+        response = self.client.get('/api/v1/boards/?stream=true')
+        self.assertEqual(metrics.snapshot()['views']['api:board_list']['GET']['response_bytes'], 0)
+        size = len(b''.join(response.streaming_content))
+        self.assertEqual(metrics.snapshot()['views']['api:board_list']['GET']['response_bytes'], size)
+
+    def test_metrics_are_exposed_in_the_prometheus_format(self):
+        self.client.get('/api/v1/boards/{0}/'.format(self.board.pk))
+        self.user.is_staff = True
+        self.user.save()
+        self.client.force_login(self.user)
+        response = self.client.get('/metrics')
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        lines = response.content.decode().splitlines()
+        labels = 'view="api:board_detail",method="GET"'
+        self.assertIn('# TYPE floboard_http_request_duration_seconds histogram', lines)
+        self.assertIn('floboard_http_request_duration_seconds_bucket{%s,le="+Inf"} 1' % labels, lines)
+        self.assertIn('floboard_http_request_duration_seconds_count{%s} 1' % labels, lines)
+        self.assertIn('floboard_http_requests_total{%s,status="200"} 1' % labels, lines)
+        self.assertTrue(any(line.startswith('floboard_http_request_queries_bucket{%s,le="10"}' % labels)
+                            for line in lines))
+
+    def test_metrics_are_for_staff(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_are_for_bearers_of_the_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+    def test_processes_sharing_a_directory_are_added_up(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(lambda: [os.remove(os.path.join(directory, name)) for name in os.listdir(directory)])
+        other = metrics.snapshot()
+        other['views'] = {'api:board_detail': {'GET': dict(metrics._empty(), statuses={'200': 2})}}
+        with open(os.path.join(directory, 'metrics-1.json'), 'w') as out:
+            json.dump(other, out)
+        with override_settings(METRICS_DIRECTORY=directory):
+            self.client.get('/api/v1/boards/{0}/'.format(self.board.pk))
+            self.assertTrue(os.path.exists(metrics._path(directory)))
+            totals = metrics.collect()
+        self.assertEqual(totals['views']['api:board_detail']['GET']['statuses'], {'200': 3})
+
+    def test_files_of_exited_processes_are_added_up_once(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(lambda: [os.remove(os.path.join(directory, name)) for name in os.listdir(directory)])
+        exited = []
+        for _ in range(2):
+            process = subprocess.Popen([sys.executable, '-c', ''])
+            process.wait()
+            taken = metrics.snapshot()
+            taken['views'] = {'api:board_detail': {'GET': dict(metrics._empty(), statuses={'200': 2})}}
+            with open(os.path.join(directory, 'metrics-{0}.json'.format(process.pid)), 'w') as out:
+                json.dump(taken, out)
+            exited.append(process.pid)
+            with override_settings(METRICS_DIRECTORY=directory):
+                totals = metrics.collect()
+            self.assertEqual(totals['views']['api:board_detail']['GET']['statuses'], {'200': 2 * len(exited)})
+        self.assertEqual(sorted(os.listdir(directory)),
+                         sorted([metrics.EXITED, metrics.LOCK, os.path.basename(metrics._path(directory))]))
@@ -0,0 +1,111 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import OperationalError, connections, router
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.urls import resolve
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from api.views import board_condition
+from boards import cache as board_cache
+from boards.models import Board
+
+from . import replicas
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], REPLICA_PIN_SECONDS=5)
+class ReplicaRoutingTest(SimpleTestCase):
+    """This class defines the test suite for reading from replicas."""
+
+    def setUp(self):
+        cache.clear()
+        replicas._down.clear()
+        self.replica = mock.Mock()
+        patcher = mock.patch.object(replicas, 'connections',
+                                    {'default': connections['default'], 'replica': self.replica})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.factory = RequestFactory()
+
+    def request(self, method='get', path='/api/v1/boards/', token='a', write=False, snapshot=False, view=None):
+        """
+        Run a request through ReplicaMiddleware, returning where its reads went before and after a
+        write, or while building a snapshot. view, if given, makes the view from the list of reads.
+        """
+        request = getattr(self.factory, method)(path, HTTP_AUTHORIZATION='Token {0}'.format(token))
+        request.resolver_match = resolve(path)
+        reads = []
+
+        def read(request, **kwargs):
+            reads.append(router.db_for_read(Board))
+            if snapshot:
+                board_cache.get_snapshot(0, lambda: reads.append(router.db_for_read(Board)) or {})
+            if write:
+                self.assertEqual(router.db_for_write(Board), 'default')
+                reads.append(router.db_for_read(Board))
+            return HttpResponse()
+
+        view = read if view is None else view(reads)
+        # As the handler does: process_view() runs before the view, inside the middleware's call
+        kwargs = request.resolver_match.kwargs
+        middleware = replicas.ReplicaMiddleware(lambda request: middleware.process_view(request, view, (), kwargs) or
+                                                view(request, **kwargs))
+        middleware(request)
+        return reads
+
+    def test_safe_api_requests_read_from_a_replica(self):
+        self.assertEqual(self.request(), ['replica'])
+        self.assertEqual(self.request('head'), ['replica'])
+        self.assertEqual(router.db_for_read(Board), 'default')
+
+    def test_other_requests_read_from_the_primary(self):
+        self.assertEqual(self.request('post'), ['default'])
+        self.assertEqual(self.request(path='/admin/'), ['default'])
+
+    def test_clients_read_their_own_writes(self):
+        self.assertEqual(self.request('post', write=True), ['default', 'default'])
+        self.assertEqual(self.request(), ['default'])
+        self.assertEqual(self.request(token='b'), ['replica'])
+        cache.delete(replicas.pin_key(self.factory.get('/', HTTP_AUTHORIZATION='Token a')))
+        self.assertEqual(self.request(), ['replica'])
+
+    def test_a_write_in_a_safe_request_moves_its_reads_to_the_primary(self):
+        self.assertEqual(self.request(write=True), ['replica', 'default'])
+        self.assertEqual(self.request(), ['default'])
+
+    def test_snapshots_are_built_from_the_primary(self):
+        # Built from a lagging replica, a snapshot would be cached stale under the new version
+        self.assertEqual(self.request(snapshot=True), ['replica', 'default'])
+        self.assertEqual(self.request(), ['replica'])
+
+    def test_views_with_a_board_etag_read_from_the_primary(self):
+        # The ETag is of the primary's version: a body read from a lagging replica would go stale
+        def view(reads):
+            @board_condition
+            class Columns(APIView):
+                authentication_classes = permission_classes = ()
+
+                def get(self, request, board_pk):
+                    reads.append(router.db_for_read(Board))
+                    return Response()
+            return Columns.as_view()
+
+        path = '/api/v1/boards/1/columns/'
+        self.assertEqual(self.request(path=path, view=view), ['default'])
+        self.assertEqual(self.request(path=path), ['replica'])
+
+    def test_reads_fail_over_to_the_primary(self):
+        self.replica.ensure_connection.side_effect = OperationalError
+        self.assertEqual(self.request(), ['default'])
+        self.replica.ensure_connection.side_effect = None
+        # Not tried again until REPLICA_RETRY_SECONDS have passed
+        self.assertEqual(self.request(), ['default'])
+        self.assertEqual(self.replica.ensure_connection.call_count, 1)
+        replicas._down.clear()
+        self.assertEqual(self.request(), ['replica'])
+
+    def test_replicas_are_not_migrated(self):
+        self.assertFalse(router.allow_migrate('replica', 'boards'))
+        self.assertTrue(router.allow_migrate('default', 'boards'))
@@ -0,0 +1,47 @@
+"""
+The projects a user can see through the teams they are members of.
+
+project_pks() resolves them with one query, keeps them in the shared cache for
+PROJECT_ACCESS_TIMEOUT seconds and on the user object for the rest of the request, so access
+checks after the first cost no queries. projects.signals forgets a user's projects whenever their
+memberships, or the projects of one of their teams, change.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from floboard.replicas import primary
+
+from .models import Membership, Project
+
+PROJECTS_KEY = 'access:user:{user_pk}:projects'
+
+
+def _timeout():
+    return getattr(settings, 'PROJECT_ACCESS_TIMEOUT', 60 * 60)
+
+
+def project_pks(user):
+    """Return the frozenset of the primary keys of the projects of user's teams."""
+    pks = getattr(user, '_project_pks', None)
+    if pks is None:
+        key = PROJECTS_KEY.format(user_pk=user.pk)
+        pks = cache.get(key)
+        if pks is None:
+            # Cached for every request, so not from a replica that may lag behind a change
+            with primary():
+                pks = frozenset(
+                    Project.objects.filter(team_projects__membership__user=user).values_list('pk', flat=True)
+                )
+            cache.set(key, pks, _timeout())
+        user._project_pks = pks
+    return pks
+
+
+def forget(*user_pks):
+    """Drop the cached projects of users, after their memberships changed."""
+    cache.delete_many([PROJECTS_KEY.format(user_pk=pk) for pk in user_pks])
+
+
+def forget_teams(*team_pks):
+    """Drop the cached projects of the members of teams, after the projects of the teams changed."""
+    forget(*Membership.objects.filter(team__in=team_pks).values_list('user_id', flat=True).distinct())
@@ -0,0 +1,23 @@
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from . import access
+from .models import Membership, Team
+
+
+@receiver(post_save, sender=Membership)
+@receiver(post_delete, sender=Membership)
+def membership_changed(sender, instance, **kwargs):
+    access.forget(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Team.projects.through)
+def team_projects_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        access.forget_teams(instance.pk)
+    elif action == 'pre_clear':
+        access.forget_teams(*instance.team_projects.values_list('pk', flat=True))
+    else:
+        access.forget_teams(*pk_set)
@@ -1,3 +1,49 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
 
-# Create your tests here.
+from .access import project_pks
+from .models import Membership, Project, Team
+
+
+class ProjectAccessTest(TestCase):
+    """This class defines the test suite for the cached projects of users."""
+
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.user = User.objects.create_user('test', email='test@test.com', password='test')
+        self.projects = [Project.objects.create(title='Project {0}'.format(i)) for i in range(3)]
+        self.team = Team.objects.create(name='Team')
+        self.team.projects.set(self.projects[:2])
+        Membership.objects.create(user=self.user, team=self.team)
+
+    def fresh(self):
+        """The user as a new request sees it, without the projects remembered for this one."""
+        return get_user_model().objects.get(pk=self.user.pk)
+
+    def test_projects_are_resolved_once(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(project_pks(self.user), {self.projects[0].pk, self.projects[1].pk})
+            project_pks(self.user)
+        user = self.fresh()
+        with self.assertNumQueries(0):
+            self.assertEqual(project_pks(user), {self.projects[0].pk, self.projects[1].pk})
+
+    def test_projects_are_forgotten_when_memberships_change(self):
+        project_pks(self.user)
+        other = Team.objects.create(name='Other team')
+        other.projects.add(self.projects[2])
+        Membership.objects.create(user=self.user, team=other)
+        self.assertEqual(project_pks(self.fresh()), {project.pk for project in self.projects})
+        Membership.objects.filter(team=self.team).get().delete()
+        self.assertEqual(project_pks(self.fresh()), {self.projects[2].pk})
+
+    def test_projects_are_forgotten_when_the_projects_of_a_team_change(self):
+        project_pks(self.user)
+        self.team.projects.remove(self.projects[0])
+        self.assertEqual(project_pks(self.fresh()), {self.projects[1].pk})
+        self.projects[2].team_projects.add(self.team)
+        self.assertEqual(project_pks(self.fresh()), {self.projects[1].pk, self.projects[2].pk})
+        self.projects[1].team_projects.clear()
+        self.assertEqual(project_pks(self.fresh()), {self.projects[2].pk})